@@ -0,0 +1,61 @@
+''' Memory held by parsed trees, mutable against interned.
+
+Run with `python -m bench.ast_memory`. Parses a seeded random corpus (see
+`bench.corpus`) and reports the memory still allocated afterwards, measured
+with `tracemalloc`: once keeping the parser's trees, once keeping only
+their `tex_ast.interned` copies (including the interner's table).
+'''
+import argparse
+import gc
+import tracemalloc
+
+from bench import corpus
+from parse import pratt
+from tex_ast.interned import Interner
+
+def retained(build):
+    ''' The result of `build()` and the bytes still allocated after it. '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+def count_nodes(roots) -> int:
+    total = 0
+    stack = list(roots)
+    while stack:
+        node = stack.pop()
+        total += 1
+        for field in ('left_arg', 'right_arg', 'arg'):
+            if hasattr(node, field):
+                stack.append(getattr(node, field))
+        stack.extend(node.children)
+    return total
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--count', type=int, default=10000)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    sources = corpus.generate(args.count, args.seed)
+
+    trees, mutable = retained(lambda: [ pratt.parse_program(tex) for tex in sources ])
+    del trees
+
+    def build_interned():
+        interner = Interner()
+        return interner, [ interner.intern(pratt.parse_program(tex)) for tex in sources ]
+    (interner, roots), interned = retained(build_interned)
+
+    assert roots == [ pratt.parse_program(tex) for tex in sources ]
+    print(f'{args.count} expressions, {count_nodes(roots)} nodes, {len(interner)} distinct')
+    print(f'{"mutable (MB)":>14} {"interned (MB)":>14} {"saving":>8}')
+    print(f'{mutable / 1e6:>14.2f} {interned / 1e6:>14.2f} {1 - interned / mutable:>7.0%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+''' Seeded generator of random expressions.
+
+The same `seed` always gives the same corpus, so runs are comparable. The
+output is in the syntax the Pratt parser (`LexDialect.TEX`) understands,
+and covers what Desmos produces: `\\frac`, `\\sqrt`, subscripted names,
+superscripts, implicit multiplication (`2x`, `x\\sqrt{y}`) and parentheses.
+
+`depth` bounds nesting; `terms` joins that many expressions with `+`, so
+size can be scaled independently of depth.
+'''
+import random
+from typing import List
+
+VARIABLES = [ 'x', 'y', 'z', 't', 'a_{1}', 'a_{2}' ]
+
+def operand(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return rng.choice(VARIABLES)
+    return str(rng.randint(1, 12))
+
+def expression(rng: random.Random, depth: int) -> str:
+    ''' A random expression nested at most `depth` levels. '''
+    if depth <= 0 or rng.random() < 0.25:
+        return operand(rng)
+
+    a = expression(rng, depth - 1)
+    b = expression(rng, depth - 1)
+    match rng.randrange(7):
+        case 0:
+            return f'{a}+{b}'
+        case 1:
+            return f'{a}-{b}'
+        case 2:
+            return f'{a}\\cdot {b}'
+        case 3:
+            return f'\\frac{{{a}}}{{{b}}}'
+        case 4:
+            return f'\\sqrt{{{a}}}'
+        case 5:
+            return f'\\left({a}\\right)^{{{rng.randint(2, 3)}}}'
+        case _:
+            return f'({a}+{b})'
+
+def implicit_term(rng: random.Random, depth: int) -> str:
+    ''' A product written without operators: `3xy^{2}`, `2a_{1}\\sqrt{t}`, `x(y+1)`. '''
+    factors = [ str(rng.randint(2, 9)) ] if rng.random() < 0.5 else []
+    for _ in range(rng.randint(1, 3)):
+        factor = rng.choice(VARIABLES)
+        if rng.random() < 0.3:
+            factor += f'^{{{rng.randint(2, 4)}}}'
+        factors.append(factor)
+
+    if depth > 0 and rng.random() < 0.5:
+        inner = expression(rng, depth - 1)
+        factors.append(f'\\sqrt{{{inner}}}' if rng.random() < 0.5 else f'({inner})')
+    return ''.join(factors)
+
+def term(rng: random.Random, depth: int) -> str:
+    if rng.random() < 0.3:
+        return implicit_term(rng, depth)
+    return expression(rng, depth)
+
+def sized(rng: random.Random, terms: int, depth: int) -> str:
+    ''' `terms` random terms, each nested at most `depth` levels, joined with `+`. '''
+    return '+'.join(term(rng, depth) for _ in range(terms))
+
+def generate(count: int, seed: int = 0, depth: int = 6, terms: int = 0) -> List[str]:
+    ''' `count` random expressions. With `terms`, each is a `sized` sum of that
+    many terms (which may also use implicit multiplication); otherwise each is
+    a single `expression`.
+    '''
+    rng = random.Random(seed)
+    if terms:
+        return [ sized(rng, terms, depth) for _ in range(count) ]
+    return [ expression(rng, depth) for _ in range(count) ]
@@ -0,0 +1,63 @@
+''' Newton's method with symbolic derivatives against finite differences.
+
+Run with `python -m bench.derivative`. For each expression in `CASES`,
+solves `f(x) = 0` with `tex_ast.derivative.newton` from every point of a
+grid, once with `compile_gradient` (one call per step returns the value and
+the derivative) and once with central differences over the compiled
+function (three calls per step). Reports the roots found, the calls made,
+and the time taken.
+'''
+import argparse
+import time
+
+from parse import pratt
+from tex_ast import codegen, derivative, optimize
+
+CASES = [
+    'x^{3}-2x-5',
+    '\\frac{x^{2}-2}{x^{2}+1}',
+    '\\sqrt{x^{2}+1}-3',
+    'x^{5}-3x^{2}+x-\\frac{1}{4}',
+]
+
+def symbolic(tree):
+    f = derivative.compile_gradient(tree)
+    calls = [0]
+
+    def value_and_slope(x):
+        calls[0] += 1
+        return f(x)
+
+    return value_and_slope, calls
+
+def finite_difference(tree, step: float = 1e-6):
+    f = codegen.compile_ast(tree, optimize.ALL)
+    calls = [0]
+
+    def value_and_slope(x):
+        calls[0] += 3
+        h = step * max(1.0, abs(x))
+        return f(x), (f(x + h) - f(x - h)) / (2 * h)
+
+    return value_and_slope, calls
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--points', type=int, default=1000)
+    arg_parser.add_argument('--tolerance', type=float, default=1e-12)
+    args = arg_parser.parse_args()
+
+    grid = [ -5.0 + 10.0 * (i + 0.5) / args.points for i in range(args.points) ]
+    print(f'{"expression":>28} {"method":>10} {"roots":>6} {"calls":>8} {"ms":>8}')
+    for tex in CASES:
+        tree = pratt.parse_program(tex)
+        for name, method in [ ('symbolic', symbolic), ('difference', finite_difference) ]:
+            f, calls = method(tree)
+            start = time.perf_counter()
+            roots = [ derivative.newton(f, x, args.tolerance) for x in grid ]
+            elapsed = time.perf_counter() - start
+            found = sum(root is not None for root in roots)
+            print(f'{tex:>28} {name:>10} {found:>6} {calls[0]:>8} {elapsed * 1e3:>8.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+''' Per-keystroke cost of incremental re-parsing against parsing from scratch.
+
+Run with `python -m bench.incremental`. Joins seeded random expressions (see
+`bench.corpus`) into one long sum and, for each size, types a character at
+the start, middle and end, timing `IncrementalParser.edit` against
+`lex.lex` plus `pratt.parse_program` of the edited source.
+'''
+import argparse
+import timeit
+
+from bench import corpus
+from parse import lex, pratt
+from parse.incremental import IncrementalParser
+
+def keystrokes(document: IncrementalParser, offset: int, count: int):
+    # Type a digit and delete it again, so the source ends where it started
+    for _ in range(count):
+        document.edit(offset, 0, '7')
+        document.edit(offset, 1, '')
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[ 10, 40, 160 ])
+    arg_parser.add_argument('--edits', type=int, default=100)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    print(f'{"terms":>6} {"tokens":>7} {"where":>7} {"edit (ms)":>10} {"full (ms)":>10}')
+    for size in args.sizes:
+        source = '+'.join(corpus.generate(size, args.seed))
+        document = IncrementalParser(source)
+        tokens = len(document.tokens)
+        full = timeit.timeit(lambda: pratt.parse_program(source), number=10) / 10
+
+        # Just after a `+`, so the inserted digit keeps the source parseable
+        plus = [ i + 1 for i, c in enumerate(source) if c == '+' ] or [ 0 ]
+        for where, offset in [ ('start', 0), ('middle', plus[len(plus) // 2]), ('end', len(source)) ]:
+            elapsed = timeit.timeit(lambda: keystrokes(document, offset, args.edits), number=1) / (2 * args.edits)
+            print(f'{size:>6} {tokens:>7} {where:>7} {elapsed * 1e3:>10.3f} {full * 1e3:>10.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+''' Evaluation time of compiled functions with and without optimization.
+
+Run with `python -m bench.optimize`. Compiles a seeded random corpus (see
+`bench.corpus`) with each pass configuration and times a sweep of every
+function over the same points.
+'''
+import argparse
+import timeit
+
+from bench import corpus
+from parse import parse
+from tex_ast import codegen, optimize
+
+CONFIGURATIONS = {
+    'none': None,
+    'fold': optimize.Passes(simplify=False, eliminate_common=False),
+    'simplify': optimize.Passes(fold_constants=False, eliminate_common=False),
+    'cse': optimize.Passes(fold_constants=False, simplify=False),
+    'all': optimize.ALL,
+}
+
+def sweep(functions, points):
+    for f, arity in functions:
+        for args in points[arity]:
+            f(*args)
+
+def defined(tree, points) -> bool:
+    f = codegen.compile_ast(tree)
+    try:
+        return all(isinstance(f(*args), float) for args in points[len(codegen.free_vars(tree))])
+    except (ZeroDivisionError, ValueError, OverflowError):
+        return False
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--count', type=int, default=1000)
+    arg_parser.add_argument('--points', type=int, default=100)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    points = [ [ (1.0 + i * 1e-3,) * arity for i in range(args.points) ] for arity in range(len(corpus.VARIABLES) + 1) ]
+    trees = [ parse.parse_program(tex, engine=parse.ParseEngine.PRATT) for tex in corpus.generate(args.count, args.seed) ]
+    # Only time expressions that evaluate to a real everywhere on the sweep
+    trees = [ tree for tree in trees if defined(tree, points) ]
+
+    functions = {
+        name: [ (codegen.compile_ast(tree, passes), len(codegen.free_vars(tree))) for tree in trees ]
+        for name, passes in CONFIGURATIONS.items()
+    }
+    # Interleave the configurations so drift in machine load affects them alike
+    best = dict.fromkeys(CONFIGURATIONS, float('inf'))
+    for _ in range(args.repeat):
+        for name in CONFIGURATIONS:
+            best[name] = min(best[name], timeit.timeit(lambda: sweep(functions[name], points), number=1))
+
+    print(f'{len(trees)} expressions, {args.points} points each')
+    print(f'{"passes":>10} {"sweep (ms)":>12} {"speedup":>8}')
+    for name, elapsed in best.items():
+        print(f'{name:>10} {elapsed * 1e3:>12.1f} {best["none"] / elapsed:>7.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+''' Parse time against expression length.
+
+Run with `python -m bench.parse_scaling`. Time per token should stay roughly
+flat as the number of terms grows; a rising column means some stage has gone
+quadratic again.
+'''
+import argparse
+import sys
+import timeit
+
+from parse import lex, parse
+
+def chain(terms: int) -> str:
+    ''' `a+1+b+2+...` with `terms` operands. '''
+    operands = [ chr(ord('a') + i % 26) if i % 2 == 0 else str(i) for i in range(terms) ]
+    return '+'.join(operands)
+
+def time_parse(tex: str, repeat: int) -> float:
+    tokens = lex.lex(tex)
+    return min(timeit.repeat(lambda: parse.parse(tokens), number=1, repeat=repeat))
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[250, 1000, 4000, 8000])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    # The infix parser still recurses once per operand
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 4 * max(args.sizes) + 100))
+
+    print(f'{"terms":>8} {"tokens":>8} {"total (ms)":>12} {"per token (us)":>16}')
+    for terms in args.sizes:
+        tex = chain(terms)
+        tokens = len(lex.lex(tex))
+        elapsed = time_parse(tex, args.repeat)
+        print(f'{terms:>8} {tokens:>8} {elapsed * 1e3:>12.3f} {elapsed / tokens * 1e6:>16.3f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+''' Samples needed to plot to a target pixel error, adaptive against uniform.
+
+Run with `python -m bench.plot`. For each expression in `CASES`, samples it
+with `tex_ast.plot.sample` at `--tolerance` pixels, measures the error with
+`tex_ast.plot.pixel_error`, and doubles a uniform grid from 16 points until
+it is as accurate, up to `--max-count` points. Uniform grids join the two
+sides of a pole, so for expressions with one they never get there.
+'''
+import argparse
+import time
+
+from parse import pratt
+from tex_ast import plot
+
+# TeX: view
+CASES = {
+    'x^{3}-x': plot.View(-2.0, 2.0, -6.0, 6.0),
+    '\\frac{1}{x}': plot.View(-5.0, 5.0, -5.0, 5.0),
+    '\\sqrt{x}': plot.View(-2.0, 8.0, -1.0, 4.0),
+    '\\sqrt{1-x^{2}}': plot.View(-1.5, 1.5, -0.5, 1.5),
+    '\\frac{1}{100x^{2}+1}': plot.View(-5.0, 5.0, -0.2, 1.2),
+    '\\frac{x^{3}}{x^{2}-1}': plot.View(-4.0, 4.0, -8.0, 8.0),
+}
+
+def uniform_count(tree, view, target: float, max_count: int):
+    ''' The smallest uniform grid tried that is within `target` pixels (None if none is), and its error. '''
+    count = 16
+    while count <= max_count:
+        error = plot.pixel_error(plot.sample_uniform(tree, view, count), tree, view)
+        if error <= target:
+            return count, error
+        count *= 2
+    return None, error
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--tolerance', type=float, default=0.5)
+    arg_parser.add_argument('--max-count', type=int, default=1 << 16)
+    args = arg_parser.parse_args()
+
+    print(f'{"expression":>24} {"adaptive":>9} {"bounds":>7} {"error":>6} {"ms":>6} {"uniform":>8} {"error":>7} {"ratio":>7}')
+    for tex, view in CASES.items():
+        tree = pratt.parse_program(tex)
+        start = time.perf_counter()
+        samples = plot.sample(tree, view, tolerance=args.tolerance)
+        elapsed = time.perf_counter() - start
+        error = plot.pixel_error(samples, tree, view)
+
+        count, uniform_error = uniform_count(tree, view, args.tolerance, args.max_count)
+        uniform = f'{count}' if count is not None else f'>{args.max_count}'
+        ratio = f'{count / samples.evaluations:.1f}x' if count is not None else '-'
+        print(f'{tex:>24} {samples.evaluations:>9} {samples.bounds:>7} {error:>6.2f} {elapsed * 1e3:>6.1f} {uniform:>8} {uniform_error:>7.2f} {ratio:>7}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+''' Compare the backtracking parser with the Pratt parser.
+
+Run with `python -m bench.pratt_vs_backtracking`. Inputs are limited to what
+the backtracking parser understands: nested parentheses around `+` chains.
+Both parsers are timed on pre-lexed tokens in their own lexer dialect.
+'''
+import argparse
+import sys
+import timeit
+
+from parse import lex, parse, pratt
+
+def nested(depth: int, terms: int = 2) -> str:
+    ''' `((...(1+2)...))` with `depth` levels of parentheses. '''
+    inner = '+'.join(str(i + 1) for i in range(terms))
+    return '(' * depth + inner + ')' * depth
+
+def time_min(f, repeat: int) -> float:
+    return min(timeit.repeat(f, number=1, repeat=repeat))
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--depths', type=int, nargs='+', default=[10, 50, 200, 800])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    # Both parsers recurse once per nesting level
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * max(args.depths) + 100))
+
+    print(f'{"depth":>8} {"backtracking (ms)":>18} {"pratt (ms)":>12} {"speedup":>8}')
+    for depth in args.depths:
+        tex = nested(depth)
+        legacy_tokens = lex.lex(tex)
+        tex_tokens = lex.lex(tex, dialect=lex.LexDialect.TEX)
+
+        assert parse.parse(legacy_tokens).result.python == pratt.parse(tex_tokens).result.python
+
+        legacy = time_min(lambda: parse.parse(legacy_tokens), args.repeat)
+        fast = time_min(lambda: pratt.parse(tex_tokens), args.repeat)
+        print(f'{depth:>8} {legacy * 1e3:>18.3f} {fast * 1e3:>12.3f} {legacy / fast:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
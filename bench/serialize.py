@@ -0,0 +1,44 @@
+''' Time JSON serialization of large trees.
+
+Run with `python -m bench.serialize`. Compares `serialization.dumps` with
+building `.dict` and passing it to `json.dumps` (what `ASTNodeEncoder` used
+to do). Trees are balanced so the `.dict` path stays within the recursion
+limit.
+'''
+import argparse
+import json
+import timeit
+
+from tex_ast import serialization
+from tex_ast.ast import *
+
+def balanced_tree(leaves: int) -> ASTNode:
+    ''' A balanced tree of alternating `+`/`*` over `leaves` vars and numbers. '''
+    nodes = [ ASTVar(children=[], name='x') if i % 2 else ASTNumber(children=[], number=float(i)) for i in range(leaves) ]
+    op = ASTBinaryOp.Type.ADD
+    while len(nodes) > 1:
+        paired = [ ASTBinaryOp(children=[], type=op, left_arg=a, right_arg=b) for a, b in zip(nodes[::2], nodes[1::2]) ]
+        if len(nodes) % 2:
+            paired.append(nodes[-1])
+        nodes = paired
+        op = ASTBinaryOp.Type.MULTIPLY if op == ASTBinaryOp.Type.ADD else ASTBinaryOp.Type.ADD
+    return nodes[0]
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--leaves', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--indent', type=int, default=4)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    print(f'{"leaves":>8} {"dict + json.dumps (ms)":>24} {"dumps (ms)":>12} {"speedup":>8}')
+    for leaves in args.leaves:
+        tree = balanced_tree(leaves)
+        assert serialization.dumps(tree, args.indent) == json.dumps(tree.dict, indent=args.indent)
+
+        legacy = min(timeit.repeat(lambda: json.dumps(tree.dict, indent=args.indent), number=1, repeat=args.repeat))
+        fast = min(timeit.repeat(lambda: serialization.dumps(tree, args.indent), number=1, repeat=args.repeat))
+        print(f'{leaves:>8} {legacy * 1e3:>24.2f} {fast * 1e3:>12.2f} {legacy / fast:>7.2f}x')
+
+if __name__ == '__main__':
+    main()
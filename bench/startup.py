@@ -0,0 +1,105 @@
+''' Import cost of each CLI mode.
+
+Run with `python -m bench.startup`. Starts `tex_python/main.py` once per mode
+under `python -X importtime` and adds up the time spent importing modules,
+not counting those the bare interpreter imports anyway (`site` and friends).
+Each mode is measured `--repeat` times, keeping the fastest run.
+
+With `--check`, exits with status 1 if any mode's import time is over its
+budget in `BUDGETS`. The budgets leave about 2x headroom over a typical
+machine. A mode that goes over has usually picked up an eager import it does
+not need; `--top` lists the heaviest imports of each mode to find it.
+
+Bytecode is cached in a temporary directory (`PYTHONPYCACHEPREFIX`) and
+each mode is started once before timing, so compiling sources does not
+count.
+'''
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'tex_python', 'main.py')
+
+# Name: (arguments, stdin)
+MODES = {
+    'help': ([ '--help' ], ''),
+    'ast': ([ '--ast' ], 'x+1\n'),
+    'batch': ([ '--batch', '--workers', '1' ], 'x+1\n'),
+}
+
+# Milliseconds of imports beyond the bare interpreter's
+BUDGETS = {
+    'help': 40.0,
+    'ast': 80.0,
+    'batch': 90.0,
+}
+
+def import_times(stderr: str) -> Dict[str, int]:
+    ''' Cumulative microseconds of each top-level import in `-X importtime` output. '''
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            # The header line
+            continue
+        # Nested imports are indented under the one that caused them
+        if not name[1:].startswith(' '):
+            times[name.strip()] = int(cumulative_us)
+    return times
+
+def run(arguments: List[str], stdin: str, env: Dict[str, str]) -> Tuple[Dict[str, int], float]:
+    start = time.perf_counter()
+    process = subprocess.run([ sys.executable, '-X', 'importtime', *arguments ],
+        input=stdin, capture_output=True, text=True, env=env, check=True)
+    return import_times(process.stderr), time.perf_counter() - start
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    arg_parser.add_argument('--top', type=int, default=0,
+        help='List the heaviest imports of each mode')
+    arg_parser.add_argument('--check', action='store_true',
+        help='Exit with status 1 if a mode is over its budget')
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache:
+        env = { **os.environ, 'PYTHONPATH': ROOT, 'PYTHONPYCACHEPREFIX': cache }
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+        baseline, _ = run([ '-c', 'pass' ], '', env)
+
+        over = []
+        print(f'{"mode":>8} {"imports (ms)":>13} {"budget (ms)":>12} {"process (ms)":>13}')
+        for name, (arguments, stdin) in MODES.items():
+            run([ MAIN, *arguments ], stdin, env)
+
+            best = None
+            for _ in range(args.repeat):
+                times, elapsed = run([ MAIN, *arguments ], stdin, env)
+                total = sum(us for module, us in times.items() if module not in baseline) / 1e3
+                if best is None or total < best[0]:
+                    best = (total, elapsed, times)
+
+            total, elapsed, times = best
+            print(f'{name:>8} {total:>13.1f} {BUDGETS[name]:>12.1f} {elapsed * 1e3:>13.1f}')
+            for module, us in sorted(times.items(), key=lambda item: -item[1])[:args.top]:
+                if module not in baseline:
+                    print(f'{"":>8}   {us / 1e3:>8.1f}  {module}')
+
+            if total > BUDGETS[name]:
+                over.append(name)
+
+    if over:
+        print(f'Over budget: {", ".join(over)}')
+        if args.check:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
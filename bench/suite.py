@@ -0,0 +1,211 @@
+''' Timing of each pipeline stage over a seeded corpus, with baseline comparison.
+
+Run with `python -m bench.suite`. For each size profile in `PROFILES`,
+generates a corpus with `bench.corpus` and times:
+
+- `lex`, `lex_tex`: `lex.lex` in the legacy and TeX dialects
+- `parse_pratt`: `parse.parse_program` with the Pratt engine
+- `parse_backtracking`: the default engine, on the expressions it accepts
+- `parse_tokens`, `parse_buffer`: the default engine on the same expressions
+  lexed beforehand, into lists and into `lex.TokenBuffer`s; the parser
+  indexes tokens, which a buffer answers with a new `LexToken` each time
+- `serialize`: `serialization.dumps`
+- `compile`: `python_func` with the compile cache cleared
+- `evaluate`: calling the compiled functions (those defined on the sample
+  point; a stage that covers no expressions is left out)
+
+Each stage runs over the whole corpus `--repeat` times, interleaved with the
+other stages. The fastest and median times per expression are reported.
+`--output` writes them as JSON. `--baseline` compares against an earlier
+run, and `--check` exits with status 1 if any stage got more than
+`--threshold` slower. Only compare runs from the same machine; the `meta`
+section records what they ran on.
+
+    python -m bench.suite --output before.json
+    # ... change something ...
+    python -m bench.suite --baseline before.json --check
+'''
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bench import corpus
+from parse import lex, parse
+from tex_ast import codegen, serialization
+
+# Name: (count, terms, depth)
+PROFILES = {
+    'small': (400, 1, 3),
+    'medium': (100, 8, 5),
+    'large': (12, 64, 6),
+}
+
+STAGES = [ 'lex', 'lex_tex', 'parse_pratt', 'parse_backtracking', 'parse_tokens', 'parse_buffer', 'serialize', 'compile', 'evaluate' ]
+
+POINT = 1.25
+
+def _accepts(tex: str) -> bool:
+    try:
+        parse.parse_program(tex)
+        return True
+    except Exception:
+        return False
+
+def _defined(f: Callable, arity: int) -> bool:
+    try:
+        return isinstance(f(*(POINT,) * arity), float)
+    except (ArithmeticError, ValueError):
+        return False
+
+def stages(sources: List[str]) -> Dict[str, Tuple[int, Callable[[], None]]]:
+    ''' For each stage, the number of expressions it covers and a function running it over them. '''
+    trees = [ parse.parse_program(tex, engine=parse.ParseEngine.PRATT) for tex in sources ]
+    legacy = [ tex for tex in sources if _accepts(tex) ]
+    token_lists = [ lex.lex(tex) for tex in legacy ]
+    buffers = [ lex.lex_buffer(tex) for tex in legacy ]
+    functions = [ (tree.python_func, len(codegen.free_vars(tree))) for tree in trees ]
+    functions = [ (f, (POINT,) * arity) for f, arity in functions if _defined(f, arity) ]
+
+    def run_lex():
+        for tex in sources:
+            lex.lex(tex)
+
+    def run_lex_tex():
+        for tex in sources:
+            lex.lex(tex, dialect=lex.LexDialect.TEX)
+
+    def run_parse_pratt():
+        for tex in sources:
+            parse.parse_program(tex, engine=parse.ParseEngine.PRATT)
+
+    def run_parse_backtracking():
+        for tex in legacy:
+            parse.parse_program(tex)
+
+    def run_parse_tokens():
+        for tokens in token_lists:
+            parse.parse(tokens)
+
+    def run_parse_buffer():
+        for tokens in buffers:
+            parse.parse(tokens)
+
+    def run_serialize():
+        for tree in trees:
+            serialization.dumps(tree)
+
+    def run_compile():
+        codegen.compile_source.cache_clear()
+        for tree in trees:
+            tree.python_func
+
+    def run_evaluate():
+        for f, args in functions:
+            f(*args)
+
+    return {
+        'lex': (len(sources), run_lex),
+        'lex_tex': (len(sources), run_lex_tex),
+        'parse_pratt': (len(sources), run_parse_pratt),
+        'parse_backtracking': (len(legacy), run_parse_backtracking),
+        'parse_tokens': (len(token_lists), run_parse_tokens),
+        'parse_buffer': (len(buffers), run_parse_buffer),
+        'serialize': (len(trees), run_serialize),
+        'compile': (len(trees), run_compile),
+        'evaluate': (len(functions), run_evaluate),
+    }
+
+def summarize(times: List[float], items: int) -> Dict[str, float]:
+    per_item = 1e6 / items
+    return {
+        'items': items,
+        'min_us': min(times) * per_item,
+        'median_us': statistics.median(times) * per_item,
+    }
+
+def run_suite(seed: int = 0, repeat: int = 7, only: List[str] = None) -> dict:
+    ''' Results keyed `stage/profile`, plus run metadata. '''
+    cases = {}
+    for profile, (count, terms, depth) in PROFILES.items():
+        sources = corpus.generate(count, seed, depth=depth, terms=terms)
+        for stage, (items, run) in stages(sources).items():
+            # Long sums are rarely defined everywhere, so `evaluate/large` can be empty
+            if items and (not only or stage in only):
+                cases[f'{stage}/{profile}'] = (items, run)
+
+    # Interleave the cases so drift in machine load affects them alike
+    times = { name: [] for name in cases }
+    for _ in range(repeat):
+        for name, (_, run) in cases.items():
+            start = time.perf_counter()
+            run()
+            times[name].append(time.perf_counter() - start)
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': { name: summarize(times[name], items) for name, (items, _) in cases.items() },
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[Tuple[str, float, float, bool]]:
+    ''' `(name, baseline us, current us, regressed)` for each result in both
+    runs, comparing the fastest times.
+    '''
+    rows = []
+    for name, current in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        rows.append((name, before['min_us'], current['min_us'], current['min_us'] > before['min_us'] * (1 + threshold)))
+    return rows
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--repeat', type=int, default=7)
+    arg_parser.add_argument('--stages', nargs='+', choices=STAGES, default=None)
+    arg_parser.add_argument('--output', help='Write results as JSON to this path')
+    arg_parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    arg_parser.add_argument('--threshold', type=float, default=0.25,
+        help='Slowdown counted as a regression, as a fraction (default: 0.25)')
+    arg_parser.add_argument('--check', action='store_true',
+        help='With --baseline, exit with status 1 on any regression')
+    args = arg_parser.parse_args()
+
+    results = run_suite(args.seed, args.repeat, args.stages)
+
+    print(f'{"stage":>28} {"items":>6} {"min (us)":>12} {"median (us)":>12}')
+    for name, result in results['results'].items():
+        print(f'{name:>28} {result["items"]:>6} {result["min_us"]:>12.1f} {result["median_us"]:>12.1f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        rows = compare(results, baseline, args.threshold)
+        print()
+        print(f'{"stage":>28} {"baseline (us)":>14} {"now (us)":>12} {"change":>8}')
+        for name, before, now, regressed in rows:
+            flag = '  REGRESSED' if regressed else ''
+            print(f'{name:>28} {before:>14.1f} {now:>12.1f} {now / before - 1:>+8.0%}{flag}')
+
+        if args.check and any(regressed for *_, regressed in rows):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
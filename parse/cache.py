@@ -0,0 +1,133 @@
+''' Size-bounded LRU cache of lexed tokens and parsed ASTs, keyed on source.
+
+Opt in by passing a cache to `parse.parse_program`:
+
+    cache = ParseCache(capacity=4096, max_bytes=64 << 20)
+    ast = parse.parse_program(tex, cache=cache)
+
+AST nodes are mutable dataclasses, so by default every lookup returns a deep
+copy of the cached tree. Callers that never mutate what they get back can pass
+`copy_on_return=False` to share the cached nodes. Token buffers are never
+mutated by the parser and are always shared.
+
+`lex` and `parse_program` keep separate entries: a parse caches only its
+tree, and a source both lexed and parsed takes two slots.
+'''
+import copy
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+from typing import Any, Hashable, Optional
+
+from parse import lex
+from parse import parse
+from tex_ast.ast import ASTNode
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+@dataclass
+class _Entry:
+    value: Any
+    nbytes: int
+
+def _ast_nbytes(root: ASTNode) -> int:
+    ''' Approximate memory held by a tree: each node plus its children lists. '''
+    total = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        total += sys.getsizeof(node)
+        for value in (getattr(node, field.name) for field in fields(node)):
+            if isinstance(value, ASTNode):
+                stack.append(value)
+            elif isinstance(value, list):
+                total += sys.getsizeof(value)
+                stack.extend(child for child in value if isinstance(child, ASTNode))
+
+    return total
+
+def _tokens_nbytes(tokens: lex.TokenBuffer) -> int:
+    return sys.getsizeof(tokens) + tokens.nbytes
+
+class ParseCache:
+    def __init__(self, capacity: int = 1024, max_bytes: Optional[int] = None, copy_on_return: bool = True):
+        ''' Hold at most `capacity` entries and, if given, about `max_bytes` of
+        tokens and nodes (source strings are not counted).
+        '''
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.copy_on_return = copy_on_return
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._nbytes = 0
+        self._stats = CacheStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return replace(self._stats)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def lex(self, tex: str, dialect: lex.LexDialect = lex.LexDialect.LEGACY) -> lex.TokenBuffer:
+        key = ('tokens', tex, dialect)
+        tokens = self._get(key)
+        if tokens is None:
+            tokens = lex.lex_buffer(tex, dialect)
+            self._put(key, tokens, _tokens_nbytes(tokens))
+
+        return tokens
+
+    def parse_program(self, tex: str, engine: 'parse.ParseEngine' = None) -> ASTNode:
+        engine = engine or parse.DEFAULT_ENGINE
+        key = ('ast', tex, engine)
+        ast = self._get(key)
+        if ast is None:
+            # Not through `self.lex`: the tree is what is kept, and its tokens
+            # would only take a second slot and count against the budget twice
+            ast = parse.parse_program(tex, engine)
+            self._put(key, ast, _ast_nbytes(ast))
+
+        return copy.deepcopy(ast) if self.copy_on_return else ast
+
+    def _get(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry.value
+
+    def _put(self, key: Hashable, value: Any, nbytes: int):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                # Another thread parsed the same source first
+                self._nbytes -= previous.nbytes
+
+            self._entries[key] = _Entry(value, nbytes)
+            self._nbytes += nbytes
+
+            while self._entries and (len(self._entries) > self.capacity or
+                    (self.max_bytes is not None and self._nbytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._stats.evictions += 1
@@ -0,0 +1,314 @@
+''' Incremental re-lexing and re-parsing of edited expressions.
+
+An edit replaces `deleted` characters at `offset` with `inserted`.
+
+Re-lexing restarts at the last token that begins before the edit and scans
+only until the new tokens line up with the old ones again: once a token
+starts, after the edit, at the position where an old token started (shifted
+by the change in length), the rest of the scan would be the same. `relex`
+does this over a plain token list.
+
+`IncrementalParser` keeps the state needed to also reuse parse results
+between edits. The Pratt parser (`parse.pratt`) is run with every
+`expression(rbp)` call memoized by start token; a memoized subtree is reused
+as long as none of the tokens it read were re-lexed. Each memo entry links
+to the entry it was parsed within, and each token to the innermost entry
+that consumed it, so an edit only has to walk up from the damaged tokens to
+invalidate what read them.
+
+Positions are stored so that an edit does not have to shift everything after
+it: token offsets after the last edit are kept relative to the end of the
+source (and token indices relative to the number of tokens), and memo
+entries store lengths rather than end positions. Only the operators that
+contain the edit are rebuilt (for a flat `a+b+...` chain that is every `+`
+after it, as each contains everything to its left), plus list splices done
+by `list` itself.
+'''
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+from parse import lex, pratt
+from parse.parse import ParseException
+from tex_ast.ast import ASTNode
+
+_T = lex.LexToken.Type
+
+class _Resync(Exception):
+    pass
+
+def _rescan(
+    source: str,
+    restart: int,
+    edit_end: int,
+    is_old_start: Callable[[int], bool],
+    dialect: lex.LexDialect
+) -> Tuple[List[Tuple[lex.LexToken.Type, int, int]], Optional[int]]:
+    ''' Tokens from `restart` up to the first match at or after `edit_end`
+    that `is_old_start`, and that match's position (None if the scan reached
+    the end of `source`).
+    '''
+    tokens = []
+
+    def emit(type: lex.LexToken.Type, start: int, end: int):
+        # An ARG token is the second half of a match that started at its `{`
+        if start >= edit_end and type != _T.ARG and is_old_start(start):
+            raise _Resync(start)
+        tokens.append((type, start, end))
+
+    try:
+        lex._scan(source, emit, dialect=dialect, pos=restart)
+    except _Resync as e:
+        return tokens, e.args[0]
+    return tokens, None
+
+def _value(source: str, start: int, end: int) -> str:
+    return source[start:end] if end > start else source[start]
+
+def _check_edit(source: str, offset: int, deleted: int):
+    if not 0 <= offset <= len(source) or deleted < 0 or offset + deleted > len(source):
+        raise ValueError(f'Edit ({offset}, {deleted}) out of range for source of length {len(source)}')
+
+def relex(
+    source: str,
+    tokens: List[lex.LexToken],
+    offset: int,
+    deleted: int,
+    inserted: str,
+    dialect: lex.LexDialect = lex.LexDialect.LEGACY
+) -> Tuple[str, List[lex.LexToken]]:
+    ''' The edited source and its tokens, equal to `lex.lex` of it, from the
+    `tokens` of `source`.
+    '''
+    _check_edit(source, offset, deleted)
+    new_source = source[:offset] + inserted + source[offset + deleted:]
+    delta = len(inserted) - deleted
+
+    start = lambda token: token.start_idx
+    r = max(bisect_left(tokens, offset, key=start) - 1, 0)
+    while r > 0 and tokens[r].type == _T.ARG:
+        r -= 1
+    restart = tokens[r].start_idx if r > 0 else 0
+
+    def old_index(position: int) -> int:
+        return bisect_left(tokens, position - delta, lo=r, key=start)
+
+    def is_old_start(position: int) -> bool:
+        j = old_index(position)
+        return j < len(tokens) and tokens[j].start_idx == position - delta and tokens[j].type != _T.ARG
+
+    new, resync = _rescan(new_source, restart, offset + len(inserted), is_old_start, dialect)
+    j = old_index(resync) if resync is not None else len(tokens)
+
+    return new_source, tokens[:r] + [
+        lex.LexToken(type, _value(new_source, s, e), s, e) for type, s, e in new
+    ] + [
+        lex.LexToken(token.type, token.value, token.start_idx + delta, token.end_idx + delta) for token in tokens[j:]
+    ]
+
+class _Entry:
+    ''' A memoized `expression(rbp)` result. '''
+    __slots__ = ('node', 'length', 'parent', 'alive')
+
+    def __init__(self, parent: Optional['_Entry']):
+        self.node = None
+        # Number of tokens consumed; the token after them was read as lookahead
+        self.length = 0
+        self.parent = parent
+        self.alive = True
+
+def _kill(entry: Optional[_Entry]):
+    ''' Invalidate `entry` and everything it was parsed within. '''
+    while entry is not None and entry.alive:
+        entry.alive = False
+        entry = entry.parent
+
+class _MemoParser(pratt._Parser):
+    def __init__(self, keys: List, values: List[str], memo: List[Optional[Dict[int, _Entry]]], cover: List[Optional[_Entry]]):
+        super().__init__(keys, values, None)
+        self.memo = memo
+        self.cover = cover
+        self.active: Optional[_Entry] = None
+        # (start, end) of the subexpressions parsed within the active entry
+        self.spans: List[Tuple[int, int]] = []
+
+    def expression(self, rbp: int = 0) -> ASTNode:
+        start = self.i
+        slot = self.memo[start]
+        if slot is not None:
+            entry = slot.get(rbp)
+            if entry is not None and entry.alive:
+                if entry.parent is not self.active:
+                    # What it was parsed within before is not being reused
+                    _kill(entry.parent)
+                    entry.parent = self.active
+                self.i = start + entry.length
+                self.spans.append((start, self.i))
+                return entry.node
+
+        entry = _Entry(self.active)
+        active, spans = self.active, self.spans
+        self.active, self.spans = entry, []
+        try:
+            node = super().expression(rbp)
+            # Tokens consumed here rather than within a subexpression
+            cover = self.cover
+            position = start
+            for span_start, span_end in self.spans + [ (self.i, self.i) ]:
+                for k in range(position, span_start):
+                    if cover[k] is not entry:
+                        _kill(cover[k])
+                        cover[k] = entry
+                position = span_end
+        finally:
+            self.active, self.spans = active, spans
+
+        entry.node = node
+        entry.length = self.i - start
+        if slot is None:
+            slot = self.memo[start] = {}
+        slot[rbp] = entry
+        spans.append((start, self.i))
+        return node
+
+class IncrementalParser:
+    ''' A source string with its tokens and tree, kept up to date under edits.
+
+        document = IncrementalParser('x+1')
+        document.edit(2, 1, '2\\cdot y')   # the tree of 'x+2\\cdot y'
+
+    Trees are those of `pratt.parse_program` (`LexDialect.TEX` tokens). An
+    edit that leaves the source unparseable raises `ParseException` and
+    sets `ast` to None; the source and tokens are still updated, and later
+    edits carry on from them. (A source that does not parse to begin with
+    just leaves `ast` None.)
+    '''
+
+    def __init__(self, source: str):
+        self.source = ''
+        self.ast: Optional[ASTNode] = None
+
+        # Tokens [0, _gap) hold absolute offsets, the rest offsets relative
+        # to len(source)
+        self._types: List[lex.LexToken.Type] = []
+        self._values: List[str] = []
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._gap = 0
+
+        # Parser input: tokens other than `pratt.IGNORED_COMMANDS`, with
+        # their token index, absolute for [0, _key_gap) and relative to the
+        # number of tokens after
+        self._keys: List = []
+        self._key_values: List[str] = []
+        self._key_tokens: List[int] = []
+        self._key_gap = 0
+
+        # Per key index (plus one past the end): memo entries by rbp, and the
+        # innermost entry that consumed the token
+        self._memo: List[Optional[Dict[int, _Entry]]] = [None]
+        self._cover: List[Optional[_Entry]] = [None]
+
+        try:
+            self.edit(0, 0, source)
+        except ParseException:
+            pass
+
+    @property
+    def tokens(self) -> List[lex.LexToken]:
+        ''' The tokens of `source`, as `lex.lex(source, dialect=LexDialect.TEX)`. '''
+        n = len(self.source)
+        return [
+            lex.LexToken(type, value, start + n * (i >= self._gap), end + n * (i >= self._gap))
+            for i, (type, value, start, end) in enumerate(zip(self._types, self._values, self._starts, self._ends))
+        ]
+
+    def _start(self, i: int) -> int:
+        start = self._starts[i]
+        return start if i < self._gap else start + len(self.source)
+
+    def _move_gap(self, gap: int):
+        n = len(self.source)
+        starts, ends = self._starts, self._ends
+        while self._gap > gap:
+            self._gap -= 1
+            starts[self._gap] -= n
+            ends[self._gap] -= n
+        while self._gap < gap:
+            starts[self._gap] += n
+            ends[self._gap] += n
+            self._gap += 1
+
+        count = len(self._types)
+        key_tokens = self._key_tokens
+        while self._key_gap > 0 and key_tokens[self._key_gap - 1] >= gap:
+            self._key_gap -= 1
+            key_tokens[self._key_gap] -= count
+        while self._key_gap < len(key_tokens) and key_tokens[self._key_gap] + count < gap:
+            key_tokens[self._key_gap] += count
+            self._key_gap += 1
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> ASTNode:
+        ''' Replace `deleted` characters at `offset` with `inserted`; the new tree. '''
+        _check_edit(self.source, offset, deleted)
+        new_source = self.source[:offset] + inserted + self.source[offset + deleted:]
+        count = len(self._types)
+
+        # Re-lex from the last token starting before the edit
+        r = max(bisect_left(range(count), offset, key=self._start) - 1, 0)
+        self._move_gap(r)
+        restart = self._start(r) if r > 0 else 0
+
+        # Old tokens from r on are stored relative to the end, which the edit
+        # does not move
+        relative = lambda position: position - len(new_source)
+        def is_old_start(position: int) -> bool:
+            j = bisect_left(self._starts, relative(position), r, count)
+            return j < count and self._starts[j] == relative(position)
+
+        new, resync = _rescan(new_source, restart, offset + len(inserted), is_old_start, lex.LexDialect.TEX)
+        j = bisect_left(self._starts, relative(resync), r, count) if resync is not None else count
+
+        self._types[r:j] = [ type for type, _, _ in new ]
+        self._values[r:j] = [ _value(new_source, start, end) for _, start, end in new ]
+        self._starts[r:j] = [ start for _, start, _ in new ]
+        self._ends[r:j] = [ end for _, _, end in new ]
+        self.source = new_source
+        self._gap = r + len(new)
+
+        # Replace the keys of tokens [r, j)
+        first_key = self._key_gap
+        last_key = bisect_left(self._key_tokens, j - count, first_key, len(self._key_tokens))
+        keys = []
+        key_values = []
+        key_tokens = []
+        for i, (type, start, end) in enumerate(new, r):
+            value = _value(new_source, start, end)
+            if type == _T.COMMAND:
+                if value in pratt.IGNORED_COMMANDS:
+                    continue
+                keys.append(value)
+            else:
+                keys.append(type)
+            key_values.append(value)
+            key_tokens.append(i)
+
+        # Anything that read a replaced token, or the token before them
+        # (which was followed by a different one), is out of date
+        for k in range(max(first_key - 1, 0), last_key):
+            _kill(self._cover[k])
+
+        self._keys[first_key:last_key] = keys
+        self._key_values[first_key:last_key] = key_values
+        self._key_tokens[first_key:last_key] = key_tokens
+        self._memo[first_key:last_key] = [None] * len(keys)
+        self._cover[first_key:last_key] = [None] * len(keys)
+        self._key_gap = first_key + len(keys)
+
+        self.ast = None
+        parser = _MemoParser(self._keys, self._key_values, self._memo, self._cover)
+        ast = parser.expression()
+        if parser.i != len(self._keys):
+            raise ParseException(f'Unexpected token: {self._key_values[parser.i]!r}')
+
+        self.ast = ast
+        return ast
@@ -0,0 +1,115 @@
+''' Counters, stage timings and trace events from the lexer, parsers and
+code generator.
+
+Nothing is recorded unless a report is being collected:
+
+    with instrument.collect() as report:
+        parse.parse_program(tex)
+    print(report.summary())
+    report.counters['backtracks']
+
+While no report is active, each instrumented function checks `active` once
+per call and does nothing else, so tokens, nodes and alternatives cost
+nothing extra. Counters:
+
+- `tokens`: tokens lexed
+- `parses`: programs parsed, by either engine
+- `attempts`: alternatives the backtracking parser tried
+- `backtracks`: alternatives that failed, so that the next one was tried
+- `nodes`: nodes in the parsed trees
+- `compiles`: trees compiled by `codegen.compile_ast`, and `compile_misses`
+  for those not already in its cache
+
+Stage times (`lex`, `parse`, `consume_scope`, `compile`) exclude time spent
+in nested stages, so `parse` does not include the lexing it does, nor the
+delimiter matching of `primitives.consume_scope`.
+
+Evaluating a compiled function is not timed unless asked for, as it is
+called far more often than anything else here; `timed` wraps a function so
+that its calls are (under `evaluate` by default):
+
+    f = instrument.timed(codegen.compile_ast(ast))
+    with instrument.collect() as report:
+        f(x=1.0)
+    report.times['evaluate']
+
+`collect(trace=callback)` also passes trace events to `callback(event,
+detail)`: each failed alternative (`backtrack`), and the intermediate results
+the backtracking parser used to print. For example, `trace=print` prints them.
+Subclass `Report` to handle counts, stages or events differently, and pass
+an instance to `collect`.
+
+The active report is process-wide; collecting from several threads at once
+mixes their counts and stage times.
+'''
+import time
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+class Report:
+    def __init__(self, trace: Optional[Callable[[str, Any], None]] = None):
+        self.counters = Counter()
+        # Seconds spent in each stage, not counting nested stages
+        self.times = Counter()
+        self.calls = Counter()
+        self.tracer = trace
+        # [stage, start time, time in nested stages] for each open stage
+        self._open: List[list] = []
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += n
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        frame = [ name, time.perf_counter(), 0.0 ]
+        self._open.append(frame)
+        try:
+            yield
+        finally:
+            self._open.pop()
+            elapsed = time.perf_counter() - frame[1]
+            self.times[name] += elapsed - frame[2]
+            self.calls[name] += 1
+            if self._open:
+                self._open[-1][2] += elapsed
+
+    def trace(self, event: str, detail: Any = None):
+        if self.tracer is not None:
+            self.tracer(event, detail)
+
+    def summary(self) -> str:
+        lines = [ f'{name:>16} {self.calls[name]:>8} calls {self.times[name] * 1e3:>10.3f} ms' for name in self.times ]
+        lines += [ f'{name:>16} {value:>8}' for name, value in sorted(self.counters.items()) ]
+        return '\n'.join(lines)
+
+# The report being collected, if any
+active: Optional[Report] = None
+
+@contextmanager
+def collect(report: Optional[Report] = None, trace: Optional[Callable[[str, Any], None]] = None) -> Iterator[Report]:
+    ''' Record into `report` (default: a new `Report(trace)`) until exit. An
+    inner `collect` takes over from an outer one until it exits.
+    '''
+    global active
+    if report is None:
+        report = Report(trace)
+
+    previous, active = active, report
+    try:
+        yield report
+    finally:
+        active = previous
+
+def timed(f: Callable, name: str = 'evaluate') -> Callable:
+    ''' `f`, timing each call as stage `name` while a report is active. '''
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        report = active
+        if report is None:
+            return f(*args, **kwargs)
+        with report.stage(name):
+            return f(*args, **kwargs)
+
+    return wrapper
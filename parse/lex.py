@@ -1,7 +1,17 @@
+import functools
+import io
+import re
 import string
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import List
+from typing import Callable, Iterable, Iterator, List, TextIO, Union
+
+from parse import instrument
+
+# Commands `parse.parse` treats as prefix operators
+UNARY_COMMANDS = frozenset([ '\\sqrt', '-' ])
 
 @dataclass
 class LexToken:
@@ -15,15 +25,12 @@ class LexToken:
         ARG = auto()
         PAREN_LEFT = auto()
         PAREN_RIGHT = auto()
+        SUPERSCRIPT = auto()
 
     @property
     def unary_command(self) -> bool:
         # Technically subscript/superscript are unary
-        unary_commands = [
-            '\\sqrt', '-',
-        ]
-
-        return (self.type == LexToken.Type.COMMAND) and (self.value in unary_commands)
+        return (self.type == LexToken.Type.COMMAND) and (self.value in UNARY_COMMANDS)
     
     type: Type
     value: str
@@ -38,7 +45,41 @@ class LexState(Enum):
     NUMBER = auto()
     ARG = auto()
 
-def lex(input: str) -> List[LexToken]:
+class LexEngine(Enum):
+    # Character-at-a-time state machine; kept as the reference implementation
+    REFERENCE = auto()
+    # Single compiled master regex, dispatching on the matched group
+    TABLE = auto()
+
+DEFAULT_ENGINE = LexEngine.TABLE
+
+class LexDialect(Enum):
+    # The token stream `parse.parse` is written against: `{` followed by a
+    # letter or digit swallows the brace contents as a single ARG token, and
+    # commands run until `\\`, ` ` or `{`.
+    LEGACY = auto()
+    # TeX tokenization: commands are `\\` plus letters (or one other char),
+    # braces always delimit, and `^` is a SUPERSCRIPT token. Table engine only.
+    TEX = auto()
+
+def lex(input: str, engine: LexEngine = None, dialect: LexDialect = LexDialect.LEGACY) -> List[LexToken]:
+    match engine or DEFAULT_ENGINE:
+        case LexEngine.REFERENCE:
+            if dialect != LexDialect.LEGACY:
+                raise ValueError(f'The reference lexer only supports {LexDialect.LEGACY}')
+            report = instrument.active
+            if report is not None:
+                with report.stage('lex'):
+                    tokens = lex_reference(input)
+                report.count('tokens', len(tokens))
+                return tokens
+            return lex_reference(input)
+        case LexEngine.TABLE:
+            return lex_table(input, dialect)
+
+    raise ValueError(f'Unknown lex engine: {engine}')
+
+def lex_reference(input: str) -> List[LexToken]:
     state = LexState.NONE
     token_start = 0
     tokens = []
@@ -59,7 +100,7 @@ def lex(input: str) -> List[LexToken]:
                     continue
             case LexState.NUMBER:
                 if ch.isdigit() or ch == '.':
-                    break
+                    pass
                 else:
                     # TODO: Raise lex error if multiple decimals occur
                     tokens.append(LexToken(
@@ -162,4 +203,307 @@ def lex(input: str) -> List[LexToken]:
                 end_idx=i
             ))
     
-    return tokens
\ No newline at end of file
+    return tokens
+
+# One alternative per token class. Anything that matches none of them is
+# skipped by `finditer`, which is exactly what the reference engine does with
+# characters it has no case for (whitespace, `^`, `=`, ...).
+_TOKEN_PATTERN_TEMPLATE = r'''
+    (?P<COMMAND>\\[^\\\ {{]*)
+  | (?P<NUMBER>[{digit}][{digit}.]*)
+  | (?P<COMMAND_ARG_START>\{{)(?P<ARG>[a-z{digit}][^}}]*)?
+  | (?P<COMMAND_ARG_END>\}})
+  | (?P<VAR>[a-z])
+  | (?P<OP>[+\-])
+  | (?P<SUBSCRIPT>_)
+  | (?P<PAREN_LEFT>\()
+  | (?P<PAREN_RIGHT>\))
+'''
+
+_TEX_TOKEN_PATTERN_SOURCE = r'''
+    (?P<COMMAND>\\(?:[a-zA-Z]+|[^a-zA-Z])?)
+  | (?P<NUMBER>[0-9]+(?:\.[0-9]*)?|\.[0-9]+)
+  | (?P<COMMAND_ARG_START>\{)
+  | (?P<COMMAND_ARG_END>\})
+  | (?P<VAR>[a-zA-Z])
+  | (?P<OP>[+\-])
+  | (?P<SUBSCRIPT>_)
+  | (?P<SUPERSCRIPT>\^)
+  | (?P<PAREN_LEFT>\()
+  | (?P<PAREN_RIGHT>\))
+'''
+
+# Compiled on first use, so that importing the lexer (for `--help`, or a mode
+# that only needs one dialect) does not pay for both
+@functools.cache
+def _ascii_token_pattern() -> re.Pattern:
+    return re.compile(_TOKEN_PATTERN_TEMPLATE.format(digit='0-9'), re.VERBOSE)
+
+@functools.cache
+def _tex_token_pattern() -> re.Pattern:
+    return re.compile(_TEX_TOKEN_PATTERN_SOURCE, re.VERBOSE)
+
+@functools.cache
+def _unicode_token_pattern() -> re.Pattern:
+    # `str.isdigit` accepts far more than [0-9] outside of ASCII (and more than
+    # `\d`); only pay for building the exact class when such input shows up.
+    digits = ''.join(chr(c) for c in range(0x110000) if chr(c).isdigit())
+    return re.compile(_TOKEN_PATTERN_TEMPLATE.format(digit=re.escape(digits)), re.VERBOSE)
+
+def _token_pattern(input: str, dialect: LexDialect) -> re.Pattern:
+    if dialect == LexDialect.TEX:
+        return _tex_token_pattern()
+
+    return _ascii_token_pattern() if input.isascii() else _unicode_token_pattern()
+
+# Tokens whose end index is one past the last character (matching the
+# reference engine, which emits them when it reaches the terminating char).
+_SPAN_GROUPS = {
+    'COMMAND': LexToken.Type.COMMAND,
+    'NUMBER': LexToken.Type.NUMBER,
+}
+
+# Single character tokens; start and end index are equal.
+_CHAR_GROUPS = {
+    'COMMAND_ARG_START': LexToken.Type.COMMAND_ARG_START,
+    'COMMAND_ARG_END': LexToken.Type.COMMAND_ARG_END,
+    'VAR': LexToken.Type.VAR,
+    'OP': LexToken.Type.COMMAND,
+    'SUBSCRIPT': LexToken.Type.SUBSCRIPT,
+    'PAREN_LEFT': LexToken.Type.PAREN_LEFT,
+    'PAREN_RIGHT': LexToken.Type.PAREN_RIGHT,
+    'SUPERSCRIPT': LexToken.Type.SUPERSCRIPT,
+}
+
+def lex_table(input: str, dialect: LexDialect = LexDialect.LEGACY) -> List[LexToken]:
+    tokens = []
+    append = tokens.append
+
+    def emit(type: LexToken.Type, start: int, end: int):
+        append(LexToken(type, input[start:end] if end > start else input[start], start, end))
+
+    _scan(input, emit, dialect=dialect)
+    return tokens
+
+def _scan(
+    input: str,
+    emit: Callable[[LexToken.Type, int, int], None],
+    final: bool = True,
+    dialect: LexDialect = LexDialect.LEGACY,
+    pos: int = 0
+) -> int:
+    ''' Lex `input` from `pos` with the master pattern, calling
+    `emit(type, start, end)` for each token. `pos` must be where a match
+    started or ended (or 0) for the tokens to be those of a scan from the start.
+
+    Indices follow `LexToken`: single character tokens have `start == end`,
+    longer ones an exclusive `end`. When `final` is false more input may
+    follow, so a token that runs into the end of `input` (and could still grow)
+    is not emitted, and neither are characters after the last token skipped.
+    Returns the position in `input` lexing should resume from.
+    '''
+    report = instrument.active
+    if report is None:
+        return _scan_tokens(input, emit, final, dialect, pos)
+
+    count = 0
+    def counted(type: LexToken.Type, start: int, end: int):
+        nonlocal count
+        count += 1
+        emit(type, start, end)
+
+    try:
+        with report.stage('lex'):
+            return _scan_tokens(input, counted, final, dialect, pos)
+    finally:
+        report.count('tokens', count)
+
+def _scan_tokens(
+    input: str,
+    emit: Callable[[LexToken.Type, int, int], None],
+    final: bool,
+    dialect: LexDialect,
+    pos: int
+) -> int:
+    pattern = _token_pattern(input, dialect)
+    span_groups = _SPAN_GROUPS
+    char_groups = _CHAR_GROUPS
+    arg_start = LexToken.Type.COMMAND_ARG_START
+    arg = LexToken.Type.ARG
+    n = len(input)
+    # End of the last token; what follows matched nothing so far, but with
+    # more input it may yet start a token (a TeX `.` before `5`)
+    resume = pos
+
+    for m in pattern.finditer(input, pos):
+        group = m.lastgroup
+        start, end = m.span()
+        resume = end
+
+        if not final and end == n and (group in span_groups or group == 'ARG' or group == 'COMMAND_ARG_START'):
+            return start
+
+        if group in span_groups:
+            emit(span_groups[group], start, end)
+        elif group == 'ARG':
+            emit(arg_start, start, start)
+            if end == n:
+                # Unterminated arg: the reference engine drops it and stops.
+                return n
+            emit(arg, start+1, end)
+        else:
+            emit(char_groups[group], start, start)
+
+    return n if final else resume
+
+def iter_tokens(
+    source: Union[str, TextIO],
+    chunk_size: int = 64 * 1024,
+    dialect: LexDialect = LexDialect.LEGACY
+) -> Iterator[LexToken]:
+    ''' Lazily lex a string or a text stream (anything with `read(size)`).
+
+    Streams are read `chunk_size` characters at a time; tokens are identical
+    to `lex` over the concatenated input, including indices. Only the token
+    still being read, and anything skipped since the last one, is kept from
+    one chunk to the next.
+    '''
+    if isinstance(source, str):
+        source = io.StringIO(source)
+
+    pending = []
+    buffer = ''
+    # Absolute index of buffer[0]
+    offset = 0
+    size = chunk_size
+
+    def emit(type: LexToken.Type, start: int, end: int):
+        value = buffer[start:end] if end > start else buffer[start]
+        pending.append(LexToken(type, value, start+offset, end+offset))
+
+    while True:
+        chunk = source.read(size)
+        final = not chunk
+        buffer = buffer + chunk if buffer else chunk
+
+        resume = _scan(buffer, emit, final, dialect)
+        yield from pending
+        pending.clear()
+
+        if final:
+            return
+
+        buffer = buffer[resume:]
+        offset += resume
+        # The unfinished token is scanned again with the next chunk; reading
+        # at least as much as it holds keeps that linear in its length
+        size = max(chunk_size, len(buffer))
+
+# Type codes stored in a `TokenBuffer`, indexed by `LexToken.Type.value`.
+_TYPES_BY_CODE = { type.value: type for type in LexToken.Type }
+
+class TokenBuffer(Sequence):
+    ''' Compact token list: parallel arrays of type codes and start/end offsets
+    into the source string.
+
+    Indexing returns a `LexToken` view of a single token; slicing returns a
+    `TokenBuffer` over the same arrays, so neither copies the token data.
+    Values are only materialized on access (`value_at`, `value_view`).
+    '''
+
+    def __init__(self, source: str, types: array = None, starts: array = None, ends: array = None, lo: int = 0, hi: int = None):
+        self.source = source
+        self.types = types if types is not None else array('B')
+        self.starts = starts if starts is not None else array('I')
+        self.ends = ends if ends is not None else array('I')
+        self._lo = lo
+        self._hi = len(self.types) if hi is None else hi
+        self._encoded = None
+
+    @staticmethod
+    def from_tokens(source: str, tokens: Iterable[LexToken]) -> 'TokenBuffer':
+        buffer = TokenBuffer(source)
+        for token in tokens:
+            buffer.append(token.type, token.start_idx, token.end_idx)
+        return buffer
+
+    def append(self, type: LexToken.Type, start: int, end: int):
+        assert self._lo == 0 and self._hi == len(self.types), 'Cannot append to a slice'
+        self.types.append(type.value)
+        self.starts.append(start)
+        self.ends.append(end)
+        self._hi += 1
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            lo, hi, step = i.indices(len(self))
+            if step != 1:
+                return [ self[j] for j in range(lo, hi, step) ]
+            return TokenBuffer(self.source, self.types, self.starts, self.ends, self._lo + lo, self._lo + max(lo, hi))
+
+        j = self._lo + i if i >= 0 else self._hi + i
+        if not self._lo <= j < self._hi:
+            raise IndexError('TokenBuffer index out of range')
+
+        start = self.starts[j]
+        end = self.ends[j]
+        value = self.source[start:end] if end > start else self.source[start]
+        return LexToken(_TYPES_BY_CODE[self.types[j]], value, start, end)
+
+    def __iter__(self) -> Iterator[LexToken]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f'TokenBuffer({list(self)!r})'
+
+    def type_at(self, i: int) -> LexToken.Type:
+        return _TYPES_BY_CODE[self.types[self._lo + i]]
+
+    def start_at(self, i: int) -> int:
+        return self.starts[self._lo + i]
+
+    def end_at(self, i: int) -> int:
+        return self.ends[self._lo + i]
+
+    def value_at(self, i: int) -> str:
+        start = self.starts[self._lo + i]
+        end = self.ends[self._lo + i]
+        return self.source[start:end] if end > start else self.source[start]
+
+    def value_view(self, i: int) -> memoryview:
+        ''' Zero-copy view of a token's value; only available for ASCII sources,
+        where string and byte offsets agree.
+        '''
+        if self._encoded is None:
+            if not self.source.isascii():
+                raise ValueError('memoryview access requires an ASCII source')
+            self._encoded = memoryview(self.source.encode('ascii'))
+
+        start = self.starts[self._lo + i]
+        end = self.ends[self._lo + i]
+        return self._encoded[start:end] if end > start else self._encoded[start:start+1]
+
+    @property
+    def nbytes(self) -> int:
+        ''' Bytes used by the token arrays (excluding the source string). '''
+        return sum(a.itemsize * len(a) for a in (self.types, self.starts, self.ends))
+
+def lex_buffer(input: str, dialect: LexDialect = LexDialect.LEGACY) -> TokenBuffer:
+    ''' Lex `input` straight into a `TokenBuffer`, without building `LexToken`s. '''
+    buffer = TokenBuffer(input)
+    types = buffer.types.append
+    starts = buffer.starts.append
+    ends = buffer.ends.append
+
+    def emit(type: LexToken.Type, start: int, end: int):
+        types(type.value)
+        starts(start)
+        ends(end)
+
+    _scan(input, emit, dialect=dialect)
+    buffer._hi = len(buffer.types)
+    return buffer
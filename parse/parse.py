@@ -1,299 +1,479 @@
+import functools
+import threading
 from dataclasses import dataclass
-from typing import Any, List, Self, Optional, Callable
+from typing import Any, List, Self, Optional, Callable, Iterable, Sequence, TextIO, Union
 from enum import Enum, auto
-from json import JSONEncoder
 
-from parse import lex
-from parse.primitives import consume_scope, consume_while
+from parse import instrument, lex
+from parse.primitives import consume_scope
+from tex_ast import visitor
 from tex_ast.ast import *
 
+# Parser functions take `(tokens, pos, stop)`: they parse from `tokens[pos]`
+# without looking at or past `tokens[stop]` (default: the end of `tokens`),
+# and report where they stopped in `ParseResult.end`. Token lists are never
+# sliced, so parsing is linear in the number of tokens.
+Tokens = Sequence[lex.LexToken]
+
 def min_tokens(min_tokens: int):
-    def wrapper(f: Callable[[List[lex.LexToken]], ParseResult]):
-        def handle_tokens(tokens: List[lex.LexToken]) -> ParseResult:
-            if len(tokens) < min_tokens:
-                raise ParseException(f'Token list of insufficient length: {len(tokens)} < {min_tokens}')
+    ''' Decorate a parser function to raise `ParseException` unless at least
+    `min_tokens` tokens follow `pos`; the check `_require` makes inline.
+    '''
+    def wrapper(f: Callable[[Tokens, int, int], ParseResult]):
+        @functools.wraps(f)
+        def handle_tokens(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+            return f(tokens, pos, _require(tokens, pos, stop, min_tokens))
 
-            return f(tokens)
-        
         return handle_tokens
-    
+
     return wrapper
 
+def _require(tokens: Tokens, pos: int, stop: Optional[int], count: int) -> int:
+    ''' `stop`, defaulted, after checking for `count` tokens from `pos`. '''
+    if stop is None:
+        stop = len(tokens)
+    if stop - pos < count:
+        raise ParseException(f'Token list of insufficient length: {stop - pos} < {count}')
+    return stop
+
 @dataclass
 class ParseResult:
     result: ASTNode
-    remainder: List[lex.LexToken]
+    tokens: Tokens
+    # Index of the first token not consumed
+    end: int
+
+    @property
+    def remainder(self) -> Tokens:
+        return self.tokens[self.end:]
 
 class ParseException(Exception):
     ...
 
-def parse_number(tokens: List[lex.LexToken]) -> ParseResult:
-    if len(tokens) < 1:
-        raise ParseException('Empty token list.')
-    
-    # TODO: Drop arg type
-    if tokens[0].type == lex.LexToken.Type.NUMBER or \
-        tokens[0].type == lex.LexToken.Type.ARG:
-        return ParseResult(
-            ASTNumber(children=[], number=float(tokens[0].value)), 
-            tokens[1:])
-    
-    raise ParseException(f'Failed to parse token as number: {tokens[0].value}')
-
-def parse_variable(tokens: List[lex.LexToken]) -> ParseResult:
-    if len(tokens) < 1:
-        raise ParseException('Empty token list.')
-    
-    if tokens[0].type == lex.LexToken.Type.VAR:
-        return ParseResult(
-            ASTVar(children=[], name=tokens[0].value),
-            tokens[1:])
-
-    raise ParseException(f'Failed to parse token as variable: {tokens[0].value}')
-
-def parse_infix_binary_op_left_arg(tokens: List[lex.LexToken]) -> ParseResult:
-    try:
-        return parse_number(tokens).result
-    except:
-        ...
-    
-    return parse_variable(tokens).result
-
-def parse_infix_binary_op_right_arg(tokens: List[lex.LexToken]) -> ParseResult:
-    try:
-        return parse_infix_binary_op(tokens).result
-    except:
-        ...
-    
-    try:
-        return parse_number(tokens).result
-    except:
-        ...
-
-    return parse_variable(tokens).result
-
-def parse_infix_binary_op(tokens: List[lex.LexToken]) -> ParseResult:
-    ''' Parse operators of the form `a OP b`.
-
-    This differs from typical latex functions such as `\\frac{a}{b}` which pass
-    the args directly after.
+def _stop(tokens: Tokens, stop: Optional[int]) -> int:
+    return len(tokens) if stop is None else stop
+
+def _first(
+    alternatives: Sequence[Callable[[Tokens, int, Optional[int]], ParseResult]],
+    tokens: Tokens,
+    pos: int,
+    stop: Optional[int],
+    error: Optional[str] = None
+) -> ParseResult:
+    ''' The result of the first of `alternatives` that parses. If they all
+    fail, raises `ParseException(error)`, or without `error` lets the last
+    one's exception through.
     '''
+    report = instrument.active
+    for i, alternative in enumerate(alternatives):
+        if report is not None:
+            report.count('attempts')
+        if error is None and i == len(alternatives) - 1:
+            return alternative(tokens, pos, stop)
+
+        try:
+            return alternative(tokens, pos, stop)
+        except Exception as e:
+            if report is not None:
+                report.count('backtracks')
+                report.trace('backtrack', (alternative.__name__, pos, e))
+
+    raise ParseException(error)
+
+def _plain_var(name: str) -> ASTVar:
+    return ASTVar(children=[], name=name)
+
+def _plain_number(number) -> ASTNumber:
+    return ASTNumber(children=[], number=number)
+
+def _plain_arg(value: str) -> ASTArg:
+    return ASTArg(children=[], value=value)
+
+def _plain_binary_op(type: ASTBinaryOp.Type, left_arg: ASTNode, right_arg: ASTNode) -> ASTBinaryOp:
+    return ASTBinaryOp(children=[], type=type, left_arg=left_arg, right_arg=right_arg)
+
+def _plain_unary_command(type: ASTUnaryCommand.Type, arg: ASTNode) -> ASTUnaryCommand:
+    return ASTUnaryCommand(children=[], type=type, arg=arg)
+
+def _plain_expression(children: List[ASTNode]) -> ASTExpression:
+    return ASTExpression(children=children)
+
+_T = lex.LexToken.Type
+
+# What `ASTBinaryOp.Type.from_token` and `ASTUnaryCommand.Type.from_token`
+# return, by token value
+_BINARY_TYPES = { '+': ASTBinaryOp.Type.ADD, '\\cdot': ASTBinaryOp.Type.MULTIPLY, '\\frac': ASTBinaryOp.Type.DIVIDE }
+_UNARY_TYPES = { '\\sqrt': ASTUnaryCommand.Type.SQRT, '-': ASTUnaryCommand.Type.NEGATIVE }
+
+class Parser:
+    ''' The backtracking parser, set up once to parse any number of inputs.
 
-    if len(tokens) < 3:
-        raise ParseException(f'Token list of insufficient length: {len(tokens)}')
-    
-    left_arg, function, right_arg = tokens[:3]
-    function_type = ASTBinaryOp.Type.from_token(function)
-
-    if function_type is None:
-        raise ParseException(f'Failed to extract function type: {function.value}')
-
-    left_arg = parse_infix_binary_op_left_arg(tokens)
-    # Currently no paren support
-    right_arg = parse_infix_binary_op_right_arg(tokens[2:])
-
-    return ParseResult(
-        ASTBinaryOp(children=[], type=function_type, left_arg=left_arg, right_arg=right_arg),
-        tokens[3:]
-    )
-
-@min_tokens(5)
-def parse_var_subscript(tokens: List[lex.LexToken]) -> ParseResult:
-    # ex: x_{33}; 5 tokens -- [VAR, SUBSCRIPT, OPEN ARG CLOSE ]
-
-    var,_,_,arg,_ = tokens[:5]
-    name = var.value + arg.value
-
-    return ParseResult(
-        ASTVar(children=[], name=name),
-        tokens[5:]
-    )
-
-@min_tokens(1)
-def parse_arg(tokens: List[lex.LexToken]) -> ParseResult:
-    return ParseResult(
-        ASTArg(children=[], value=tokens[0].value),
-        tokens[1:]
-    )
-
-@min_tokens(5)
-def parse_var_superscript(tokens: List[lex.LexToken]) -> ParseResult:
-    var,_,_,arg = tokens[:4]
-
-    var = parse_variable(tokens).result
-
-    if arg.type == lex.LexToken.Type.ARG:
-        arg = parse_arg(tokens[3:]).result
-        remaining = tokens[5:]
-    else:
-        # TODO: Parse expression between tokens
-        raise NotImplementedError()
-
-    return ParseResult(
-        ASTBinaryOp(children=[], type=ASTBinaryOp.Type.POW, left_arg=var, right_arg=arg),
-        remaining
-    )
-
-def parse_binary_op(tokens: List[lex.LexToken]) -> ParseResult:
-    first_arg_scope = consume_scope(
-        tokens[1:],
-        start=lex.LexToken.Type.COMMAND_ARG_START,
-        end=lex.LexToken.Type.COMMAND_ARG_END)
-    first_arg = first_arg_scope.result
-
-    second_arg_scope = consume_scope(
-        first_arg_scope.remainder,
-        start=lex.LexToken.Type.COMMAND_ARG_START,
-        end=lex.LexToken.Type.COMMAND_ARG_END)
-    second_arg = second_arg_scope.result
-
-    first_arg = parse_arg(first_arg).result
-    second_arg = parse_arg(second_arg).result
-
-    return ParseResult(
-        ASTBinaryOp(
-            children=[], 
-            type=ASTBinaryOp.Type.from_token(tokens[0]), 
-            left_arg=first_arg, 
-            right_arg=second_arg),
-        remainder=second_arg_scope.remainder)
-    
-@min_tokens(2)
-def parse_expression(tokens: List[lex.LexToken]) -> ParseResult:
-    scope_tokens = consume_scope(
-        tokens=tokens,
-        start=lex.LexToken.Type.PAREN_LEFT,
-        end=lex.LexToken.Type.PAREN_RIGHT
-    ) 
-
-    expr = parse(scope_tokens.result)
-
-    return ParseResult(
-        ASTExpression(children=[expr.result]),
-        remainder=scope_tokens.remainder
-    )
-
-def parse_implicit_multiplication(tokens: List[lex.LexToken]) -> ParseResult:
-    ''' Parse a sequence of the form (Var|Number)+; ex: 2xt 
-    
-    This should produce a tree of the form 2*(x*t)
+    `parse` tries the alternatives for an expression in turn, but only
+    those that can match its first token, looked up in a table built here.
+    Infix chains collect their operands into lists kept between calls.
+    Nodes are built by `interner` if given, so that every tree parsed
+    shares one pool of nodes (see `tex_ast.interned`), and are plain nodes
+    otherwise. The functions in this module parse with one `Parser` per
+    thread; a `Parser` itself is not thread-safe.
     '''
 
-    # Simple: consume the sequence as long as (Number|Var) is satisfied
-    # One issue: the final var needs to _not_ have a trailing command applied
-    # TODO: Implement `consume_while` predicate
-    #is_implicit = lambda token: 
-    def is_implicit(token: lex.LexToken) -> bool:
-        # TODO: Check that following token is not a postfix command
-        # In that case, may need to pass more state (pos, tokens, ...) 
-        return (token.type == lex.LexToken.Type.VAR) or (token.type == lex.LexToken.Type.NUMBER)
-    
-    consume_result = consume_while(tokens, is_implicit)
-    print(f'consume result: {consume_result.result}')
-
-    def token_node(token: lex.LexToken) -> Optional[ASTNode]:
-        match token.type:
-            case lex.LexToken.Type.NUMBER:
-                return ASTNumber(children=[], number=token.value)
-            case lex.LexToken.Type.VAR:
-                return ASTVar(children=[], name=token.value)
-        
+    def __init__(self, interner: Optional['Interner'] = None):
+        self.interner = interner
+        if interner is None:
+            self._var, self._number, self._arg = _plain_var, _plain_number, _plain_arg
+            self._binary_op, self._unary_command, self._expression = _plain_binary_op, _plain_unary_command, _plain_expression
+        else:
+            self._var, self._number, self._arg = interner.var, interner.number, interner.arg
+            self._binary_op, self._unary_command, self._expression = interner.binary_op, interner.unary_command, interner.expression
+
+        # Alternatives for `parse`, by the first token's type and whether its
+        # value names a binary command, in the order they are tried. The
+        # others fail on that token: an expression opens with a parenthesis,
+        # and an infix operation with a number or a variable.
+        self._alternatives = {}
+        for type in _T:
+            for binary in (False, True):
+                alternatives = []
+                if type == _T.PAREN_LEFT:
+                    alternatives.append(self.parse_expression)
+                if binary:
+                    alternatives.append(self.parse_binary_op)
+                if type in (_T.NUMBER, _T.ARG, _T.VAR):
+                    alternatives.append(self.parse_infix_binary_op)
+                if type in (_T.NUMBER, _T.ARG):
+                    alternatives.append(self.parse_number)
+                self._alternatives[type, binary] = tuple(alternatives)
+
+        self._right_arg_alternatives = (self.parse_infix_binary_op, self.parse_number, self.parse_variable)
+        # Operands and operators of the infix chain being parsed
+        self._left_args: List[ASTNode] = []
+        self._function_types: List[ASTBinaryOp.Type] = []
+
+    def parse_program(self, tex: Union[str, TextIO, Iterable[lex.LexToken]]) -> ASTNode:
+        ''' A complete program from a string, a text stream, or tokens. '''
+        # Backtracking goes back over tokens, so it needs them all at hand
+        # (`parse.pratt` reads a stream in one pass instead). A list rather
+        # than a `lex.TokenBuffer`: the parser reads `tokens[pos]`, which on a
+        # buffer builds a new `LexToken` each time. Buffers still parse, for
+        # callers that keep tokens around and want them compact.
+        if isinstance(tex, str):
+            tokens = lex.lex(tex)
+        elif hasattr(tex, 'read'):
+            tokens = list(lex.iter_tokens(tex))
+        elif isinstance(tex, Sequence):
+            tokens = tex
+        else:
+            tokens = list(tex)
+
+        report = instrument.active
+        if report is None:
+            return self.parse(tokens).result
+
+        with report.stage('parse'):
+            ast = self.parse(tokens).result
+        report.count('parses')
+        report.count('nodes', tree_size(ast))
+        return ast
+
+    # `parse_expression` should parse any substructure
+    def parse(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        # At the top-level the possibilities (currently) are:
+        # - Expression
+        # - Binary op
+        # TODO: Unary, function assignment
+        # TODO: 'Flat' binary op (using parens)
+        if stop is None:
+            stop = len(tokens)
+        alternatives = ()
+        if pos < stop:
+            token = tokens[pos]
+            alternatives = self._alternatives[token.type, token.value in _BINARY_TYPES]
+        return _first(alternatives, tokens, pos, stop, error='Failed to parse tokens.')
+
+    def parse_number(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        if pos >= _stop(tokens, stop):
+            raise ParseException('Empty token list.')
+
+        token = tokens[pos]
+        # TODO: Drop arg type
+        if token.type == _T.NUMBER or token.type == _T.ARG:
+            return ParseResult(self._number(float(token.value)), tokens, pos+1)
+
+        raise ParseException(f'Failed to parse token as number: {token.value}')
+
+    def parse_variable(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        if pos >= _stop(tokens, stop):
+            raise ParseException('Empty token list.')
+
+        token = tokens[pos]
+        if token.type == _T.VAR:
+            return ParseResult(self._var(token.value), tokens, pos+1)
+
+        raise ParseException(f'Failed to parse token as variable: {token.value}')
+
+    def parse_infix_binary_op_left_arg(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        stop = _stop(tokens, stop)
+        node = self._operand(tokens, pos, stop)
+        if node is None:
+            # As `parse_variable`, the last alternative, reports it
+            return self.parse_variable(tokens, pos, stop)
+        return ParseResult(node, tokens, pos+1)
+
+    def parse_infix_binary_op_right_arg(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        return _first(self._right_arg_alternatives, tokens, pos, stop)
+
+    def _operand(self, tokens: Tokens, pos: int, stop: int) -> Optional[ASTNode]:
+        ''' The number or variable at `pos`, as `parse_number` or else
+        `parse_variable` parses it; None if neither does.
+        '''
+        if pos >= stop:
+            return None
+
+        token = tokens[pos]
+        type = token.type
+        if type == _T.NUMBER or type == _T.ARG:
+            try:
+                return self._number(float(token.value))
+            except ValueError:
+                return None
+        if type == _T.VAR:
+            return self._var(token.value)
         return None
 
-    # TODO: Generic approach to building n-ary trees?
-    # TODO: Worth testing tree building elsewhere..?
-    def build_tree(tokens: List[lex.LexToken]) -> ASTBinaryOp:
-        assert len(tokens) > 1
-        node = ASTBinaryOp(
-            children=[],
-            type=ASTBinaryOp.Type.MULTIPLY,
-            left_arg=None,
-            right_arg=None)
-
-        node.left_arg = token_node(tokens[0])#ASTNode(tokens[0])   # TODO: Process as node
-        node.right_arg = build_tree_rec(tokens[1:], node)
-        return node
-
-    def build_tree_rec(tokens: List[lex.LexToken], parent: ASTBinaryOp) -> ASTNode:
-        print(f'tokens: {tokens}')
-        if len(tokens) > 1:
-            node = ASTBinaryOp(
-                children=[], 
-                type=ASTBinaryOp.Type.MULTIPLY, 
-                left_arg=None, 
-                right_arg=None)
-
-            print('building sub op')
-            # TODO: Obtain proper node type (should be VAR/NUMBER)
-            node.left_arg = token_node(tokens[0])#ASTNode(tokens[0])
-            node.right_arg = build_tree_rec(tokens[1:], node)
-            return node
+    def parse_infix_binary_op(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        ''' Parse operators of the form `a OP b`.
+
+        This differs from typical latex functions such as `\\frac{a}{b}` which pass
+        the args directly after.
+
+        The right operand is itself tried as `b OP c` first (see
+        `parse_infix_binary_op_right_arg`), so a chain `a+b+c` nests to the right
+        as `a+(b+c)`. Chains are followed in a loop rather than by recursion, so
+        their length is not limited by the recursion limit.
+        '''
+        stop = _stop(tokens, stop)
+
+        if stop - pos < 3:
+            raise ParseException(f'Token list of insufficient length: {stop - pos}')
+
+        function = tokens[pos+1]
+        function_type = _BINARY_TYPES.get(function.value)
+
+        if function_type is None:
+            raise ParseException(f'Failed to extract function type: {function.value}')
+
+        left_arg = self._operand(tokens, pos, stop)
+        if left_arg is None:
+            self.parse_variable(tokens, pos, stop)
+
+        left_args = self._left_args
+        function_types = self._function_types
+        left_args.clear()
+        function_types.clear()
+        left_args.append(left_arg)
+        function_types.append(function_type)
+        pos += 2
+
+        while True:
+            # Currently no paren support
+            operand = self._operand(tokens, pos, stop)
+            function_type = _BINARY_TYPES.get(tokens[pos+1].value) if stop - pos >= 3 else None
+            if operand is not None and function_type is not None:
+                left_args.append(operand)
+                function_types.append(function_type)
+                pos += 2
+                continue
+
+            if operand is not None:
+                right_arg = operand
+                end = pos + 1
+            elif len(function_types) > 1:
+                # The last operator has no right operand, so the chain ends
+                # before it, with its left operand
+                function_types.pop()
+                right_arg = left_args.pop()
+                end = pos - 1
+            else:
+                raise ParseException(f'Failed to parse right operand at token {pos}')
+            break
+
+        node = right_arg
+        binary_op = self._binary_op
+        for i in range(len(left_args) - 1, -1, -1):
+            node = binary_op(function_types[i], left_args[i], node)
+        left_args.clear()
+        function_types.clear()
+
+        return ParseResult(node, tokens, end)
+
+    def parse_var_subscript(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        # ex: x_{33}; 5 tokens -- [VAR, SUBSCRIPT, OPEN ARG CLOSE ]
+        _require(tokens, pos, stop, 5)
+        name = tokens[pos].value + tokens[pos+3].value
+        return ParseResult(self._var(name), tokens, pos+5)
+
+    def parse_arg(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        _require(tokens, pos, stop, 1)
+        return ParseResult(self._arg(tokens[pos].value), tokens, pos+1)
+
+    def parse_var_superscript(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        stop = _require(tokens, pos, stop, 5)
+        var = self.parse_variable(tokens, pos, stop).result
+
+        if tokens[pos+3].type == _T.ARG:
+            arg = self.parse_arg(tokens, pos+3, stop).result
+            end = pos+5
         else:
-            # TODO: Obtain node from lexical token
-            return token_node(tokens[0])#ASTNode(children=[tokens[0]])
-
-
-    ast = build_tree(consume_result.result)
-    # TODO: Join tokens to binary op tree
-    # Probably best to join recursively? (A reduce could work..?)
-
-    return ParseResult(
-        result=ast,
-        remainder=consume_result.remainder
-    )
-
-# Think: prefix op
-@min_tokens(1)
-def parse_unary_op(tokens: List[lex.LexToken]) -> ParseResult:
-    if not tokens[0].unary_command:
-        raise ParseException()
-    
-    # TODO: Should parse any subexpression 
-    command_type = ASTUnaryCommand.Type.from_token(tokens[0])
-    arg_tokens = consume_scope(
-        tokens=tokens[1:], 
-        start=lex.LexToken.Type.COMMAND_ARG_START,
-        end=lex.LexToken.Type.COMMAND_ARG_END)
-    arg_parse = parse(arg_tokens.result)
-
-    print(arg_tokens.result)
-
-    return ParseResult(
-        result=ASTUnaryCommand(
-            children=[],
-            type=command_type,
-            arg=arg_parse.result),
-        remainder=arg_parse.remainder)
-
-# `parse_expression` should parse any substructure 
-def parse(tokens: List[lex.LexToken]) -> ParseResult:
-    # At the top-level the possibilities (currently) are:
-    # - Expression
-    # - Binary op
-    # TODO: Unary, function assignment
-    # TODO: 'Flat' binary op (using parens)
-    try:
-        return parse_expression(tokens)
-    except:
-        ...
-    
-    try:
-        return parse_binary_op(tokens)
-    except:
-        ... 
-
-    try:
-        return parse_infix_binary_op(tokens)
-    except:
-        ...
-    
-    try:
-        return parse_number(tokens)
-    except:
-        ...
-    
-    raise ParseException('Failed to parse tokens.')
-
-def parse_program(tex: str) -> ASTNode:
-    tokens = lex.lex(tex)
-    return parse(tokens).result
\ No newline at end of file
+            # TODO: Parse expression between tokens
+            raise NotImplementedError()
+
+        return ParseResult(self._binary_op(ASTBinaryOp.Type.POW, var, arg), tokens, end)
+
+    def parse_binary_op(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        stop = _stop(tokens, stop)
+        if pos >= stop:
+            raise ParseException('Empty token list.')
+
+        function_type = _BINARY_TYPES.get(tokens[pos].value)
+        if function_type is None:
+            raise ParseException(f'Failed to extract function type: {tokens[pos].value}')
+
+        first_arg_scope = consume_scope(tokens, start=_T.COMMAND_ARG_START, end=_T.COMMAND_ARG_END, pos=pos+1, stop=stop)
+        second_arg_scope = consume_scope(tokens, start=_T.COMMAND_ARG_START, end=_T.COMMAND_ARG_END, pos=first_arg_scope.next, stop=stop)
+
+        first_arg = self.parse_arg(tokens, first_arg_scope.start, first_arg_scope.end).result
+        second_arg = self.parse_arg(tokens, second_arg_scope.start, second_arg_scope.end).result
+
+        return ParseResult(self._binary_op(function_type, first_arg, second_arg), tokens, end=second_arg_scope.next)
+
+    def parse_expression(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        stop = _require(tokens, pos, stop, 2)
+        scope = consume_scope(tokens=tokens, start=_T.PAREN_LEFT, end=_T.PAREN_RIGHT, pos=pos, stop=stop)
+        expr = self.parse(tokens, scope.start, scope.end)
+        return ParseResult(self._expression([expr.result]), tokens, end=scope.next)
+
+    def parse_implicit_multiplication(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        ''' Parse a sequence of the form (Var|Number)+; ex: 2xt
+
+        This should produce a tree of the form 2*(x*t)
+        '''
+        stop = _stop(tokens, stop)
+
+        # Simple: consume the sequence as long as (Number|Var) is satisfied
+        # One issue: the final var needs to _not_ have a trailing command applied
+        # TODO: Check that following token is not a postfix command
+        end = pos
+        while end < stop and tokens[end].type in (_T.VAR, _T.NUMBER):
+            end += 1
+        if instrument.active is not None:
+            instrument.active.trace('implicit_multiplication', tokens[pos:end])
+
+        # Right to left, so `2xt` nests as `2*(x*t)`
+        assert end - pos > 1
+        node = self._token_node(tokens[end-1])
+        for i in range(end - 2, pos - 1, -1):
+            node = self._binary_op(ASTBinaryOp.Type.MULTIPLY, self._token_node(tokens[i]), node)
+
+        return ParseResult(result=node, tokens=tokens, end=end)
+
+    def _token_node(self, token: lex.LexToken) -> ASTNode:
+        if token.type == _T.NUMBER:
+            return self._number(token.value)
+        return self._var(token.value)
+
+    # Think: prefix op
+    def parse_unary_op(self, tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+        stop = _require(tokens, pos, stop, 1)
+        if not tokens[pos].unary_command:
+            raise ParseException()
+
+        # TODO: Should parse any subexpression
+        command_type = _UNARY_TYPES.get(tokens[pos].value)
+        arg_scope = consume_scope(tokens=tokens, start=_T.COMMAND_ARG_START, end=_T.COMMAND_ARG_END, pos=pos+1, stop=stop)
+        arg_parse = self.parse(tokens, arg_scope.start, arg_scope.end)
+
+        if instrument.active is not None:
+            instrument.active.trace('unary_op', arg_scope.result)
+
+        return ParseResult(result=self._unary_command(command_type, arg_parse.result), tokens=tokens, end=arg_scope.next)
+
+_local = threading.local()
+
+def default_parser() -> Parser:
+    ''' The `Parser` the functions below use, one per thread. '''
+    parser = getattr(_local, 'parser', None)
+    if parser is None:
+        parser = _local.parser = Parser()
+    return parser
+
+# Thin wrappers over `default_parser()`, with the same arguments as its methods
+
+def parse_number(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_number(tokens, pos, stop)
+
+def parse_variable(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_variable(tokens, pos, stop)
+
+def parse_infix_binary_op_left_arg(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_infix_binary_op_left_arg(tokens, pos, stop)
+
+def parse_infix_binary_op_right_arg(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_infix_binary_op_right_arg(tokens, pos, stop)
+
+def parse_infix_binary_op(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_infix_binary_op(tokens, pos, stop)
+
+def parse_var_subscript(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_var_subscript(tokens, pos, stop)
+
+def parse_arg(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_arg(tokens, pos, stop)
+
+def parse_var_superscript(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_var_superscript(tokens, pos, stop)
+
+def parse_binary_op(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_binary_op(tokens, pos, stop)
+
+def parse_expression(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_expression(tokens, pos, stop)
+
+def parse_implicit_multiplication(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_implicit_multiplication(tokens, pos, stop)
+
+def parse_unary_op(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse_unary_op(tokens, pos, stop)
+
+def parse(tokens: Tokens, pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    return default_parser().parse(tokens, pos, stop)
+
+def tree_size(root: ASTNode) -> int:
+    ''' Number of nodes in the tree `root`. '''
+    return sum(1 for _ in visitor.walk(root))
+
+class ParseEngine(Enum):
+    # Recursive descent with backtracking over the legacy token stream
+    BACKTRACKING = auto()
+    # Single pass precedence climbing; see `parse.pratt`
+    PRATT = auto()
+
+DEFAULT_ENGINE = ParseEngine.BACKTRACKING
+
+def parse_program(
+    tex: Union[str, TextIO, Iterable[lex.LexToken]],
+    engine: ParseEngine = None,
+    cache: 'ParseCache' = None
+) -> ASTNode:
+    ''' Parse a complete program from a string, a text stream, or tokens
+    already produced by `lex.iter_tokens`.
+
+    Pass a `parse.cache.ParseCache` to reuse results for repeated sources.
+    '''
+    if cache is not None and isinstance(tex, str):
+        return cache.parse_program(tex, engine)
+
+    if (engine or DEFAULT_ENGINE) == ParseEngine.PRATT:
+        from parse import pratt
+        return pratt.parse_program(tex)
+
+    return default_parser().parse_program(tex)
@@ -0,0 +1,277 @@
+''' Predictive (Pratt) parser.
+
+`parse.parse` tries each alternative in turn and backtracks on
+`ParseException`. This parser instead picks a rule from one token of
+lookahead and resolves precedence with binding powers, so it makes a single
+pass over the tokens and only raises on malformed input. It reads the
+`LexDialect.TEX` token stream, which keeps brace contents as tokens and lexes
+`^`.
+
+Subtraction is represented as `a + (-b)`, as there is no binary minus node.
+'''
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TextIO, Tuple, Union
+
+from parse import instrument, lex
+from parse.parse import ParseException, ParseResult, tree_size
+from tex_ast.ast import *
+
+_T = lex.LexToken.Type
+
+# Commands that only affect layout
+IGNORED_COMMANDS = frozenset([ '\\left', '\\right', '\\,', '\\;', '\\:', '\\!', '\\ ' ])
+
+ADD_BP = 10
+MULTIPLY_BP = 20
+PREFIX_BP = 30
+POW_BP = 40
+
+class _Parser:
+    ''' Parser state over a pre-filtered token stream.
+
+    Each token is reduced to a dispatch key: the command text for COMMAND
+    tokens (`'+'`, `'\\frac'`, ...), otherwise its `LexToken.Type`.
+    '''
+
+    def __init__(self, keys: List, values: List[str], positions: List[int]):
+        self.keys = keys
+        self.values = values
+        self.positions = positions
+        self.i = 0
+
+    def peek(self):
+        return self.keys[self.i] if self.i < len(self.keys) else None
+
+    def expect(self, key) -> str:
+        if self.peek() != key:
+            found = self.values[self.i] if self.i < len(self.keys) else 'end of input'
+            raise ParseException(f'Expected {key}, found {found!r}')
+
+        value = self.values[self.i]
+        self.i += 1
+        return value
+
+    def expression(self, rbp: int = 0) -> ASTNode:
+        left = self.prefix()
+
+        while self.i < len(self.keys):
+            key = self.keys[self.i]
+            infix = _INFIX.get(key)
+            if infix is not None:
+                bp, build = infix
+                if bp <= rbp:
+                    break
+                self.i += 1
+                left = build(self, left)
+            elif key in _PRIMARY_START:
+                # Implicit multiplication: `2x`, `a\\sqrt{b}`, ...
+                if MULTIPLY_BP <= rbp:
+                    break
+                right = self.expression(MULTIPLY_BP)
+                left = ASTBinaryOp(children=[], type=ASTBinaryOp.Type.MULTIPLY, left_arg=left, right_arg=right)
+            else:
+                break
+
+        return left
+
+    def prefix(self) -> ASTNode:
+        key = self.peek()
+        prefix = _PREFIX.get(key)
+        if prefix is None:
+            found = self.values[self.i] if self.i < len(self.keys) else 'end of input'
+            raise ParseException(f'Unexpected token: {found!r}')
+
+        value = self.values[self.i]
+        self.i += 1
+        return prefix(self, value)
+
+    def group(self) -> ASTNode:
+        ''' A `{...}` command argument. '''
+        self.expect(_T.COMMAND_ARG_START)
+        inner = self.expression()
+        self.expect(_T.COMMAND_ARG_END)
+        return inner
+
+    def script_arg(self) -> ASTNode:
+        ''' The argument of `^`: a group, or else a single token. '''
+        if self.peek() == _T.COMMAND_ARG_START:
+            return self.group()
+        return self.prefix()
+
+    def script_text(self) -> str:
+        ''' The text of a `_` subscript, which becomes part of a name: a
+        letter or digits, or a group of those.
+        '''
+        if self.peek() != _T.COMMAND_ARG_START:
+            return self.script_piece()
+
+        self.i += 1
+        pieces = []
+        while self.peek() != _T.COMMAND_ARG_END:
+            pieces.append(self.script_piece())
+        if not pieces:
+            raise ParseException('Empty subscript')
+
+        self.i += 1
+        return ''.join(pieces)
+
+    def script_piece(self) -> str:
+        key = self.peek()
+        if key is None:
+            raise ParseException('Unterminated subscript')
+
+        value = self.values[self.i]
+        # Only text that keeps the name a Python identifier; not `1.5` or `+`
+        if key != _T.VAR and not (key == _T.NUMBER and value.isdigit()):
+            raise ParseException(f'Invalid subscript: {value!r}')
+
+        self.i += 1
+        return value
+
+def _number(parser: _Parser, value: str) -> ASTNode:
+    return ASTNumber(children=[], number=float(value))
+
+def _variable(parser: _Parser, value: str) -> ASTNode:
+    if parser.peek() == _T.SUBSCRIPT:
+        parser.i += 1
+        value += parser.script_text()
+    return ASTVar(children=[], name=value)
+
+def _legacy_arg(parser: _Parser, value: str) -> ASTNode:
+    # ARG tokens only come from the legacy dialect; parse their text.
+    return parse_program(value)
+
+def _paren(parser: _Parser, value: str) -> ASTNode:
+    inner = parser.expression()
+    parser.expect(_T.PAREN_RIGHT)
+    return ASTExpression(children=[inner])
+
+def _brace(parser: _Parser, value: str) -> ASTNode:
+    inner = parser.expression()
+    parser.expect(_T.COMMAND_ARG_END)
+    return inner
+
+def _negative(parser: _Parser, value: str) -> ASTNode:
+    return ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.NEGATIVE, arg=parser.expression(PREFIX_BP))
+
+def _positive(parser: _Parser, value: str) -> ASTNode:
+    return parser.expression(PREFIX_BP)
+
+def _frac(parser: _Parser, value: str) -> ASTNode:
+    numerator = parser.group()
+    denominator = parser.group()
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.DIVIDE, left_arg=numerator, right_arg=denominator)
+
+def _sqrt(parser: _Parser, value: str) -> ASTNode:
+    return ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.SQRT, arg=parser.group())
+
+def _add(parser: _Parser, left: ASTNode) -> ASTNode:
+    right = parser.expression(ADD_BP)
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.ADD, left_arg=left, right_arg=right)
+
+def _subtract(parser: _Parser, left: ASTNode) -> ASTNode:
+    right = ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.NEGATIVE, arg=parser.expression(ADD_BP))
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.ADD, left_arg=left, right_arg=right)
+
+def _multiply(parser: _Parser, left: ASTNode) -> ASTNode:
+    right = parser.expression(MULTIPLY_BP)
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.MULTIPLY, left_arg=left, right_arg=right)
+
+def _superscript(parser: _Parser, left: ASTNode) -> ASTNode:
+    exponent = parser.script_arg()
+    # Right associative: x^{a}^{b} is x^(a^b)
+    if parser.peek() == _T.SUPERSCRIPT:
+        parser.i += 1
+        exponent = _superscript(parser, exponent)
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.POW, left_arg=left, right_arg=exponent)
+
+_PREFIX: Dict[object, Callable[[_Parser, str], ASTNode]] = {
+    _T.NUMBER: _number,
+    _T.VAR: _variable,
+    _T.ARG: _legacy_arg,
+    _T.PAREN_LEFT: _paren,
+    _T.COMMAND_ARG_START: _brace,
+    '-': _negative,
+    '+': _positive,
+    '\\frac': _frac,
+    '\\sqrt': _sqrt,
+}
+
+_INFIX: Dict[object, Tuple[int, Callable[[_Parser, ASTNode], ASTNode]]] = {
+    '+': (ADD_BP, _add),
+    '-': (ADD_BP, _subtract),
+    '\\cdot': (MULTIPLY_BP, _multiply),
+    '\\times': (MULTIPLY_BP, _multiply),
+    _T.SUPERSCRIPT: (POW_BP, _superscript),
+}
+
+# Tokens that start an operand, and so imply multiplication after another operand
+_PRIMARY_START = frozenset([ _T.NUMBER, _T.VAR, _T.ARG, _T.PAREN_LEFT, '\\frac', '\\sqrt' ])
+
+def _prepare(tokens: Sequence[lex.LexToken], pos: int, stop: int) -> _Parser:
+    if isinstance(tokens, lex.TokenBuffer):
+        # Avoid building a LexToken view per token
+        items = ( (tokens.type_at(i), tokens.value_at(i)) for i in range(pos, stop) )
+    else:
+        items = ( (tokens[i].type, tokens[i].value) for i in range(pos, stop) )
+
+    return _prepare_items(items, pos)
+
+def _prepare_items(items: Iterable[Tuple[lex.LexToken.Type, str]], pos: int = 0) -> _Parser:
+    ''' A parser over the `(type, value)` of each token, the first at index `pos`. '''
+    keys = []
+    values = []
+    positions = []
+    command = _T.COMMAND
+
+    for i, (type, value) in enumerate(items, pos):
+        if type == command:
+            if value in IGNORED_COMMANDS:
+                continue
+            keys.append(value)
+        else:
+            keys.append(type)
+        values.append(value)
+        positions.append(i)
+
+    return _Parser(keys, values, positions)
+
+def parse(tokens: Sequence[lex.LexToken], pos: int = 0, stop: Optional[int] = None) -> ParseResult:
+    ''' Parse one expression starting at `tokens[pos]`. '''
+    if stop is None:
+        stop = len(tokens)
+
+    parser = _prepare(tokens, pos, stop)
+    result = parser.expression()
+    end = parser.positions[parser.i] if parser.i < len(parser.keys) else stop
+
+    return ParseResult(result, tokens, end)
+
+def _parse_all(tokens: Iterable[lex.LexToken]) -> Tuple[_Parser, ASTNode]:
+    # Streamed tokens go straight into the parser's lists, without a list of their own
+    if isinstance(tokens, Sequence):
+        parser = _prepare(tokens, 0, len(tokens))
+    else:
+        parser = _prepare_items((token.type, token.value) for token in tokens)
+    return parser, parser.expression()
+
+def parse_program(tex: Union[str, TextIO, Iterable[lex.LexToken]]) -> ASTNode:
+    if isinstance(tex, str):
+        tokens = lex.lex(tex, dialect=lex.LexDialect.TEX)
+    elif hasattr(tex, 'read'):
+        tokens = lex.iter_tokens(tex, dialect=lex.LexDialect.TEX)
+    else:
+        tokens = tex
+
+    report = instrument.active
+    if report is None:
+        parser, result = _parse_all(tokens)
+    else:
+        with report.stage('parse'):
+            parser, result = _parse_all(tokens)
+        report.count('parses')
+        report.count('nodes', tree_size(result))
+
+    if parser.i < len(parser.keys):
+        raise ParseException(f'Unexpected token: {parser.values[parser.i]!r}')
+
+    return result
@@ -1,42 +1,86 @@
 from dataclasses import dataclass
 from typing import *
-from parse import lex
+from parse import instrument, lex
 
-@dataclass 
+@dataclass
 class ScopeResult:
-    result: List[lex.LexToken]
-    remainder: List[lex.LexToken]
+    ''' A run of tokens, as indices into `tokens`.
+
+    The scope's contents are `tokens[start:end]`; parsing continues at `next`
+    (which skips the closing delimiter, if any).
+    '''
+    tokens: Sequence[lex.LexToken]
+    start: int
+    end: int
+    next: int
+
+    @property
+    def result(self) -> Sequence[lex.LexToken]:
+        return self.tokens[self.start:self.end]
+
+    @property
+    def remainder(self) -> Sequence[lex.LexToken]:
+        return self.tokens[self.next:]
 
-# TODO: Return scope + remaining tokens (past scope)
 def consume_scope(
-    tokens: List[lex.LexToken], 
-    start: lex.LexToken.Type, 
-    end: lex.LexToken.Type
+    tokens: Sequence[lex.LexToken],
+    start: lex.LexToken.Type,
+    end: lex.LexToken.Type,
+    pos: int = 0,
+    stop: Optional[int] = None
+) -> ScopeResult:
+    ''' Match the delimiter at `tokens[pos]` with its closing delimiter.
+
+    An unterminated scope runs to `stop`, so that input like `(1+2` still
+    parses as if it were closed at the end.
+    '''
+    report = instrument.active
+    if report is not None:
+        with report.stage('consume_scope'):
+            return _consume_scope(tokens, start, end, pos, stop)
+
+    return _consume_scope(tokens, start, end, pos, stop)
+
+def _consume_scope(
+    tokens: Sequence[lex.LexToken],
+    start: lex.LexToken.Type,
+    end: lex.LexToken.Type,
+    pos: int,
+    stop: Optional[int]
 ) -> ScopeResult:
-    scoped_tokens = []
+    if stop is None:
+        stop = len(tokens)
+
+    if pos >= stop:
+        return ScopeResult(tokens, pos, pos, pos)
+
+    if tokens[pos].type != start:
+        # Nothing to scope; skip the token
+        return ScopeResult(tokens, pos+1, pos+1, pos+1)
+
     scope = 0
-    for i, token in enumerate(tokens):
-        if token.type == start:
+    for i in range(pos, stop):
+        token_type = tokens[i].type
+        if token_type == start:
             scope += 1
-            continue
-        elif token.type == end:
-            assert scope >= 0
+        elif token_type == end:
             scope -= 1
-        
-        if scope == 0:
-            i += 1
-            break
-        else:
-            scoped_tokens.append(token)
-        
-    return ScopeResult(
-        result=scoped_tokens,
-        remainder=tokens[i:]
-    )
-
-def consume_while(tokens: List[lex.LexToken], pred: Callable[[lex.LexToken], bool]) -> ScopeResult:
-    for i in range(len(tokens)):
-        if not pred(tokens[i]):
-            break
-    
-    return ScopeResult(tokens[:i+1], tokens[i:])
\ No newline at end of file
+            if scope == 0:
+                return ScopeResult(tokens, pos+1, i, i+1)
+
+    return ScopeResult(tokens, pos+1, stop, stop)
+
+def consume_while(
+    tokens: Sequence[lex.LexToken],
+    pred: Callable[[lex.LexToken], bool],
+    pos: int = 0,
+    stop: Optional[int] = None
+) -> ScopeResult:
+    if stop is None:
+        stop = len(tokens)
+
+    i = pos
+    while i < stop and pred(tokens[i]):
+        i += 1
+
+    return ScopeResult(tokens, pos, i, i)
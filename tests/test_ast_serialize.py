@@ -1,6 +1,9 @@
+import io
 import json
 from json import JSONEncoder
 
+import pytest
+
 from parse import parse
 from tex_ast import serialization
 
@@ -48,3 +51,61 @@ def test_serialize_binary_op():
             'number': '7'
         }
     }
+
+def test_serialize_unary_command():
+    unary = parse.ASTUnaryCommand(
+        children=[],
+        type=parse.ASTUnaryCommand.Type.SQRT,
+        arg=parse.ASTVar(children=[], name='x'))
+
+    assert unary.dict == {
+        'type': 'ASTUnaryCommand',
+        'op': 'sqrt',
+        'arg': { 'type': 'ASTVar', 'name': 'x' }
+    }
+
+@pytest.mark.parametrize('input_program,engine', [
+    ('x+y+5+z', parse.ParseEngine.BACKTRACKING),
+    ('(1+2+3)', parse.ParseEngine.BACKTRACKING),
+    ('\\frac{1}{2}+1', parse.ParseEngine.BACKTRACKING),
+    ('\\sqrt{x}-\\frac{a_{1}}{2}', parse.ParseEngine.PRATT),
+    ('((x^{2}))', parse.ParseEngine.PRATT),
+])
+@pytest.mark.parametrize('indent', [None, 0, 4])
+def test_dumps_matches_json(input_program, engine, indent):
+    ast = parse.parse_program(input_program, engine=engine)
+
+    assert serialization.dumps(ast, indent) == json.dumps(ast.dict, indent=indent)
+
+def test_encoder_uses_dumps():
+    ast = parse.parse_program('(x+1)', engine=parse.ParseEngine.PRATT)
+
+    assert json.dumps(ast, indent=4, cls=serialization.ASTNodeEncoder) == json.dumps(ast.dict, indent=4)
+    assert json.dumps(ast, sort_keys=True, cls=serialization.ASTNodeEncoder) == json.dumps(ast.dict, sort_keys=True)
+
+def test_dump_deep_tree():
+    ast = parse.parse_program('+'.join(['x'] * 20000), engine=parse.ParseEngine.PRATT)
+    buffer = io.StringIO()
+    serialization.dump(ast, buffer)
+
+    text = buffer.getvalue()
+    assert text.startswith('{"type": "ASTBinaryOp", "op": "+", "left_arg": {"type": "ASTBinaryOp"')
+    assert text.count('"ASTVar"') == 20000
+
+@pytest.mark.parametrize('tex, engine', [
+    ('x+y+5+z', None),
+    ('2x+1.5', None),
+    ('\\frac{1}{2}+x', None),
+    ('\\sqrt{x}-\\frac{a_{1}}{2}', parse.ParseEngine.PRATT),
+    ('((x^{2}))', parse.ParseEngine.PRATT),
+])
+def test_loads_round_trip(tex, engine):
+    root = parse.parse_program(tex, engine=engine)
+    text = serialization.dumps(root, indent=4)
+
+    assert serialization.loads(text) == root
+    assert serialization.load(io.StringIO(text)) == root
+
+def test_loads_unknown_type():
+    with pytest.raises(ValueError):
+        serialization.loads('{"type": "ASTMatrix"}')
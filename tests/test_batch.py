@@ -0,0 +1,37 @@
+import io
+import json
+
+from parse import parse
+from tex_python import batch
+
+def test_batch_in_process_order_and_errors():
+    input = io.StringIO('x+y\n\n\\frac{1}\n(1+2\n+\n5\n')
+    output = io.StringIO()
+
+    batch.run_stream(input, output, workers=1, chunk_size=2)
+    results = [ json.loads(line) for line in output.getvalue().splitlines() ]
+
+    assert [ result['index'] for result in results ] == [0, 1, 2, 3, 4]
+    assert results[0]['ast'] == parse.parse_program('x+y').dict
+    assert results[1] == { 'index': 1, 'error': 'ParseException: Failed to parse tokens.' }
+    assert 'ast' in results[2]
+    assert 'ast' not in results[3] and results[3]['error'].startswith('ParseException')
+    assert results[4]['ast'] == { 'type': 'ASTNumber', 'number': '5.0' }
+
+def test_batch_jsonl_ids_and_errors():
+    lines = [ '{"tex": "x+1", "id": "a"}', '"2+3"', 'not json', '{"id": "b"}' ]
+    results = [ json.loads(line) for line in batch.run(batch.read_records(lines, jsonl=True), workers=1) ]
+
+    assert results[0]['id'] == 'a' and 'ast' in results[0]
+    assert 'ast' in results[1]
+    assert results[2]['error'].startswith('JSONDecodeError')
+    assert results[3]['id'] == 'b' and results[3]['error'].startswith('ValueError')
+
+def test_batch_process_pool_matches_in_process():
+    lines = [ f'x+{i}+y' if i % 7 else 'x+' for i in range(100) ]
+
+    serial = list(batch.run(batch.read_records(lines), workers=1))
+    pooled = list(batch.run(batch.read_records(lines), workers=2, chunk_size=8))
+
+    assert pooled == serial
+    assert len(pooled) == 100
@@ -0,0 +1,37 @@
+from bench import corpus, suite
+from parse import pratt
+
+def test_corpus_is_seeded():
+    assert corpus.generate(20, seed=3, terms=4) == corpus.generate(20, seed=3, terms=4)
+    assert corpus.generate(20, seed=3, terms=4) != corpus.generate(20, seed=4, terms=4)
+
+def test_corpus_parses_and_covers_constructs():
+    sources = corpus.generate(200, seed=0, depth=5, terms=4)
+    for tex in sources:
+        pratt.parse_program(tex)
+
+    text = ''.join(sources)
+    for construct in [ '\\frac{', '\\sqrt{', '_{', '^{', '(', '\\cdot ' ]:
+        assert construct in text
+    # Implicit multiplication: a number or name directly followed by a name
+    assert any(any(a.isalnum() and b.isalpha() for a, b in zip(tex, tex[1:])) for tex in sources)
+
+def test_corpus_sizes():
+    small = corpus.generate(50, seed=0, depth=3, terms=1)
+    large = corpus.generate(50, seed=0, depth=3, terms=16)
+    assert all(tex.count('+') >= 15 for tex in large)
+    assert sum(map(len, large)) > 8 * sum(map(len, small))
+
+def test_compare():
+    baseline = { 'results': { 'lex/small': { 'min_us': 10.0 }, 'parse/small': { 'min_us': 10.0 }, 'gone/small': { 'min_us': 1.0 } } }
+    results = { 'results': { 'lex/small': { 'min_us': 12.0 }, 'parse/small': { 'min_us': 13.0 }, 'new/small': { 'min_us': 1.0 } } }
+
+    assert suite.compare(results, baseline, 0.25) == [
+        ('lex/small', 10.0, 12.0, False),
+        ('parse/small', 10.0, 13.0, True),
+    ]
+
+def test_run_suite():
+    results = suite.run_suite(repeat=1, only=[ 'lex', 'serialize' ])
+    assert set(results['results']) == { f'{stage}/{profile}' for stage in [ 'lex', 'serialize' ] for profile in suite.PROFILES }
+    assert all(result['min_us'] > 0 for result in results['results'].values())
@@ -0,0 +1,80 @@
+import mmap
+
+import pytest
+
+from parse import parse
+from tex_ast import binary, serialization
+from bench.serialize import balanced_tree
+
+CORPUS = [
+    ('x', parse.ParseEngine.PRATT),
+    ('x+y+5+z', None),
+    ('2x+1.5', None),
+    ('\\frac{1}{2}+x', None),
+    ('\\sqrt{x}-\\frac{a_{1}}{2}', parse.ParseEngine.PRATT),
+    ('((x^{2}))\\cdot x^{y}', parse.ParseEngine.PRATT),
+]
+
+@pytest.mark.parametrize('tex, engine', CORPUS)
+def test_round_trip(tex, engine):
+    root = parse.parse_program(tex, engine=engine)
+    assert binary.decode(binary.encode(root)) == root
+
+@pytest.mark.parametrize('tex, engine', CORPUS)
+def test_json_round_trip(tex, engine):
+    text = serialization.dumps(parse.parse_program(tex, engine=engine))
+    assert binary.to_json(binary.from_json(text)) == text
+
+def test_strings_interned():
+    root = parse.parse_program('x+x+x+x+x+x+x+x')
+    assert binary.encode(root).count(b'x') == 1
+
+def test_smaller_than_json():
+    root = balanced_tree(1000)
+    assert len(binary.encode(root)) * 4 < len(serialization.dumps(root))
+
+def test_lazy_access():
+    root = parse.parse_program('\\sqrt{x}-\\frac{a_{1}}{2}', engine=parse.ParseEngine.PRATT)
+    document = binary.Document(binary.encode(root))
+
+    node = document.root
+    assert node.type == 'ASTBinaryOp'
+    assert node.op == parse.ASTBinaryOp.Type.ADD
+    assert node.left_arg.arg.name == 'x'
+    assert node.right_arg.arg.materialize() == root.right_arg.arg
+    assert node.right_arg.arg.right_arg.number == 2
+
+    with pytest.raises(AttributeError):
+        node.name
+    with pytest.raises(AttributeError):
+        node.arg
+
+def test_mmap(tmp_path):
+    root = balanced_tree(500)
+    path = tmp_path / 'tree.bin'
+    path.write_bytes(binary.encode(root))
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        with binary.Document(m) as document:
+            assert document.root.left_arg.materialize() == root.left_arg
+            assert document.materialize() == root
+
+def test_deep_tree():
+    root = parse.ASTVar(children=[], name='x')
+    for _ in range(20000):
+        root = parse.ASTUnaryCommand(children=[], type=parse.ASTUnaryCommand.Type.NEGATIVE, arg=root)
+
+    decoded = binary.decode(binary.encode(root))
+    for _ in range(20000):
+        decoded = decoded.arg
+    assert decoded.name == 'x'
+
+def test_bad_magic():
+    with pytest.raises(binary.DecodeError):
+        binary.decode(b'JSON' + bytes(16))
+
+def test_truncated():
+    data = binary.encode(parse.parse_program('\\sqrt{x}-\\frac{a_{1}}{2}+(y+3.5)', engine=parse.ParseEngine.PRATT))
+    for end in range(len(data)):
+        with pytest.raises(binary.DecodeError):
+            binary.decode(data[:end])
@@ -0,0 +1,83 @@
+import threading
+
+from parse import parse
+from parse.cache import ParseCache, _ast_nbytes
+
+def test_cache_hit_returns_copy():
+    cache = ParseCache()
+
+    first = parse.parse_program('x+y', cache=cache)
+    second = parse.parse_program('x+y', cache=cache)
+
+    assert first == second
+    assert first is not second
+    assert cache.stats.hits == 1
+
+    first.left_arg.name = 'z'
+    assert parse.parse_program('x+y', cache=cache).python == '(x+y)'
+
+def test_cache_shared_without_copy():
+    cache = ParseCache(copy_on_return=False)
+
+    assert parse.parse_program('5+3', cache=cache) is parse.parse_program('5+3', cache=cache)
+
+def test_cache_engine_in_key():
+    cache = ParseCache()
+
+    legacy = parse.parse_program('1+2+3', cache=cache)
+    pratt = parse.parse_program('1+2+3', engine=parse.ParseEngine.PRATT, cache=cache)
+
+    assert legacy.python == '(1.0+(2.0+3.0))'
+    assert pratt.python == '((1.0+2.0)+3.0)'
+
+def test_cache_parse_keeps_only_tree():
+    cache = ParseCache()
+
+    parse.parse_program('x+y', cache=cache)
+    assert len(cache) == 1
+    assert cache.stats.misses == 1
+    assert cache.nbytes == _ast_nbytes(parse.parse_program('x+y'))
+
+def test_cache_capacity_eviction():
+    cache = ParseCache(capacity=2)
+
+    for tex in ['1+2', '3+4', '5+6']:
+        cache.lex(tex)
+
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+    cache.lex('5+6')
+    assert cache.stats.hits == 1
+
+def test_cache_byte_budget():
+    cache = ParseCache(max_bytes=2000)
+
+    for i in range(50):
+        parse.parse_program(f'x+{i}', cache=cache)
+
+    assert 0 < cache.nbytes <= 2000
+    assert cache.stats.evictions > 0
+
+def test_cache_concurrent():
+    cache = ParseCache(capacity=8)
+    errors = []
+
+    def worker(n: int):
+        try:
+            for i in range(200):
+                tex = f'x+{(i + n) % 16}'
+                assert parse.parse_program(tex, cache=cache).python == f'(x+{float((i + n) % 16)})'
+        except Exception as e:
+            errors.append(e)
+
+    threads = [ threading.Thread(target=worker, args=(n,)) for n in range(8) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(cache) <= 8
+    stats = cache.stats
+    assert stats.hits + stats.misses > 0
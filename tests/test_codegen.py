@@ -0,0 +1,150 @@
+import pickle
+
+import pytest
+
+from parse import parse
+from tex_ast import codegen, optimize
+from tex_ast.interned import Interner
+from tex_ast.ast import *
+
+PRATT = parse.ParseEngine.PRATT
+
+def test_compile_binary_op():
+    ast = parse.parse_program('x+y+5+z')
+    f = ast.python_func
+
+    assert codegen.lambda_source(ast) == ast.python_func_str
+    assert f(1, 2, 3) == 11
+
+def test_compile_arg_order():
+    ast = parse.parse_program('y\\cdot x+y^{2}-x', engine=PRATT)
+
+    assert codegen.free_vars(ast) == ['y', 'x']
+    assert ast.python_func(3, 2) == 3 * 2 + 3 ** 2 - 2
+
+@pytest.mark.parametrize('input_program,expected', [
+    ('x+x', ['x']),
+    ('(a\\cdot b)+c', ['a', 'b', 'c']),
+    ('\\sqrt{b}+a', ['b', 'a']),
+    ('\\frac{y}{x}-(x+z)', ['y', 'x', 'z']),
+    ('x^{a}', ['x', 'a']),
+    ('2', []),
+])
+def test_free_variables_every_node_type(input_program, expected):
+    ast = parse.parse_program(input_program, engine=PRATT)
+
+    assert ast.vars == expected
+    assert codegen.free_vars(ast) == expected
+    if isinstance(ast, ASTBinaryOp):
+        assert ast.python_func_str == codegen.lambda_source(ast)
+
+def test_free_variables_cached():
+    ast = Interner().intern(parse.parse_program('(a+b)\\cdot c+a', engine=PRATT))
+
+    variables = free_variables(ast)
+    assert free_variables(ast) is variables
+    # Only asked-for roots keep theirs
+    assert getattr(ast.left_arg, '_variables', None) is None
+
+    # A subtree's cached result is used rather than walked again
+    subtree = ast.left_arg
+    free_variables(subtree)
+    object.__setattr__(subtree, '_variables', ('q',))
+    object.__setattr__(ast, '_variables', None)
+    assert free_variables(ast) == ('q', 'a')
+
+def test_free_variables_after_edit():
+    ast = parse.parse_program('x+y', engine=PRATT)
+    assert ast.vars == ['x', 'y']
+
+    ast.right_arg = ASTVar(children=[], name='z')
+    assert ast.vars == ['x', 'z']
+    ast.left_arg.name = 'w'
+    assert free_variables(ast) == ('w', 'z')
+
+def test_free_variables_cache_not_part_of_value():
+    ast = parse.parse_program('x+y', engine=PRATT)
+    uncached = parse.parse_program('x+y', engine=PRATT)
+    free_variables(ast)
+
+    assert ast == uncached
+    assert repr(ast) == repr(uncached)
+
+@pytest.mark.parametrize('input_program,args,expected', [
+    ('5', (), 5.0),
+    ('(x+1)', (2,), 3.0),
+    ('\\sqrt{x}', (16,), 4.0),
+    ('-x', (3,), -3),
+])
+def test_compile_any_root(input_program, args, expected):
+    ast = parse.parse_program(input_program, engine=PRATT)
+
+    assert not isinstance(ast, ASTBinaryOp)
+    assert ast.python_func(*args) == expected
+
+def test_compile_memoized():
+    first = parse.parse_program('\\frac{x}{2}', engine=PRATT)
+    second = parse.parse_program('\\frac{x}{2}', engine=PRATT)
+
+    assert first.python_func is first.python_func
+    assert first.python_func is second.python_func
+
+def test_compile_cached_on_interned_node():
+    ast = Interner().intern(parse.parse_program('\\frac{x}{2}+x', engine=PRATT))
+    f = ast.python_func
+    optimized = codegen.compile_ast(ast, optimize.ALL)
+
+    assert ast._functions == { None: f, optimize.ALL: optimized }
+    assert codegen.compile_ast(ast, optimize.ALL) is optimized
+    # Not part of the node's value, and not pickled
+    assert ast == parse.parse_program('\\frac{x}{2}+x', engine=PRATT)
+    copied = pickle.loads(pickle.dumps(ast))
+    assert copied == ast and getattr(copied, '_functions', None) is None
+    assert copied.python_func(4.0) == 6.0
+
+def test_compile_after_edit():
+    ast = parse.parse_program('x+y', engine=PRATT)
+    assert ast.python_func(1, 2) == 3
+
+    ast.right_arg = ASTVar(children=[], name='z')
+    ast.left_arg = ASTNumber(children=[], number=10.0)
+    assert ast.python == '(10.0+z)'
+    assert ast.python_func(2) == 12
+    assert codegen.compile_ast(ast, optimize.ALL)(2) == 12
+
+def test_compile_many():
+    value = parse.parse_program('\\sqrt{x}+y', engine=PRATT)
+    other = parse.parse_program('2\\sqrt{x}', engine=PRATT)
+
+    assert codegen.tuple_source([ value, other ]) == 'lambda x,y: ((math.sqrt(x)+y), (2.0*math.sqrt(x)), )'
+    # Shared between the two
+    assert codegen.tuple_source([ value, other ], common=True) == 'lambda x,y: (((_cse0 := math.sqrt(x))+y), (2.0*_cse0), )'
+    assert codegen.compile_many([ value, other ], optimize.ALL)(4.0, 1.0) == (3.0, 4.0)
+
+def test_compile_long_sum():
+    # Far deeper than CPython lets source nest
+    terms = 100_000
+    names = [ 'abcdefghijklmnopqrstuvwxyz'[i % 26] for i in range(terms) ]
+    right = parse.parse_program('+'.join(names))
+    left = ASTVar(children=[], name='a')
+    for name in names[1:]:
+        left = ASTBinaryOp(children=[], type=ASTBinaryOp.Type.ADD, left_arg=left, right_arg=ASTVar(children=[], name=name))
+
+    args = range(1, 27)
+    expected = sum(args[i % 26] for i in range(terms))
+    assert right.python_func(*args) == expected
+    assert codegen.compile_many([ left, right ])(*args) == (expected, expected)
+
+    # Nested no deeper than a short tree's source
+    depth = deepest = 0
+    for char in right.python_func_str:
+        depth += (char == '(') - (char == ')')
+        deepest = max(deepest, depth)
+    assert deepest <= codegen.MAX_DEPTH + 2
+
+def test_compile_long_sum_common():
+    # Temporaries for deep subtrees and for repeated ones together
+    tree = parse.parse_program('+'.join([ '\\sqrt{x+y}', 'x\\cdot y' ] * 1000), engine=PRATT)
+    f = codegen.compile_ast(tree, optimize.ALL)
+    assert f(1.0, 3.0) == pytest.approx(1000 * (2.0 + 3.0))
+    assert f(1.0, 3.0) == tree.python_func(1.0, 3.0)
@@ -0,0 +1,75 @@
+import pytest
+
+from parse import pratt
+from tex_ast import codegen, derivative, optimize
+from tex_ast.ast import *
+
+def differentiate(tex, variable='x'):
+    return derivative.derivative(pratt.parse_program(tex), variable)
+
+@pytest.mark.parametrize('tex,expected', [
+    ('5', '0.0'),
+    ('x', '1.0'),
+    ('ax', 'a'),
+    ('x^{2}y', '((2.0*x)*y)'),
+    ('3x^{2}+\\sqrt{x}', '((3.0*(2.0*x))+(1.0/(2.0*math.sqrt(x))))'),
+    ('\\frac{x}{2}', '0.5'),
+    ('-x^{3}', '(-(3.0*(x**2.0)))'),
+    ('x^{a}', '(a*(x**(a+(-1.0))))'),
+])
+def test_rules(tex, expected):
+    assert differentiate(tex).python == expected
+
+@pytest.mark.parametrize('tex', [
+    'x^{3}-2x-5',
+    '\\frac{x+1}{x^{2}+1}',
+    '\\sqrt{x^{2}+1}\\cdot (x-3)',
+    '-\\frac{3}{x}',
+    '\\frac{1}{\\sqrt{x}}+x^{-2}',
+])
+def test_against_differences(tex):
+    tree = pratt.parse_program(tex)
+    f = codegen.compile_ast(tree)
+    slope = codegen.compile_ast(derivative.derivative(tree, 'x'))
+
+    for x in [ 0.5, 1.0, 1.7, 3.0 ]:
+        assert slope(x) == pytest.approx((f(x + 1e-6) - f(x - 1e-6)) / 2e-6, rel=1e-6, abs=1e-6)
+
+def test_unsimplified():
+    tree = pratt.parse_program('2x')
+    # Terms with a zero factor are never built
+    assert derivative.derivative(tree, 'x', passes=None).python == '(2.0*1.0)'
+    assert derivative.derivative(tree, 'x').python == '2.0'
+
+def test_shares_subtrees():
+    tree = pratt.parse_program('\\sqrt{x}')
+    result = derivative.derivative(tree, 'x', passes=None)
+    assert result.right_arg.right_arg is tree
+
+def test_unsupported():
+    with pytest.raises(ValueError, match='x in its exponent'):
+        differentiate('2^{x}')
+    # Only with respect to the variable in the exponent
+    assert differentiate('2^{x}', 'a').python == '0.0'
+    with pytest.raises(TypeError):
+        derivative.derivative(ASTParen(children=[]), 'x')
+
+def test_compile_gradient():
+    f = derivative.compile_gradient(pratt.parse_program('x^{2}y+\\sqrt{y}'))
+    assert f(3.0, 4.0) == (38.0, 24.0, 9.25)
+
+    f = derivative.compile_gradient(pratt.parse_program('ax+b'), [ 'x' ])
+    assert f(2.0, 3.0, 1.0) == (7.0, 2.0)
+
+def test_gradient_deep_sum():
+    tree = pratt.parse_program('+'.join([ 'x' ] * 2000))
+    assert derivative.derivative(tree, 'x', passes=optimize.NONE).python.count('1.0') == 2000
+
+def test_newton():
+    f = derivative.compile_gradient(pratt.parse_program('x^{2}-2'))
+    assert derivative.newton(f, 1.0) == pytest.approx(2 ** 0.5, rel=1e-15)
+    # Flat at the start
+    assert derivative.newton(f, 0.0) is None
+
+    f = derivative.compile_gradient(pratt.parse_program('x^{2}+1'))
+    assert derivative.newton(f, 0.5) is None
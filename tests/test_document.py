@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from parse import parse
+from tex_python.document import Document, parse_expression
+
+def test_parse_expression():
+    assert parse_expression('a=3')[0] == 'a'
+    assert parse_expression('x_{1}=a+1')[0] == 'x1'
+    assert parse_expression('y=ax^{2}')[0] is None
+    assert parse_expression('ax^{2}')[1].python == '(a*(x**2.0))'
+
+    with pytest.raises(parse.ParseException):
+        parse_expression('a+1=3')
+    with pytest.raises(parse.ParseException):
+        parse_expression('a=b=3')
+
+def test_definitions_substituted():
+    document = Document({ 'slider': 'a=3', 'offset': 'b_{0}=a+1', 'curve': 'y=ax^{2}+b_{0}' })
+
+    assert document['curve'].dependencies == ('slider', 'offset')
+    assert document['curve'].parameters == ('x',)
+    assert document['curve'].function(2.0) == 16.0
+    assert document.order.index('slider') < document.order.index('offset') < document.order.index('curve')
+
+def test_long_definition_chain():
+    # Each definition uses the one before twice; written in place, the
+    # source would double with each
+    depth = 30
+    tex = { 0: 'b_{0}=t+t' }
+    tex.update({ i: f'b_{{{i}}}=b_{{{i - 1}}}+b_{{{i - 1}}}' for i in range(1, depth) })
+    tex[depth] = f'y=b_{{{depth - 1}}}x'
+    document = Document(tex)
+
+    assert document[depth].parameters == ('t', 'x')
+    assert document[depth].function(1.0, 3.0) == 3.0 * 2 ** depth
+    assert len(document[depth].source) < 50 * depth
+
+    document.update({ 0: 'b_{0}=t' })
+    assert document[depth].function(1.0, 1.0) == 2 ** (depth - 1)
+
+def test_sequence_ids():
+    document = Document([ 'a=2', 'a+x' ])
+    assert list(document) == [ 0, 1 ]
+    assert document[1].function(1.0) == 3.0
+
+def test_undefined_variables_are_parameters():
+    document = Document({ 'curve': 'y=ax+t' })
+    assert document['curve'].parameters == ('a', 'x', 't')
+    assert document['curve'].function(2.0, 3.0, 1.0) == 7.0
+
+def test_update_recompiles_only_downstream():
+    document = Document({ 'a': 'a=3', 'b': 'b=2', 'uses_a': 'y=ax', 'uses_b': 'y=bx', 'uses_both': 'c=ab' })
+    unaffected = document['uses_b'].function
+
+    recompiled = document.update({ 'a': 'a=4' })
+
+    assert recompiled[0] == 'a'
+    assert set(recompiled) == { 'a', 'uses_a', 'uses_both' }
+    assert document['uses_b'].function is unaffected
+    assert document['uses_a'].function(2.0) == 8.0
+    assert document['uses_both'].function() == 8.0
+    assert document.dependents('a') == [ 'uses_a', 'uses_both' ]
+
+def test_unchanged_text_is_not_recompiled():
+    document = Document({ 'a': 'a=3', 'curve': 'y=ax' })
+    assert document.update({ 'a': 'a=3' }) == []
+
+def test_new_and_removed_definitions():
+    document = Document({ 'curve': 'y=ax' })
+    assert document['curve'].parameters == ('a', 'x')
+
+    assert document.update({ 'slider': 'a=2' }) == [ 'slider', 'curve' ]
+    assert document['curve'].parameters == ('x',)
+
+    assert document.update({ 'slider': None }) == [ 'curve' ]
+    assert 'slider' not in document
+    assert document['curve'].parameters == ('a', 'x')
+
+def test_errors_stay_local():
+    document = Document({ 'a': 'a=\\frac{1}{', 'uses_a': 'y=ax', 'other': 'y=2x' })
+
+    assert document['a'].error.startswith('ParseException')
+    assert document['uses_a'].error == 'a has an error'
+    assert document['uses_a'].function is None
+    assert document['other'].function(1.0) == 2.0
+
+    document.update({ 'a': 'a=3' })
+    assert document['uses_a'].error is None
+    assert document['uses_a'].function(1.0) == 3.0
+
+def test_defined_more_than_once():
+    document = Document({ 'first': 'a=1', 'curve': 'y=ax' })
+    document.update({ 'second': 'a=2' })
+
+    assert document['first'].error == 'a is defined more than once'
+    assert document['second'].error == 'a is defined more than once'
+    assert document['curve'].error == 'a has an error'
+
+    document.update({ 'second': None })
+    assert document['first'].error is None
+    assert document['curve'].function(2.0) == 2.0
+
+def test_circular_definitions():
+    document = Document({ 'p': 'p=q+1', 'q': 'q=2p', 'r': 'r=q', 'free': 'y=x' })
+
+    assert document['p'].error == 'Circular definition'
+    assert document['q'].error == 'Circular definition'
+    assert document['r'].error == 'Depends on a circular definition'
+    assert document['free'].error is None
+    assert document.order[-3:] == [ 'p', 'q', 'r' ]
+
+    document.update({ 'q': 'q=2' })
+    assert document['r'].function() == 2.0
+    assert document['p'].function() == 3.0
+
+def test_parallel_matches_serial():
+    tex = { f'd{i}': f'd_{{{i}}}=d_{{{i - 1}}}+{i}' for i in range(1, 20) }
+    tex['d0'] = 'd_{0}=0'
+    tex.update({ f'curve{i}': f'y=d_{{{i}}}x' for i in range(20) })
+
+    serial = Document(tex)
+    with Document(tex, executor=ThreadPoolExecutor(4)) as threaded, Document(tex, workers=2) as pooled:
+        for id in tex:
+            args = (1.5,) * len(serial[id].parameters)
+            assert threaded[id].parameters == pooled[id].parameters == serial[id].parameters
+            assert threaded[id].function(*args) == pooled[id].function(*args) == serial[id].function(*args)
+
+        assert pooled['curve19'].function(1.0) == serial['curve19'].function(1.0) == sum(range(20))
+        assert pooled.update({ 'd10': 'd_{10}=0' }) == serial.update({ 'd10': 'd_{10}=0' })
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from parse import lex, pratt
+from parse.incremental import IncrementalParser, relex
+from parse.parse import ParseException
+from bench.corpus import generate
+
+FRAGMENTS = [ 'x', 'y', '1', '2', '.', '+', '-', '\\cdot ', '\\sqrt{x}', '\\frac{1}{2}', '(', ')', '^{2}', '{', '}', ' ', '\\left(', 'a_{1}', '_' ]
+
+def random_edit(rng: random.Random, source: str):
+    offset = rng.randint(0, len(source))
+    deleted = rng.randint(0, min(3, len(source) - offset))
+    inserted = ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 2)))
+    return offset, deleted, inserted
+
+def full_parse(source: str):
+    try:
+        return pratt.parse_program(source)
+    except ParseException:
+        return None
+
+@pytest.mark.parametrize('dialect', list(lex.LexDialect))
+def test_relex_matches_lex(dialect):
+    rng = random.Random(0)
+    for source in generate(100, seed=3):
+        tokens = lex.lex(source, dialect=dialect)
+        for _ in range(5):
+            offset, deleted, inserted = random_edit(rng, source)
+            source, tokens = relex(source, tokens, offset, deleted, inserted, dialect)
+            assert tokens == lex.lex(source, dialect=dialect)
+
+def test_relex_legacy_arg():
+    source = '\\frac{12}{3}+4'
+    source, tokens = relex(source, lex.lex(source), 8, 0, '5')
+    assert source == '\\frac{125}{3}+4'
+    assert tokens == lex.lex(source)
+
+@pytest.mark.parametrize('seed', range(20))
+def test_edits_match_full_parse(seed):
+    rng = random.Random(seed)
+    document = IncrementalParser('+'.join(generate(rng.randint(1, 5), seed=seed)))
+    for _ in range(40):
+        offset, deleted, inserted = random_edit(rng, document.source)
+        try:
+            document.edit(offset, deleted, inserted)
+        except ParseException:
+            assert document.ast is None
+
+        assert document.tokens == lex.lex(document.source, dialect=lex.LexDialect.TEX)
+        assert document.ast == full_parse(document.source)
+
+def test_edit():
+    document = IncrementalParser('x+1')
+    assert document.edit(2, 1, '2\\cdot y') == pratt.parse_program('x+2\\cdot y')
+    assert document.source == 'x+2\\cdot y'
+    assert document.edit(0, 0, '\\sqrt{z}-') == pratt.parse_program('\\sqrt{z}-x+2\\cdot y')
+
+def test_unchanged_subtrees_reused():
+    document = IncrementalParser('\\frac{x}{2}+y+\\sqrt{z}')
+    before = document.ast
+    after = document.edit(12, 1, 'w')
+
+    assert after == pratt.parse_program('\\frac{x}{2}+w+\\sqrt{z}')
+    # Operand subexpressions are memoized; the operators around the edit are rebuilt
+    assert after.left_arg.left_arg.left_arg is before.left_arg.left_arg.left_arg
+    assert after.left_arg.left_arg.right_arg is before.left_arg.left_arg.right_arg
+    assert after.right_arg is before.right_arg
+
+    document = IncrementalParser('x+\\frac{a}{b}\\cdot c+\\sqrt{z}')
+    before = document.ast
+    after = document.edit(0, 1, 'w')
+    assert after.left_arg.right_arg is before.left_arg.right_arg
+    assert after.right_arg is before.right_arg
+
+def test_recovers_from_parse_errors():
+    document = IncrementalParser('x+1')
+    with pytest.raises(ParseException):
+        document.edit(3, 0, '+')
+    assert document.ast is None
+    assert document.source == 'x+1+'
+
+    assert document.edit(4, 0, 'y') == pratt.parse_program('x+1+y')
+
+def test_starts_unparseable():
+    document = IncrementalParser('')
+    assert document.ast is None
+    assert document.edit(0, 0, 'x') == pratt.parse_program('x')
+
+    document = IncrementalParser('x_')
+    assert document.ast is None
+    assert document.edit(2, 0, '1') == pratt.parse_program('x_1')
+
+def test_edit_to_unterminated_subscript():
+    document = IncrementalParser('a+x_{12}')
+    with pytest.raises(ParseException, match='Unterminated subscript'):
+        document.edit(4, 4, '')
+    assert document.ast is None
+    assert document.source == 'a+x_'
+
+    assert document.edit(4, 0, '{3}') == pratt.parse_program('a+x_{3}')
+
+def test_edit_out_of_range():
+    document = IncrementalParser('x+1')
+    with pytest.raises(ValueError):
+        document.edit(2, 5, '')
@@ -0,0 +1,96 @@
+from parse import instrument, lex, parse, pratt
+from parse.parse import ParseEngine
+from tex_ast import codegen
+
+def test_inactive_by_default():
+    assert instrument.active is None
+    parse.parse_program('x+1')
+    assert instrument.active is None
+
+def test_counts_lexing():
+    with instrument.collect() as report:
+        tokens = lex.lex('\\frac{1}{2}+x')
+        lex.lex('x+y', engine=lex.LexEngine.REFERENCE)
+        streamed = list(lex.iter_tokens('a+b+c', chunk_size=2))
+
+    assert report.counters['tokens'] == len(tokens) + 3 + len(streamed)
+    assert report.calls['lex'] >= 3
+    assert instrument.active is None
+
+def test_counts_backtracking():
+    with instrument.collect() as report:
+        ast = parse.parse_program('x+2')
+
+    assert report.counters['parses'] == 1
+    assert report.counters['nodes'] == parse.tree_size(ast) == 3
+    # Only the alternatives that can start with a variable are tried
+    assert report.counters['attempts'] == 1
+    assert report.counters['backtracks'] == 0
+    assert set(report.times) == { 'lex', 'parse' }
+
+    with instrument.collect() as report:
+        parse.parse_program('2')
+    # A number is tried as an infix op first
+    assert report.counters['attempts'] == 2
+    assert report.counters['backtracks'] == 1
+
+def test_pratt_and_compile():
+    with instrument.collect() as report:
+        ast = parse.parse_program('\\sqrt{x}\\cdot y', engine=ParseEngine.PRATT)
+        codegen.compile_ast(ast)
+        codegen.compile_ast(ast)
+
+    assert report.counters['parses'] == 1
+    assert report.counters['nodes'] == 4
+    assert report.counters['backtracks'] == 0
+    assert report.counters['compiles'] == 2
+    assert report.counters['compile_misses'] <= 1
+    assert report.calls['compile'] == 2
+
+def test_stage_times_exclude_nested_stages():
+    report = instrument.Report()
+    with report.stage('parse'):
+        with report.stage('lex'):
+            sum(range(100000))
+
+    assert report.calls == { 'parse': 1, 'lex': 1 }
+    assert report.times['parse'] < report.times['lex']
+
+def test_trace_replaces_debug_output(capsys):
+    events = []
+    with instrument.collect(trace=lambda event, detail: events.append(event)) as report:
+        parse.parse_implicit_multiplication(lex.lex('2xy'))
+        parse.parse_unary_op(lex.lex('\\sqrt{2}'))
+
+    assert capsys.readouterr().out == ''
+    assert 'implicit_multiplication' in events
+    assert 'unary_op' in events
+    assert report.summary()
+
+def test_nested_collect():
+    with instrument.collect() as outer:
+        lex.lex('x')
+        with instrument.collect() as inner:
+            lex.lex('x+y')
+        lex.lex('y')
+
+    assert inner.counters['tokens'] == 3
+    assert outer.counters['tokens'] == 2
+
+def test_consume_scope_stage():
+    with instrument.collect() as report:
+        parse.parse_program('\\frac{1}{x}+(2+y)')
+
+    assert report.calls['consume_scope'] > 0
+    assert report.times['parse'] > 0
+
+def test_timed_evaluate():
+    f = instrument.timed(codegen.compile_ast(parse.parse_program('x+1')))
+    assert f(x=1.0) == 2.0
+
+    with instrument.collect() as report:
+        assert f(x=2.0) == 3.0
+        f(x=3.0)
+
+    assert report.calls['evaluate'] == 2
+    assert report.times['evaluate'] > 0
@@ -0,0 +1,79 @@
+import copy
+import dataclasses
+import pickle
+
+import pytest
+
+from parse import parse, pratt
+from tex_ast import binary, serialization
+from tex_ast.interned import Interner, thaw
+from bench.corpus import generate
+
+def test_shared_leaves():
+    interner = Interner()
+    root = interner.intern(pratt.parse_program('x\\cdot 2+x\\cdot 2'))
+
+    assert root.left_arg is root.right_arg
+    assert root.left_arg.left_arg is interner.var('x')
+    assert len(interner) == 4
+
+def test_shared_across_trees():
+    interner = Interner()
+    a = interner.intern(pratt.parse_program('\\sqrt{x}+1'))
+    b = interner.intern(pratt.parse_program('y-\\sqrt{x}'))
+    assert a.left_arg is b.right_arg.arg
+
+def test_numbers_kept_apart_by_type():
+    interner = Interner()
+    assert interner.number(2) is not interner.number(2.0)
+    assert interner.number(2).python == '2'
+
+@pytest.mark.parametrize('tex', generate(50, seed=1))
+def test_representations_unchanged(tex):
+    root = pratt.parse_program(tex)
+    interned = Interner().intern(root)
+
+    assert interned == root and root == interned
+    assert interned.python == root.python
+    assert interned.dict == root.dict
+    assert serialization.dumps(interned) == serialization.dumps(root)
+    assert binary.decode(binary.encode(interned)) == root
+    assert thaw(interned) == root
+
+def test_structural_hash():
+    root = pratt.parse_program('\\frac{x}{2}+y')
+    a = Interner().intern(root)
+    b = Interner().intern(root)
+
+    assert a is not b
+    assert a == b and hash(a) == hash(b)
+    assert a != Interner().intern(pratt.parse_program('\\frac{x}{2}+z'))
+    assert len({ a, b }) == 1
+
+def test_frozen():
+    root = Interner().intern(pratt.parse_program('x+1'))
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        root.left_arg = root.right_arg
+    assert not hasattr(root, '__dict__')
+
+def test_copy_and_pickle():
+    root = Interner().intern(pratt.parse_program('x+1'))
+    assert copy.deepcopy(root) is root
+
+    loaded = pickle.loads(pickle.dumps(root))
+    assert loaded == root
+    loaded.left_arg = parse.ASTVar(children=[], name='y')
+
+def test_compiles():
+    root = Interner().intern(pratt.parse_program('x\\cdot x+1'))
+    assert root.python_func(3) == 10
+
+def test_deep_tree():
+    root = parse.ASTVar(children=[], name='x')
+    for _ in range(20000):
+        root = parse.ASTUnaryCommand(children=[], type=parse.ASTUnaryCommand.Type.NEGATIVE, arg=root)
+
+    interned = Interner().intern(root)
+    for _ in range(20000):
+        interned = interned.arg
+    assert interned.name == 'x'
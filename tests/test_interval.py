@@ -0,0 +1,62 @@
+import math
+
+import pytest
+
+from parse import pratt
+from tex_ast import codegen, interval
+from tex_ast.ast import *
+
+INF = math.inf
+
+def bounds(tex, **ranges):
+    return interval.bounds(pratt.parse_program(tex), 'x', **ranges)
+
+def test_arithmetic():
+    assert interval.add((1.0, 2.0), (-3.0, 1.0)) == (-2.0, 3.0)
+    assert interval.mul((-1.0, 2.0), (3.0, 4.0)) == (-4.0, 8.0)
+    assert interval.mul((0.0, 0.0), interval.WHOLE) == (0.0, 0.0)
+    assert interval.div((1.0, 1.0), (2.0, 4.0)) == (0.25, 0.5)
+    assert interval.div((1.0, 1.0), (0.0, 2.0)) == (0.5, INF)
+    assert interval.div((1.0, 1.0), (-1.0, 2.0)) == interval.WHOLE
+    assert interval.div((1.0, 1.0), (0.0, 0.0)) is None
+
+def test_powers():
+    assert interval.pow((-2.0, 3.0), (2.0, 2.0)) == (0.0, 9.0)
+    assert interval.pow((-3.0, -2.0), (2.0, 2.0)) == (4.0, 9.0)
+    assert interval.pow((-2.0, 3.0), (3.0, 3.0)) == (-8.0, 27.0)
+    assert interval.pow((1.0, 2.0), (-1.0, -1.0)) == (0.5, 1.0)
+    assert interval.pow((-4.0, 4.0), (0.5, 0.5)) == (0.0, 2.0)
+    assert interval.pow((-4.0, -1.0), (0.5, 0.5)) is None
+    assert interval.pow((2.0, 2.0), (1e6, 1e6)) == (INF, INF)
+
+def test_values_and_derivatives():
+    assert bounds('x^{2}-x', x=(0.0, 1.0)) == ((-1.0, 1.0), (-1.0, 1.0))
+    assert bounds('\\frac{1}{x}', x=(1.0, 2.0)) == ((0.5, 1.0), (-1.0, -0.25))
+    assert bounds('ax', x=(1.0, 2.0), a=3) == ((3.0, 6.0), (3.0, 3.0))
+    # Only with respect to `x`
+    assert interval.bounds(pratt.parse_program('ax'), 'a', x=2, a=(0.0, 1.0)) == ((0.0, 2.0), (2.0, 2.0))
+
+def test_domain():
+    assert bounds('\\sqrt{x}', x=(-2.0, -1.0)) is None
+    assert bounds('\\sqrt{x}', x=(-1.0, 4.0)) == ((0.0, 2.0), (0.25, INF))
+    assert bounds('\\frac{1}{x}', x=(-1.0, 1.0)) == (interval.WHOLE, interval.WHOLE)
+
+@pytest.mark.parametrize('tex', [ 'x^{3}-2x', '\\frac{x+1}{x^{2}+1}', '\\sqrt{x^{2}+1}', 'x^{x}', '-\\frac{3}{x}' ])
+def test_bounds_contain_samples(tex):
+    tree = pratt.parse_program(tex)
+    f = codegen.compile_ast(tree)
+    (value_lo, value_hi), (slope_lo, slope_hi) = interval.bounds(tree, 'x', x=(0.5, 2.0))
+
+    for i in range(101):
+        x = 0.5 + 1.5 * i / 100
+        slope = (f(x + 1e-6) - f(x - 1e-6)) / 2e-6
+        assert value_lo - 1e-9 <= f(x) <= value_hi + 1e-9
+        assert slope_lo - 1e-4 <= slope <= slope_hi + 1e-4
+
+def test_unsupported():
+    with pytest.raises(TypeError, match='Cannot bound ASTParen'):
+        interval.bounds_source(ASTParen(children=[]))
+
+def test_long_sum():
+    tex = '+'.join([ 'x', '\\sqrt{x}' ] * 2000)
+    assert bounds(tex, x=(1.0, 4.0)) == ((4000.0, 12000.0), (2500.0, 3000.0))
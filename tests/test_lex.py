@@ -1,3 +1,8 @@
+import io
+import random
+
+import pytest
+
 from parse import lex
 
 def test_noarg_command_lex():
@@ -69,4 +74,97 @@ def test_paren_lex():
     tokens = lex.lex(input)
     token_types = list(map(lambda t: t.type, tokens))
 
-    assert token_types == [ lex.LexToken.Type.PAREN_LEFT, lex.LexToken.Type.PAREN_RIGHT ]
\ No newline at end of file
+    assert token_types == [ lex.LexToken.Type.PAREN_LEFT, lex.LexToken.Type.PAREN_RIGHT ]
+
+def test_multi_digit_number_lex():
+    input = '12+3.25'
+    tokens = lex.lex(input, engine=lex.LexEngine.REFERENCE)
+
+    assert [ t.value for t in tokens ] == ['12', '+', '3.25']
+    assert (tokens[0].start_idx, tokens[0].end_idx) == (0, 2)
+
+LEX_CORPUS = [
+    '',
+    '\\sqrt 2\\cdot 3',
+    '\\sqrt{2}\\cdot 3.2',
+    'x+3-y+2',
+    'x_{1}+\\frac{1}{2}',
+    'x_{12}\\cdot y_{3}',
+    '(1+2+3)',
+    '2xt',
+    'y=ax^{2}+bx+c',
+    '\\frac{x}{2}+\\frac{x}{2}',
+    '\\sqrt{\\frac{1}{x}}',
+    '\\left(x+1\\right)',
+    '12.5.3+4',
+    'a\\\\b',
+    '\\cdot3',
+    '{',
+    '{a',
+    '\\frac{1}{2',
+    'x^{2} + y^{2} = 1',
+    '\\sqrt{2}²',
+]
+
+@pytest.mark.parametrize('input', LEX_CORPUS)
+def test_lex_engine_parity(input):
+    reference = lex.lex(input, engine=lex.LexEngine.REFERENCE)
+    table = lex.lex(input, engine=lex.LexEngine.TABLE)
+
+    assert table == reference
+
+def test_lex_engine_parity_random():
+    alphabet = 'abxy019.\\{}()_+-^= cdotfrasq'
+    rng = random.Random(0)
+
+    for _ in range(5000):
+        input = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 20)))
+        assert lex.lex_table(input) == lex.lex_reference(input), input
+
+CHUNKED_INPUT = '\\frac{12}{x_{34}}+\\sqrt{2.75}\\cdot 31.5(x+y)-{abc}+.5^{2}  x+.'
+
+@pytest.mark.parametrize('dialect', list(lex.LexDialect))
+@pytest.mark.parametrize('chunk_size', range(1, len(CHUNKED_INPUT) + 1))
+def test_iter_tokens_chunked_stream(chunk_size, dialect):
+    tokens = lex.iter_tokens(io.StringIO(CHUNKED_INPUT), chunk_size=chunk_size, dialect=dialect)
+
+    assert list(tokens) == lex.lex(CHUNKED_INPUT, dialect=dialect)
+
+def test_iter_tokens_token_across_many_chunks():
+    # Each chunk holds a small part of the number
+    input = 'x+' + '1' * 100_000 + '\\sqrt{y}'
+    tokens = list(lex.iter_tokens(io.StringIO(input), chunk_size=16))
+
+    assert tokens == lex.lex(input)
+    assert len(tokens[2].value) == 100_000
+
+def test_iter_tokens_lazy():
+    input = io.StringIO('x+y' + '+x' * 1000)
+    tokens = lex.iter_tokens(input, chunk_size=4)
+
+    assert next(tokens).value == 'x'
+    assert input.tell() < 100
+
+@pytest.mark.parametrize('input', LEX_CORPUS)
+def test_token_buffer_matches_lex(input):
+    buffer = lex.lex_buffer(input)
+
+    assert list(buffer) == lex.lex(input)
+    assert list(lex.TokenBuffer.from_tokens(input, lex.lex(input))) == lex.lex(input)
+
+def test_token_buffer_slice():
+    input = '\\frac{12}{x}+3'
+    buffer = lex.lex_buffer(input)
+    tail = buffer[1:]
+
+    assert isinstance(tail, lex.TokenBuffer)
+    assert tail.types is buffer.types
+    assert len(tail) == len(buffer) - 1
+    assert tail[0].type == lex.LexToken.Type.COMMAND_ARG_START
+    assert tail.value_at(1) == '12'
+    assert bytes(tail.value_view(1)) == b'12'
+    assert list(tail[-2:]) == lex.lex(input)[-2:]
+
+def test_unary_command():
+    tokens = lex.lex('\\sqrt{x}-\\frac{1}{2}+y')
+    assert [ token.value for token in tokens if token.unary_command ] == [ '\\sqrt', '-' ]
@@ -0,0 +1,48 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench import startup
+from parse import parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def imported_modules(*arguments: str, input: str = '') -> set:
+    process = subprocess.run([ sys.executable, '-X', 'importtime', os.path.join(ROOT, 'tex_python', 'main.py'), *arguments ],
+        input=input, capture_output=True, text=True, timeout=60, env={ **os.environ, 'PYTHONPATH': ROOT }, check=True)
+    return { line.split('|')[-1].strip() for line in process.stderr.splitlines() if line.startswith('import time:') }
+
+def run_ast(*arguments: str, input: str) -> dict:
+    process = subprocess.run([ sys.executable, os.path.join(ROOT, 'tex_python', 'main.py'), '--ast', *arguments ],
+        input=input, capture_output=True, text=True, timeout=60, env={ **os.environ, 'PYTHONPATH': ROOT }, check=True)
+    return json.loads(process.stdout)
+
+def test_ast_whole_input():
+    # Lines are not separate expressions: stdin is one program
+    assert run_ast(input='x+\n1\n') == parse.parse_program('x+1').dict
+    assert run_ast('--engine', 'pratt', input='\\frac{x}\n{2}\n') == parse.parse_program('\\frac{x}{2}', engine=parse.ParseEngine.PRATT).dict
+
+def test_engine_names():
+    from tex_python import main
+    assert main.ENGINES == tuple(engine.name.lower() for engine in parse.ParseEngine)
+
+def test_help_does_not_import_parser():
+    modules = imported_modules('--help')
+    assert 'parse.parse' not in modules
+    assert 'tex_ast.ast' not in modules
+
+def test_batch_in_process_does_not_import_multiprocessing():
+    modules = imported_modules('--batch', '--workers', '1', input='x+1\n')
+    assert 'parse.parse' in modules
+    assert 'multiprocessing' not in modules
+
+def test_import_times():
+    stderr = '\n'.join([
+        'import time: self [us] | cumulative | imported package',
+        'import time:       100 |        100 |     parse.lex',
+        'import time:       200 |        300 |   parse.parse',
+        'import time:        50 |        350 | parse',
+        'import time:        20 |         20 | io',
+    ])
+    assert startup.import_times(stderr) == { 'parse': 350, 'io': 20 }
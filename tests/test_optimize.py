@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from parse import parse
+from tex_ast import codegen, optimize
+from tex_ast.ast import *
+from bench.corpus import generate
+
+PRATT = parse.ParseEngine.PRATT
+
+def optimized_source(tex: str, passes: optimize.Passes = optimize.ALL) -> str:
+    node = optimize.optimize(parse.parse_program(tex, engine=PRATT), passes)
+    return codegen.lambda_source(node, common=passes.eliminate_common)
+
+@pytest.mark.parametrize('tex, expected', [
+    ('5+3', 'lambda: 8.0'),
+    ('5+3+x', 'lambda x: (8.0+x)'),
+    ('x\\cdot (3-2)', 'lambda x: x'),
+    ('(2-5)\\cdot x', 'lambda x: ((-3.0)*x)'),
+    ('\\sqrt{16}+x', 'lambda x: (4.0+x)'),
+    ('\\frac{6}{4}^{2}', 'lambda: 2.25'),
+])
+def test_fold_constants(tex, expected):
+    assert optimized_source(tex) == expected
+
+@pytest.mark.parametrize('tex', [ '\\frac{1}{0}', '\\sqrt{-1}', '10^{400}' ])
+def test_fold_leaves_errors_to_run_time(tex):
+    node = parse.parse_program(tex, engine=PRATT)
+    assert codegen.lambda_source(optimize.optimize(node)) == codegen.lambda_source(node)
+
+def test_fold_leaves_complex_powers():
+    assert optimized_source('(-8)^{\\frac{1}{3}}') == 'lambda: ((-8.0)**0.3333333333333333)'
+
+@pytest.mark.parametrize('tex, expected', [
+    ('x+0', 'lambda x: x'),
+    ('0+x', 'lambda x: x'),
+    ('x\\cdot 1', 'lambda x: x'),
+    ('1\\cdot x', 'lambda x: x'),
+    ('\\frac{x}{1}', 'lambda x: x'),
+    ('x^{1}', 'lambda x: x'),
+    ('-(-x)', 'lambda x: x'),
+    ('((x))', 'lambda x: x'),
+    ('x-0', 'lambda x: x'),
+    ('\\frac{1}{x}', 'lambda x: (1.0/x)'),
+])
+def test_simplify(tex, expected):
+    assert optimized_source(tex) == expected
+
+def test_common_subexpressions():
+    source = optimized_source('\\frac{x}{2}+\\frac{x}{2}\\cdot \\frac{x}{2}')
+    assert source == 'lambda x: ((_cse0 := (x/2.0))+(_cse0*_cse0))'
+
+def test_common_subexpressions_nested():
+    # The inner repeat only needs a temporary where it occurs outside the outer one
+    assert optimized_source('\\sqrt{x+y}+\\sqrt{x+y}') == 'lambda x,y: ((_cse0 := math.sqrt((x+y)))+_cse0)'
+    assert optimized_source('\\sqrt{x+y}+\\sqrt{x+y}+(x+y)') == \
+        'lambda x,y: (((_cse0 := math.sqrt((_cse1 := (x+y))))+_cse0)+_cse1)'
+
+@pytest.mark.parametrize('passes, expected', [
+    (optimize.NONE, 'lambda x: (((x*1.0)+((2.0+3.0)))+(((x*1.0)+((2.0+3.0)))))'),
+    (optimize.Passes(simplify=False, eliminate_common=False), 'lambda x: (((x*1.0)+5.0)+(((x*1.0)+5.0)))'),
+    (optimize.Passes(fold_constants=False, eliminate_common=False), 'lambda x: ((x+(2.0+3.0))+(x+(2.0+3.0)))'),
+    (optimize.Passes(fold_constants=False, simplify=False),
+        'lambda x: ((_cse0 := ((x*1.0)+((2.0+3.0))))+(_cse0))'),
+    (optimize.ALL, 'lambda x: ((_cse0 := (x+5.0))+_cse0)'),
+])
+def test_pass_switches(passes, expected):
+    assert optimized_source('x\\cdot 1+(2+3)+(x\\cdot 1+(2+3))', passes) == expected
+
+def test_input_unchanged():
+    node = parse.parse_program('x\\cdot 1+(2+3)', engine=PRATT)
+    before = node.dict
+    optimize.optimize(node)
+    assert node.dict == before
+
+@pytest.mark.parametrize('tex', generate(100, seed=2))
+def test_same_values(tex):
+    node = parse.parse_program(tex, engine=PRATT)
+    plain = codegen.compile_ast(node)
+    optimized = codegen.compile_ast(node, optimize.ALL)
+
+    args = [ 1.5 + 0.25 * i for i in range(len(codegen.free_vars(node))) ]
+    try:
+        expected = plain(*args)
+    except (ZeroDivisionError, ValueError, OverflowError) as e:
+        with pytest.raises(type(e)):
+            optimized(*args)
+        return
+
+    actual = optimized(*args)
+    if isinstance(expected, complex) or isinstance(actual, complex):
+        assert actual == pytest.approx(expected)
+    else:
+        assert math.isclose(actual, expected, rel_tol=1e-9) or (math.isnan(actual) and math.isnan(expected))
@@ -1,8 +1,12 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from parse import parse
 from parse import lex
 from tex_ast.ast import *
+from tex_ast.interned import Interned, Interner
 
 def test_parse_number():
     tokens = lex.lex('5\\cdot 3')
@@ -70,9 +74,12 @@ def test_binary_op_nested():
 
 def test_min_tokens_decorator():
     with pytest.raises(parse.ParseException):
-        parse.min_tokens(3)(lambda f: None)([1,2])
+        parse.min_tokens(3)(lambda tokens, pos, stop: None)([1,2])
+
+    with pytest.raises(parse.ParseException):
+        parse.min_tokens(3)(lambda tokens, pos, stop: None)([1,2,3,4], 2)
 
-    parse.min_tokens(3)(lambda f: None)([1,2,3])
+    parse.min_tokens(3)(lambda tokens, pos, stop: None)([1,2,3])
 
 def test_parse_subscript_var():
     tokens = lex.lex('x_{1}')
@@ -97,6 +104,14 @@ def test_consume_scope():
     assert len(scoped_tokens.result) == 1
     assert len(scoped_tokens.remainder) == 3
 
+def test_consume_scope_unterminated():
+    tokens = lex.lex('(1+2')
+    scope = parse.consume_scope(tokens, start=lex.LexToken.Type.PAREN_LEFT, end=lex.LexToken.Type.PAREN_RIGHT)
+
+    assert len(scope.result) == 3
+    assert scope.remainder == []
+    assert parse.parse_program('(1+2').python == '((1.0+2.0))'
+
 def test_parse_binary_op():
     tokens = lex.lex('\\frac{1}{2}+1')
     ast = parse.parse_binary_op(tokens)
@@ -171,4 +186,61 @@ def test_implicit_multiplication_parse():
         }
     }
 
-    assert ast.result.dict == expected_dict
\ No newline at end of file
+    assert ast.result.dict == expected_dict
+def test_parse_program_stream():
+    ast = parse.parse_program(io.StringIO('x+y'))
+
+    assert ast.python == '(x+y)'
+
+    ast = parse.parse_program(lex.iter_tokens('5+3'))
+
+    assert ast.python == '(5.0+3.0)'
+
+def test_parse_token_buffer():
+    tokens = lex.lex_buffer('\\frac{1}{2}+1')
+    ast = parse.parse_binary_op(tokens)
+
+    assert ast.result.type == parse.ASTBinaryOp.Type.DIVIDE
+    assert [ t.value for t in ast.remainder ] == ['+', '1']
+    assert parse.parse_program('x+y+5+z').python == '(x+(y+(5.0+z)))'
+
+def test_parse_result_end_index():
+    tokens = lex.lex('(1+2)+x')
+    ast = parse.parse_expression(tokens)
+
+    assert ast.end == 5
+    assert ast.remainder == tokens[5:]
+
+    ast = parse.parse_infix_binary_op(tokens, 1, 4)
+
+    assert ast.result.python == '(1.0+2.0)'
+    assert ast.end == 4
+
+def test_parser_reused():
+    parser = parse.Parser()
+    sources = [ 'x+y+5+z', '(1+2)', '\\frac{1}{2}', '2', 'a\\cdot b+c' ]
+    for tex in sources * 2:
+        assert parser.parse_program(tex) == parse.parse_program(tex)
+
+    # Nothing kept from the last input
+    assert parser._left_args == [] and parser._function_types == []
+
+def test_parser_interns_nodes():
+    interner = Interner()
+    parser = parse.Parser(interner)
+    first = parser.parse_program('x+y+5')
+    second = parser.parse_program('(y+5)')
+
+    assert isinstance(first, Interned)
+    assert first.right_arg is second.children[0]
+    assert parser.parse_implicit_multiplication(lex.lex('2xy')).result.right_arg is interner.binary_op(
+        ASTBinaryOp.Type.MULTIPLY, interner.var('x'), interner.var('y'))
+
+def test_parser_per_thread():
+    with ThreadPoolExecutor(4) as executor:
+        parsers = set(executor.map(lambda _: parse.default_parser(), range(16)))
+        sources = [ '+'.join('abcdefgh'[:i]) for i in range(2, 9) ] * 20
+        results = list(executor.map(parse.parse_program, sources))
+
+    assert parse.default_parser() not in parsers
+    assert [ result.python for result in results ] == [ parse.parse_program(tex).python for tex in sources ]
@@ -0,0 +1,82 @@
+import math
+
+import pytest
+
+from parse import pratt
+from tex_ast import plot
+
+CASES = {
+    'x^{3}-x': plot.View(-2.0, 2.0, -6.0, 6.0),
+    '\\frac{1}{x}': plot.View(-5.0, 5.0, -5.0, 5.0),
+    '\\sqrt{x}': plot.View(-2.0, 8.0, -1.0, 4.0),
+    '\\sqrt{1-x^{2}}': plot.View(-1.5, 1.5, -0.5, 1.5),
+    '\\frac{1}{100x^{2}+1}': plot.View(-5.0, 5.0, -0.2, 1.2),
+    '\\frac{x^{3}}{x^{2}-1}': plot.View(-4.1, 3.9, -8.0, 8.0),
+}
+
+@pytest.mark.parametrize('tex', CASES)
+def test_within_tolerance(tex):
+    tree = pratt.parse_program(tex)
+    view = CASES[tex]
+    samples = plot.sample(tree, view)
+
+    xs = [ x for x, _ in samples.points ]
+    assert xs == sorted(xs)
+    assert xs[0] == view.x_min and xs[-1] == view.x_max
+    assert plot.pixel_error(samples, tree, view) <= 0.5
+
+@pytest.mark.parametrize('tex', [ '\\frac{1}{x}', '\\sqrt{x}', '\\frac{1}{100x^{2}+1}' ])
+def test_fewer_samples_than_uniform(tex):
+    tree = pratt.parse_program(tex)
+    view = CASES[tex]
+    samples = plot.sample(tree, view)
+
+    uniform = plot.sample_uniform(tree, view, 8 * samples.evaluations)
+    assert plot.pixel_error(uniform, tree, view) > 0.5
+
+def test_straight_lines_take_the_initial_grid():
+    view = plot.View(-1.0, 1.0, -10.0, 10.0)
+    for tex in [ '3', '2x+1', '-x' ]:
+        samples = plot.sample(pratt.parse_program(tex), view, initial=4)
+        assert samples.evaluations == 5
+
+def test_pole_breaks_line():
+    # A view with no sample on the pole
+    view = plot.View(-4.9, 5.1, -5.0, 5.0)
+    points = plot.sample(pratt.parse_program('\\frac{1}{x}'), view).points
+    breaks = [ x for x, y in points if math.isnan(y) ]
+    assert len(breaks) == 1 and abs(breaks[0]) < view.pixel_width / 16
+
+def test_domain_edge_located():
+    view = plot.View(-2.0, 8.0, -1.0, 4.0)
+    points = plot.sample(pratt.parse_program('\\sqrt{x+0.3}'), view).points
+    first = next(x for x, y in points if not math.isnan(y))
+    assert -0.3 <= first < -0.3 + view.pixel_width / 16
+
+def test_outside_view_and_undefined_skipped():
+    view = plot.View(-10.0, 10.0, -1.0, 1.0)
+    samples = plot.sample(pratt.parse_program('x^{2}+5'), view)
+    assert samples.evaluations == 17
+
+    samples = plot.sample(pratt.parse_program('\\sqrt{-1-x^{2}}'), view)
+    assert samples.evaluations == 17
+    assert all(math.isnan(y) for _, y in samples.points)
+
+def test_other_variables():
+    view = plot.View(-1.0, 1.0, -5.0, 5.0)
+    tree = pratt.parse_program('ax^{2}+b')
+    points = plot.sample(tree, view, args={ 'a': 2.0, 'b': 1.0 }).points
+    assert all(y == 2 * x ** 2 + 1 for x, y in points)
+
+    with pytest.raises(ValueError, match='No value given for b'):
+        plot.sample(tree, view, args={ 'a': 2.0 })
+
+def test_pixel_error():
+    view = plot.View(0.0, 1.0, 0.0, 1.0, width=100, height=100)
+    tree = pratt.parse_program('x^{2}')
+    chord = plot.Samples(points=[ (0.0, 0.0), (1.0, 1.0) ])
+    # Furthest at x = 1/2, 1/4 below the chord
+    assert plot.pixel_error(chord, tree, view) == pytest.approx(25.0)
+
+    gap = plot.Samples(points=[ (0.0, 0.0), (0.5, math.nan), (1.0, 1.0) ])
+    assert plot.pixel_error(gap, tree, view) == 100.0
@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+from parse import lex
+from parse import parse
+from parse import pratt
+from tex_ast.ast import *
+
+@pytest.mark.parametrize('input_program,expected_python', [
+    ('1+2+3', '((1.0+2.0)+3.0)'),
+    ('2+3\\cdot x', '(2.0+(3.0*x))'),
+    ('a-b-c', '((a+(-b))+(-c))'),
+    ('x^{2}^{3}', '(x**(2.0**3.0))'),
+    ('-x^{2}', '(-(x**2.0))'),
+    ('2xt', '((2.0*x)*t)'),
+    ('ax^{2}+bx', '((a*(x**2.0))+(b*x))'),
+    ('\\frac{x_{1}+1}{2}', '((x1+1.0)/2.0)'),
+    ('x_1+a_{b2}', '(x1+ab2)'),
+    ('\\sqrt{\\frac{1}{x}}', 'math.sqrt((1.0/x))'),
+    ('\\left(x+1\\right)(x-1)', '(((x+1.0))*((x+(-1.0))))'),
+    ('(1+2+3)', '(((1.0+2.0)+3.0))'),
+])
+def test_pratt_parse(input_program, expected_python):
+    ast = parse.parse_program(input_program, engine=parse.ParseEngine.PRATT)
+
+    assert ast.python == expected_python
+
+def test_pratt_node_types():
+    ast = pratt.parse_program('\\sqrt{x}-1')
+
+    assert isinstance(ast, ASTBinaryOp)
+    assert ast.type == ASTBinaryOp.Type.ADD
+    assert isinstance(ast.left_arg, ASTUnaryCommand)
+    assert ast.left_arg.type == ASTUnaryCommand.Type.SQRT
+    assert isinstance(ast.right_arg, ASTUnaryCommand)
+    assert ast.right_arg.type == ASTUnaryCommand.Type.NEGATIVE
+
+def test_pratt_parse_end_index():
+    tokens = lex.lex('(x+1))', dialect=lex.LexDialect.TEX)
+    result = pratt.parse(tokens)
+
+    assert result.end == 5
+
+def test_pratt_matches_backtracking():
+    tex = '(' * 50 + '1+2' + ')' * 50
+
+    expected = parse.parse_program(tex).python
+    assert pratt.parse_program(tex).python == expected
+
+@pytest.mark.parametrize('input_program', [ 'x+', '(x', 'x)', '\\frac{1}', '\\sin{x}' ])
+def test_pratt_parse_error(input_program):
+    with pytest.raises(parse.ParseException):
+        pratt.parse_program(input_program)
+
+@pytest.mark.parametrize('input_program,message', [
+    ('x_', 'Unterminated subscript'),
+    ('x_{1', 'Unterminated subscript'),
+    ('x_+1', "Invalid subscript: '\\+'"),
+    ('x_)', "Invalid subscript: '\\)'"),
+    ('x_{1.5}', "Invalid subscript: '1.5'"),
+    ('x_{a+b}', "Invalid subscript: '\\+'"),
+    ('x_{}', 'Empty subscript'),
+])
+def test_pratt_subscript_error(input_program, message):
+    with pytest.raises(parse.ParseException, match=message):
+        pratt.parse_program(input_program)
+
+def test_parse_program_stream():
+    tex = '\\frac{1}{2}x^{2}+\\left(y\\right)'
+    expected = pratt.parse_program(tex)
+
+    assert pratt.parse_program(io.StringIO(tex)) == expected
+    assert pratt.parse_program(lex.iter_tokens(tex, dialect=lex.LexDialect.TEX)) == expected
+    with pytest.raises(parse.ParseException, match="Unexpected token: '\\)'"):
+        pratt.parse_program(io.StringIO('x+1)'))
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from parse import parse
+from tex_python import server
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(1)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+def request(id, method, **params):
+    return { 'jsonrpc': '2.0', 'id': id, 'method': method, 'params': params }
+
+async def exchange(port: int, messages, raw: bytes = b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b''.join(json.dumps(message).encode() + b'\n' for message in messages) + raw)
+    writer.write_eof()
+    responses = [ json.loads(line) async for line in reader ]
+    writer.close()
+    return responses
+
+def run(messages, raw: bytes = b'', **options):
+    async def main():
+        async with server.Server(**options) as instance:
+            listener = await instance.listen()
+            async with listener:
+                return await exchange(listener.sockets[0].getsockname()[1], messages, raw)
+    return asyncio.run(main())
+
+def by_id(responses):
+    return { response['id']: response for response in responses }
+
+def test_methods():
+    responses = by_id(run([
+        request(1, 'parse', tex='x+1'),
+        request(2, 'parse', tex='\\frac{x}{2}', engine='pratt'),
+        request(3, 'python', tex='x\\cdot 1+y', engine='pratt'),
+        request(4, 'python', tex='x\\cdot 1+y', engine='pratt', optimize=True),
+        request(5, 'evaluate', tex='x\\cdot y+1', engine='pratt', args={ 'x': 2, 'y': 3.5 }),
+    ], workers=1))
+
+    assert responses[1]['result'] == parse.parse_program('x+1').dict
+    assert responses[2]['result'] == parse.parse_program('\\frac{x}{2}', engine=parse.ParseEngine.PRATT).dict
+    assert responses[3]['result'] == 'lambda x,y: ((x*1.0)+y)'
+    assert responses[4]['result'] == 'lambda x,y: (x+y)'
+    assert responses[5]['result'] == 8.0
+
+def test_errors():
+    responses = run([
+        request(1, 'parse', tex='x+'),
+        request(2, 'compile', tex='x'),
+        request(3, 'parse', tex=5),
+        request(4, 'parse', tex='x', engine='fast'),
+        request(5, 'evaluate', tex='x+y', args={ 'x': 1 }),
+        request(6, 'evaluate', tex='\\frac{1}{x}', args={ 'x': 0 }),
+        { 'id': 7, 'method': 'parse' },
+    ], raw=b'{not json\n', workers=1)
+
+    codes = { response['id']: response['error']['code'] for response in responses }
+    assert codes == {
+        1: server.FAILED,
+        2: server.METHOD_NOT_FOUND,
+        3: server.INVALID_PARAMS,
+        4: server.INVALID_PARAMS,
+        5: server.FAILED,
+        6: server.FAILED,
+        7: server.INVALID_REQUEST,
+        None: server.PARSE_ERROR,
+    }
+    assert by_id(responses)[5]['error']['message'] == 'ValueError: No value for y'
+
+def test_non_finite_numbers():
+    responses = by_id(run([
+        # Python's `json` writes these as `Infinity` and `NaN`
+        request(1, 'evaluate', tex='x+1', args={ 'x': float('inf') }),
+        request(2, 'evaluate', tex='x+1', args={ 'x': float('nan') }),
+        # Overflows to infinity
+        request(3, 'evaluate', tex='x\\cdot x', args={ 'x': 1e200 }),
+        # Too large for a float
+        request(4, 'evaluate', tex='x+1', args={ 'x': 10 ** 400 }),
+    ], workers=1))
+
+    assert responses[1]['error']['code'] == responses[2]['error']['code'] == server.INVALID_PARAMS
+    assert responses[3]['error'] == { 'code': server.FAILED, 'message': 'ValueError: Result is not finite: inf' }
+    assert responses[4]['error']['code'] == server.FAILED
+
+def test_batch_requests_and_notifications():
+    responses = run([
+        [ request(1, 'parse', tex='x'), { 'jsonrpc': '2.0', 'method': 'parse', 'params': { 'tex': 'y' } } ],
+        { 'jsonrpc': '2.0', 'method': 'parse', 'params': { 'tex': 'z' } },
+        request(2, 'parse', tex='2'),
+    ], workers=1)
+
+    assert len(responses) == 2
+    batch = next(response for response in responses if isinstance(response, list))
+    assert [ response['id'] for response in batch ] == [1]
+
+def test_concurrent_requests_are_batched():
+    executor = CountingExecutor()
+    messages = [ request(i, 'evaluate', tex=f'x+{i}', args={ 'x': 1 }) for i in range(200) ]
+    responses = by_id(run(messages, executor=executor, max_batch=32, max_delay=0.01))
+    executor.shutdown()
+
+    assert { id: response['result'] for id, response in responses.items() } == { i: i + 1.0 for i in range(200) }
+    assert 200 // 32 <= executor.calls < 200
+
+def test_backpressure_limits_outstanding_requests():
+    executor = CountingExecutor()
+    messages = [ request(i, 'parse', tex=f'x+{i}') for i in range(50) ]
+    responses = run(messages, executor=executor, max_batch=4, max_pending=2, max_in_flight=3, max_delay=0)
+    executor.shutdown()
+
+    assert sorted(response['id'] for response in responses) == list(range(50))
+    # Never more than max_in_flight requests were queued at once
+    assert executor.calls >= 50 // 3
+
+def test_request_too_large():
+    responses = run([], raw=b'"' + b'x' * 200 + b'"\n', workers=1, max_request_bytes=64)
+    assert [ response['error']['code'] for response in responses ] == [ server.INVALID_REQUEST ]
+
+def test_process_pool():
+    messages = [ request(i, 'parse', tex=f'x+{i}' if i % 5 else 'x+') for i in range(20) ]
+    responses = by_id(run(messages, workers=2))
+
+    for i in range(20):
+        if i % 5:
+            assert responses[i]['result'] == parse.parse_program(f'x+{i}').dict
+        else:
+            assert responses[i]['error']['code'] == server.FAILED
+
+def test_stdio():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    input = ''.join(json.dumps(request(i, 'evaluate', tex=f'x+{i}', args={ 'x': 1 })) + '\n' for i in range(5))
+    process = subprocess.run([ sys.executable, os.path.join(root, 'tex_python', 'main.py'), '--serve', '--stdio', '--workers', '1' ],
+        input=input, capture_output=True, text=True, timeout=60, env={ **os.environ, 'PYTHONPATH': root })
+
+    responses = by_id(json.loads(line) for line in process.stdout.splitlines())
+    assert { id: response['result'] for id, response in responses.items() } == { i: i + 1.0 for i in range(5) }
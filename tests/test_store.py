@@ -0,0 +1,92 @@
+import os
+
+import pytest
+
+from parse import parse
+from tex_ast import store
+from tex_ast.store import ASTStore
+
+def tree(tex: str) -> parse.ASTNode:
+    return parse.parse_program(tex)
+
+def test_put_get(tmp_path):
+    with ASTStore(tmp_path) as s:
+        s['a'] = tree('x+1')
+        assert s['a'] == tree('x+1')
+        assert 'a' in s and 'b' not in s
+        assert len(s) == 1
+        assert s.get('b') is None
+        with pytest.raises(KeyError):
+            s['b']
+
+def test_reopen(tmp_path):
+    with ASTStore(tmp_path) as s:
+        s.extend((f'e{i}', tree(f'x+{i}')) for i in range(500))
+
+    with ASTStore(tmp_path) as s:
+        assert len(s) == 500
+        assert s['e123'] == tree('x+123')
+
+def test_overwrite_and_delete(tmp_path):
+    with ASTStore(tmp_path) as s:
+        s['a'] = tree('x+1')
+        s['b'] = tree('x+2')
+        s['a'] = tree('y+1')
+        del s['b']
+
+        assert s['a'] == tree('y+1')
+        assert 'b' not in s
+        assert list(s) == [ 'a' ]
+        with pytest.raises(KeyError):
+            del s['b']
+
+        # Deleted keys can be stored again
+        s['b'] = tree('x+3')
+        assert list(s.items()) == [ ('a', tree('y+1')), ('b', tree('x+3')) ]
+
+def test_compact(tmp_path):
+    with ASTStore(tmp_path) as s:
+        for i in range(50):
+            s['a'] = tree(f'x+{i}')
+        s['b'] = tree('y+1')
+        size = os.path.getsize(tmp_path / 'segment.dat')
+        assert s.garbage() > 0
+
+        s.compact()
+        assert s.garbage() == 0
+        assert os.path.getsize(tmp_path / 'segment.dat') < size
+        assert dict(s.items()) == { 'a': tree('x+49'), 'b': tree('y+1') }
+
+def test_source_key(tmp_path):
+    with ASTStore(tmp_path) as s:
+        key = s.add('x+y')
+        assert key == store.source_key('x+y')
+        assert s.add('x+y') == key
+        assert len(s) == 1
+        assert s[key] == tree('x+y')
+
+def test_lazy_document(tmp_path):
+    with ASTStore(tmp_path) as s:
+        s['a'] = tree('x+5')
+        document = s.document('a')
+        assert document.root.left_arg.name == 'x'
+
+        # Appending remaps the segment under a live document
+        s.extend((f'e{i}', tree(f'x+{i}')) for i in range(100))
+        assert document.root.right_arg.number == 5
+        assert s['e99'] == tree('x+99')
+
+def test_rebuild_missing_index(tmp_path):
+    with ASTStore(tmp_path) as s:
+        s['a'] = tree('x+1')
+        s['a'] = tree('x+2')
+        s['b'] = tree('x+3')
+
+    os.remove(tmp_path / 'index.dat')
+    with ASTStore(tmp_path) as s:
+        assert dict(s.items()) == { 'a': tree('x+2'), 'b': tree('x+3') }
+
+def test_not_a_store(tmp_path):
+    (tmp_path / 'segment.dat').write_bytes(b'nope!')
+    with pytest.raises(store.StoreError):
+        ASTStore(tmp_path)
@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from parse import parse
+from tex_ast import vectorize
+
+PRATT = parse.ParseEngine.PRATT
+
+@pytest.fixture
+def no_numpy(monkeypatch):
+    monkeypatch.setattr(vectorize, 'np', None)
+
+def test_vectorize_args():
+    f = vectorize.vectorize(parse.parse_program('y\\cdot x+1', engine=PRATT))
+
+    assert f.args == ['y', 'x']
+
+def test_vectorize_fallback(no_numpy):
+    ast = parse.parse_program('\\sqrt{x}+\\frac{1}{y}-x', engine=PRATT)
+    result = vectorize.evaluate(ast, x=[0, 4, -1], y=2)
+
+    assert result[:2] == [0.5, -1.5]
+    assert math.isnan(result[2])
+
+def test_vectorize_fallback_scalar(no_numpy):
+    f = vectorize.vectorize(parse.parse_program('x^{2}', engine=PRATT))
+
+    assert f(3) == 9.0
+
+def test_vectorize_fallback_length_mismatch(no_numpy):
+    f = vectorize.vectorize(parse.parse_program('x+y', engine=PRATT))
+
+    with pytest.raises(ValueError):
+        f([1, 2], [1, 2, 3])
+
+def test_vectorize_missing_variable():
+    f = vectorize.vectorize(parse.parse_program('x+y', engine=PRATT))
+
+    with pytest.raises(TypeError):
+        f(x=1)
+
+def test_vectorize_numpy():
+    np = pytest.importorskip('numpy')
+
+    ast = parse.parse_program('-\\sqrt{x}+\\frac{x}{y}+x^{2}', engine=PRATT)
+    x = np.linspace(0, 4, 5)
+    y = np.array([[1.0], [2.0]])
+    result = vectorize.evaluate(ast, { 'x': x, 'y': y })
+
+    assert result.shape == (2, 5)
+    assert np.allclose(result, -np.sqrt(x) + x / y + x ** 2)
+
+def test_vectorize_numpy_domain():
+    np = pytest.importorskip('numpy')
+
+    ast = parse.parse_program('\\sqrt{x}+\\frac{1}{x}', engine=PRATT)
+    result = vectorize.evaluate(ast, x=np.array([-1.0, 0.0, 1.0]))
+
+    assert np.isnan(result[0])
+    assert np.isinf(result[1])
+    assert result[2] == 2.0
+
+def test_vectorize_numpy_constant():
+    np = pytest.importorskip('numpy')
+
+    result = vectorize.evaluate(parse.parse_program('(1+2)', engine=PRATT))
+
+    assert isinstance(result, np.ndarray)
+    assert result == 3.0
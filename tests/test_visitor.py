@@ -0,0 +1,145 @@
+import copy
+import json
+
+import pytest
+
+from parse import lex, parse, pratt
+from tex_ast import serialization, visitor
+from tex_ast.ast import *
+from tex_ast.interned import Interner
+from bench.corpus import generate
+
+TERMS = 100_000
+NAMES = [ 'abcdefghijklmnopqrstuvwxyz'[i % 26] for i in range(TERMS) ]
+
+def var(name: str) -> ASTVar:
+    return ASTVar(children=[], name=name)
+
+def number(value: float) -> ASTNumber:
+    return ASTNumber(children=[], number=value)
+
+def add(a: ASTNode, b: ASTNode) -> ASTBinaryOp:
+    return ASTBinaryOp(children=[], type=ASTBinaryOp.Type.ADD, left_arg=a, right_arg=b)
+
+@pytest.fixture(scope='module')
+def long_sum():
+    # `a+b+c+...` parses right-leaning, one level per term
+    return parse.parse_program('+'.join(NAMES))
+
+def test_walk_order():
+    root = add(var('a'), ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.SQRT, arg=var('b')))
+    assert [ type(node).__name__ for node in visitor.walk(root) ] == [ 'ASTBinaryOp', 'ASTVar', 'ASTUnaryCommand', 'ASTVar' ]
+
+def test_fold():
+    root = pratt.parse_program('(a+b)\\cdot \\sqrt{c}')
+    depth = visitor.fold(root, lambda node, *values: 1 + max(values, default=0))
+    assert depth == 4
+
+def test_visitor_dispatch():
+    class Names(visitor.Visitor):
+        def visit_ASTVar(self, node):
+            return [ node.name ]
+
+        def visit_ASTNode(self, node, *values):
+            return sum(values, [])
+
+    root = Interner().intern(pratt.parse_program('a+b\\cdot (c-1)'))
+    # Interned classes dispatch to their `tex_ast.ast` base's method
+    assert Names().visit(root) == [ 'a', 'b', 'c' ]
+
+def test_visitor_unhandled():
+    with pytest.raises(TypeError, match='cannot visit ASTVar'):
+        visitor.Visitor().visit(var('x'))
+
+def test_transformer_shares_unchanged():
+    class Rename(visitor.Transformer):
+        def visit_ASTVar(self, node):
+            return var('y') if node.name == 'x' else node
+
+    root = pratt.parse_program('(a+b)\\cdot x')
+    result = Rename().visit(root)
+
+    assert result.python == pratt.parse_program('(a+b)\\cdot y').python
+    assert result is not root
+    assert result.left_arg is root.left_arg
+
+def test_render():
+    root = add(var('a'), number(2))
+    pieces = lambda node: node.name if isinstance(node, ASTVar) else str(node.number) if isinstance(node, ASTNumber) else ('[', node.left_arg, ' plus ', node.right_arg, ']')
+    assert visitor.render(root, pieces) == '[a plus 2]'
+
+def test_copy():
+    root = pratt.parse_program('\\frac{x}{2}+\\sqrt{y}')
+    copied = visitor.copy(root)
+    assert copied == root
+    assert all(a is not b for a, b in zip(visitor.walk(copied), visitor.walk(root)))
+
+def test_repr_matches_dataclass_format():
+    assert repr(add(var('x'), number(2.0))) == \
+        "ASTBinaryOp(children=[], type=<Type.ADD: 1>, left_arg=ASTVar(children=[], name='x'), right_arg=ASTNumber(children=[], number=2.0))"
+    assert repr(ASTExpression(children=[ var('x') ])) == "ASTExpression(children=[ASTVar(children=[], name='x')])"
+    assert repr(Interner().expression([ Interner().var('x') ])) == "InternedExpression(children=(InternedVar(children=(), name='x'),))"
+
+def test_equality():
+    assert add(var('x'), number(2)) == add(var('x'), number(2))
+    assert add(var('x'), number(2)) != add(var('x'), number(3))
+    assert add(var('x'), number(2)) != add(number(2), var('x'))
+    assert ASTExpression(children=[ var('x') ]) != ASTExpression(children=[ var('x'), var('y') ])
+    assert var('x') != 'x'
+
+@pytest.mark.parametrize('tex', generate(30, seed=3))
+def test_representations_unchanged(tex):
+    # Against the recursive definitions the walks replace
+    def python(node):
+        match node:
+            case ASTBinaryOp():
+                return f'({python(node.left_arg)}{node.type}{python(node.right_arg)})'
+            case ASTUnaryCommand(type=ASTUnaryCommand.Type.SQRT):
+                return f'math.sqrt({python(node.arg)})'
+            case ASTUnaryCommand():
+                return f'(-{python(node.arg)})'
+            case ASTExpression():
+                return f'({python(node.children[0])})'
+        return node.python
+
+    root = pratt.parse_program(tex)
+    assert root.python == python(root)
+    assert root.dict == json.loads(serialization.dumps(root))
+
+def test_deep_sum(long_sum):
+    assert parse.tree_size(long_sum) == 2 * TERMS - 1
+    assert long_sum.python == '(' + '+('.join(NAMES[:-1]) + '+' + NAMES[-1] + ')' * (TERMS - 1)
+    assert long_sum.vars == NAMES[:26]
+    assert long_sum.python_func_str.startswith('lambda a,b,c,')
+
+    d = long_sum.dict
+    for _ in range(TERMS - 1):
+        d = d['right_arg']
+    assert d == { 'type': 'ASTVar', 'name': NAMES[-1] }
+
+def test_deep_sum_copies(long_sum):
+    # `json.loads` recurses, so the round trip goes through `.dict`
+    assert serialization.from_dict(long_sum.dict) == long_sum
+    assert copy.deepcopy(long_sum) == long_sum
+    assert repr(long_sum).count('ASTBinaryOp(') == TERMS - 1
+
+def test_deep_pratt_sum():
+    # Left-leaning, through the Pratt parser's loop
+    root = pratt.parse_program('+'.join([ 'x' ] * TERMS))
+    assert root.python == '(' * (TERMS - 1) + 'x' + '+x)' * (TERMS - 1)
+    assert root.dict['left_arg']['left_arg']['type'] == 'ASTBinaryOp'
+
+def test_deep_implicit_product():
+    tokens = lex.lex_buffer('2' + 'x' * TERMS)
+    result = parse.parse_implicit_multiplication(tokens)
+
+    assert result.end == TERMS + 1
+    assert result.result.left_arg == number('2')
+    assert result.result.python == '(2' + '*(x' * (TERMS - 1) + '*x' + ')' * TERMS
+
+def test_deep_infix_chain_end():
+    # The chain stops before a trailing operator, as the recursive parser did
+    tokens = lex.lex_buffer('a+' * TERMS + '+')
+    result = parse.parse_infix_binary_op(tokens)
+    assert result.end == 2 * TERMS - 1
+    assert parse.tree_size(result.result) == 2 * TERMS - 1
@@ -1,36 +1,272 @@
-from dataclasses import dataclass
-from typing import List, Self, Optional
+import functools
+import math
+from dataclasses import dataclass, fields, replace
+from typing import Any, Callable, List, Self, Optional, Sequence, Tuple
 from enum import Enum, auto
 
 from parse import lex
+from tex_ast import visitor
 
 class PythonRepresentable():
+    __slots__ = ()
+
     @property
     def python(self) -> str:
         return ''
 
 class DictRepresentable():
+    __slots__ = ()
+
     # TODO: ABC?
     @property
     def dict(self) -> dict:
         return {}
 
-@dataclass
+# Every class passes eq=False and repr=False so that `ASTNode`'s iterative
+# `__eq__` and `__repr__` apply instead of the recursive generated ones
+@dataclass(slots=True, eq=False, repr=False)
 class ASTNode(PythonRepresentable, DictRepresentable):
     children: List[Self]
 
-@dataclass
+    # Whether nodes of this class can never change, so that what is worked
+    # out from them (`free_variables`, compiled functions) can be kept on them.
+    # Only `tex_ast.interned` nodes are; others may be edited at any time.
+    _frozen = False
+
+    @property
+    def python_func(self) -> Callable:
+        ''' This tree compiled to a function of its free variables; see `tex_ast.codegen`. '''
+        from tex_ast import codegen
+        return codegen.compile_ast(self)
+
+    @property
+    def vars(self) -> List[str]:
+        ''' Variable names in this tree, deduplicated, in order of first appearance. '''
+        return list(free_variables(self))
+
+    # Hooks for the walks in `tex_ast.visitor`, which all keep their own
+    # stack rather than recursing. Nodes with operands override them.
+
+    def _operands(self) -> Sequence[Self]:
+        ''' The nodes directly under this one, in order. '''
+        return self.children
+
+    def _with_operands(self, operands: Sequence[Self]) -> Self:
+        ''' A new node like this one with `operands` in place of its own. '''
+        return replace(self, children=list(operands))
+
+    def _python_pieces(self) -> visitor.Pieces:
+        ''' `.python` as text and operand nodes, for `visitor.render`. '''
+        return self.python
+
+    def _dict(self, *operands: dict) -> dict:
+        ''' `.dict`, given the operands' `.dict`s. '''
+        return self.dict
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return _equal(self, other)
+
+    def __repr__(self) -> str:
+        return visitor.render(self, _repr_pieces)
+
+    def __deepcopy__(self, memo) -> Self:
+        result = memo[id(self)] = visitor.copy(self)
+        return result
+
+def _render_python(root: ASTNode) -> str:
+    # `visitor.render(root, methodcaller('_python_pieces'))`, with the pieces of
+    # the plain classes written inline: per-node calls would otherwise cost
+    # more than the recursion this replaces
+    out = []
+    stack = [root]
+    pop = stack.pop
+    push = stack.append
+    emit = out.append
+    while stack:
+        item = pop()
+        cls = item.__class__
+        if cls is str:
+            emit(item)
+        elif cls is ASTBinaryOp:
+            emit('(')
+            push(')')
+            push(item.right_arg)
+            push(_BINARY_SYMBOLS[item.type._value_])
+            push(item.left_arg)
+        elif cls is ASTVar:
+            emit(item.name)
+        elif cls is ASTNumber:
+            emit(str(item.number))
+        else:
+            pieces = item._python_pieces()
+            if pieces.__class__ is str:
+                emit(pieces)
+            else:
+                stack.extend(reversed(pieces))
+
+    return ''.join(out)
+
+def _dict_of(node: ASTNode, *operands: dict) -> dict:
+    return node._dict(*operands)
+
+def _build_dict(root: ASTNode) -> dict:
+    # Parents first: each dict is made with its operands' entries empty, and
+    # they are filled in when the operands are reached. Other classes (and
+    # subclasses) go through their `_dict`, bottom-up with `visitor.fold`.
+    result = [ None ]
+    stack = [ (root, result, 0) ]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node, parent, key = pop()
+        cls = node.__class__
+        if cls is ASTBinaryOp:
+            value = {
+                'type': 'ASTBinaryOp',
+                'op': _BINARY_SYMBOLS[node.type._value_],
+                'left_arg': None,
+                'right_arg': None
+            }
+            push((node.right_arg, value, 'right_arg'))
+            push((node.left_arg, value, 'left_arg'))
+        elif cls is ASTVar:
+            value = { 'type': 'ASTVar', 'name': node.name }
+        elif cls is ASTNumber:
+            value = { 'type': 'ASTNumber', 'number': str(node.number) }
+        elif cls is ASTUnaryCommand:
+            value = { 'type': 'ASTUnaryCommand', 'op': _UNARY_SYMBOLS[node.type._value_], 'arg': None }
+            push((node.arg, value, 'arg'))
+        elif cls is ASTExpression:
+            children = [ None ] * len(node.children)
+            value = { 'type': 'ASTExpression', 'children': children }
+            for i in range(len(children) - 1, -1, -1):
+                push((node.children[i], children, i))
+        else:
+            value = visitor.fold(node, _dict_of)
+        parent[key] = value
+
+    return result[0]
+
+def free_variables(root: ASTNode) -> Tuple[str, ...]:
+    ''' Variable names in the tree `root`, deduplicated, in order of first
+    appearance. Frozen (interned) roots keep the result, and frozen subtrees
+    that already have theirs are not walked again. Mutable trees are walked
+    each time, as they may have been edited since. Only `root` keeps it:
+    keeping it on every node would take time and memory quadratic in the
+    depth of a long sum.
+    '''
+    # Interned nodes are built without `__init__`, so they may lack the slot
+    variables = getattr(root, '_variables', None)
+    if variables is not None:
+        return variables
+
+    names = {}
+    stack = [root]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node = pop()
+        cls = node.__class__
+        # The plain classes first, without the generic lookups
+        if cls is ASTVar:
+            names[node.name] = None
+            continue
+        if cls is ASTNumber:
+            continue
+        if cls is ASTBinaryOp:
+            push(node.right_arg)
+            push(node.left_arg)
+            continue
+
+        if isinstance(node, ASTVar):
+            names[node.name] = None
+            continue
+        known = getattr(node, '_variables', None)
+        if known is not None:
+            names.update(dict.fromkeys(known))
+        else:
+            stack.extend(reversed(node._operands()))
+
+    variables = tuple(names)
+    if root._frozen:
+        # Through `object` as interned nodes are frozen
+        object.__setattr__(root, '_variables', variables)
+    return variables
+
+@functools.cache
+def _field_names(cls: type) -> Tuple[str, ...]:
+    return tuple(field.name for field in fields(cls) if field.compare)
+
+def _equal(a: ASTNode, b: ASTNode) -> bool:
+    # Field by field, like the generated `__eq__`, with pairs of nodes still
+    # to compare on a stack
+    stack = [ (a, b) ]
+    while stack:
+        a, b = stack.pop()
+        if a is b:
+            continue
+        # Mixed classes (an interned node and a plain one) compare their own way
+        if a.__class__ is not b.__class__ or not isinstance(a, ASTNode):
+            if a != b:
+                return False
+            continue
+
+        for name in _field_names(a.__class__):
+            x = getattr(a, name)
+            y = getattr(b, name)
+            if isinstance(x, ASTNode):
+                stack.append((x, y))
+            elif isinstance(x, (list, tuple)) and x.__class__ is y.__class__:
+                if len(x) != len(y):
+                    return False
+                stack.extend(zip(x, y))
+            elif x is not y and x != y:
+                return False
+
+    return True
+
+def _repr_pieces(node: Any) -> visitor.Pieces:
+    # The generated `__repr__`'s format: `ASTVar(children=[], name='x')`
+    pieces: List[Any] = [ f'{node.__class__.__qualname__}(' ]
+    for i, name in enumerate(_field_names(node.__class__)):
+        pieces.append(f'{", " if i else ""}{name}=')
+        value = getattr(node, name)
+        if isinstance(value, ASTNode):
+            pieces.append(value)
+        elif isinstance(value, (list, tuple)) and value and all(isinstance(item, ASTNode) for item in value):
+            pieces.append('[' if isinstance(value, list) else '(')
+            for j, item in enumerate(value):
+                if j:
+                    pieces.append(', ')
+                pieces.append(item)
+            pieces.append(']' if isinstance(value, list) else ',)' if len(value) == 1 else ')')
+        else:
+            pieces.append(repr(value))
+    pieces.append(')')
+    return tuple(pieces)
+
+@dataclass(slots=True, eq=False, repr=False)
 class ASTExpression(ASTNode):
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        return ASTExpression(children=list(operands))
+
+    def _dict(self, *operands: dict) -> dict:
+        return { 'type': 'ASTExpression', 'children': list(operands) }
+
+    def _python_pieces(self) -> visitor.Pieces:
+        return ('(', self.children[0], ')')
+
     @property
     def dict(self) -> dict:
-        # TODO: Iterate children
-        return { 'type': 'ASTExpression', 'children': []}
+        return _build_dict(self)
 
     @property
     def python(self) -> str:
-        return f'({self.children[0].python})'
+        return _render_python(self)
 
-@dataclass 
+@dataclass(slots=True, eq=False, repr=False)
 class ASTBinaryOp(ASTNode):
     class Type(Enum):
         ADD = auto() 
@@ -51,62 +287,59 @@ class ASTBinaryOp(ASTNode):
             return None
         
         def __str__(self) -> str:
-            match self:
-                case ASTBinaryOp.Type.ADD:
-                    return '+'
-                case ASTBinaryOp.Type.MULTIPLY:
-                    return '*'
-                case ASTBinaryOp.Type.POW:
-                    return '**'
-                case ASTBinaryOp.Type.DIVIDE:
-                    return '/'
+            return _BINARY_SYMBOLS[self._value_]
         
     type: Type
     left_arg: ASTNode
     right_arg: ASTNode
 
-    @property
-    def dict(self) -> dict:
+    def _operands(self) -> Sequence[ASTNode]:
+        return (self.left_arg, self.right_arg)
+
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        left_arg, right_arg = operands
+        return ASTBinaryOp(children=[], type=self.type, left_arg=left_arg, right_arg=right_arg)
+
+    def _dict(self, left_arg: dict, right_arg: dict) -> dict:
         return {
             'type': 'ASTBinaryOp',
             'op': str(self.type),
-            'left_arg': self.left_arg.dict,
-            'right_arg': self.right_arg.dict
+            'left_arg': left_arg,
+            'right_arg': right_arg
         }
 
+    def _python_pieces(self) -> visitor.Pieces:
+        return ('(', self.left_arg, str(self.type), self.right_arg, ')')
+
     @property
-    def python_func(self):
-        return eval(self.python_func_str)
+    def dict(self) -> dict:
+        return _build_dict(self)
 
     @property
     def python(self) -> str:
-        return f'({self.left_arg.python}{str(self.type)}{self.right_arg.python})'
+        return _render_python(self)
 
     @property
     def python_func_str(self) -> str:
-        # TODO: Walk tree and collect variables 
-        args = ','.join(self.vars)
-        if not args == '':
-            args = ' ' + args
-        return f'lambda{args}: {self.python}'
+        from tex_ast import codegen
+        return codegen.lambda_source(self)
 
-    @property
-    def vars(self) -> List[str]:
-        results = []
-        if isinstance(self.left_arg, ASTVar):
-            results.append(self.left_arg.name)
-
-        if isinstance(self.right_arg, ASTVar):
-            results.append(self.right_arg.name)
-        elif isinstance(self.right_arg, ASTBinaryOp):
-            results.extend(self.right_arg.vars)
-        
-        return results
+# Keyed by value: hashing an `Enum` member costs more than the lookup, and
+# `str(node.type)` is called for every operator written out
+_BINARY_SYMBOLS = {
+    ASTBinaryOp.Type.ADD.value: '+',
+    ASTBinaryOp.Type.MULTIPLY.value: '*',
+    ASTBinaryOp.Type.POW.value: '**',
+    ASTBinaryOp.Type.DIVIDE.value: '/',
+}
 
-@dataclass
+@dataclass(slots=True, eq=False, repr=False)
 class ASTVar(ASTNode):
     name: str
 
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        return ASTVar(children=[], name=self.name)
+
     @property
     def dict(self) -> dict:
         return { 'type': 'ASTVar', 'name': self.name }
@@ -115,18 +348,28 @@ class ASTVar(ASTNode):
     def python(self) -> str:
         return self.name
 
-@dataclass
+@dataclass(slots=True, eq=False, repr=False)
 class ASTArg(ASTNode):
     value: str
 
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        return ASTArg(children=[], value=self.value)
+
+    @property
+    def dict(self) -> dict:
+        return { 'type': 'ASTArg', 'value': self.value }
+
     @property
     def python(self) -> str:
         return self.value
 
-@dataclass
+@dataclass(slots=True, eq=False, repr=False)
 class ASTNumber(ASTNode):
     number: float
 
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        return ASTNumber(children=[], number=self.number)
+
     @property
     def dict(self) -> dict:
         return { 'type': 'ASTNumber', 'number': str(self.number) }
@@ -135,11 +378,11 @@ class ASTNumber(ASTNode):
     def python(self) -> str:
         return str(self.number)
 
-@dataclass
+@dataclass(slots=True, eq=False, repr=False)
 class ASTParen(ASTNode):
     ...
 
-@dataclass
+@dataclass(slots=True, eq=False, repr=False)
 class ASTUnaryCommand(ASTNode):
     class Type(Enum):
         SQRT = auto()
@@ -155,15 +398,42 @@ class ASTUnaryCommand(ASTNode):
             
             return None
 
+        def __str__(self) -> str:
+            return _UNARY_SYMBOLS[self._value_]
+
     type: Type
     arg: ASTNode
 
+    def _operands(self) -> Sequence[ASTNode]:
+        return (self.arg,)
+
+    def _with_operands(self, operands: Sequence[ASTNode]) -> Self:
+        arg, = operands
+        return ASTUnaryCommand(children=[], type=self.type, arg=arg)
+
+    def _dict(self, arg: dict) -> dict:
+        return {
+            'type': 'ASTUnaryCommand',
+            'op': str(self.type),
+            'arg': arg
+        }
+
+    def _python_pieces(self) -> visitor.Pieces:
+        match self.type:
+            case ASTUnaryCommand.Type.SQRT:
+                return ('math.sqrt(', self.arg, ')')
+            case ASTUnaryCommand.Type.NEGATIVE:
+                return ('(-', self.arg, ')')
+
     @property
     def dict(self) -> dict:
-        # TODO
-        raise NotImplementedError()
-    
+        return _build_dict(self)
+
     @property
     def python(self) -> str:
-        # TODO
-        raise NotImplementedError()
\ No newline at end of file
+        return _render_python(self)
+
+_UNARY_SYMBOLS = {
+    ASTUnaryCommand.Type.SQRT.value: 'sqrt',
+    ASTUnaryCommand.Type.NEGATIVE.value: '-',
+}
@@ -0,0 +1,384 @@
+''' Compact binary encoding of ASTs.
+
+Layout, little-endian:
+
+    header    magic b'TXAB', version u8, string count u32,
+              node section offset u32, root offset u32
+    strings   (count + 1) u32 offsets into the string data, then the UTF-8
+              string data; every variable name, number and argument text
+              is stored once and referred to by index
+    nodes     one record per node, children before their parents:
+
+        VAR, NUMBER, ARG    tag, varint string index
+        BINARY              tag, op u8, varint distance to left, to right
+        UNARY               tag, op u8, varint distance to arg
+        EXPRESSION          tag, varint child count, varint distance per child
+
+Distances count back from the start of the parent record to the start of the
+child's, so they are small and always positive. Numbers are stored as the
+text `ASTNumber.dict` gives them and read back with
+`serialization.parse_number`.
+
+`decode` builds the dataclass tree in one pass over the node section.
+`Document` instead reads nodes on demand from any buffer, e.g. an `mmap` of a
+file, and only materializes the subtrees asked for.
+'''
+import struct
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple, Union
+
+from tex_ast import serialization
+from tex_ast.ast import *
+
+MAGIC = b'TXAB'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sBIII')
+_OFFSET = struct.Struct('<I')
+
+class Tag(IntEnum):
+    ''' The first byte of each node record. '''
+    VAR = 1
+    NUMBER = 2
+    ARG = 3
+    BINARY = 4
+    UNARY = 5
+    EXPRESSION = 6
+
+_BINARY_OPS = { op.value: op for op in ASTBinaryOp.Type }
+_UNARY_OPS = { op.value: op for op in ASTUnaryCommand.Type }
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+class DecodeError(ValueError):
+    pass
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(view: memoryview, pos: int) -> Tuple[int, int]:
+    ''' The varint at `pos`, and the position after it. '''
+    value = 0
+    shift = 0
+    while True:
+        try:
+            byte = view[pos]
+        except IndexError:
+            raise DecodeError(f'Truncated varint at offset {pos}') from None
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def encode(root: ASTNode) -> bytes:
+    strings = {}
+    nodes = bytearray()
+    offsets = {}
+
+    def intern(text: str) -> int:
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    # Post-order walk, so children are written (and have offsets) before parents
+    stack = [ (root, False) ]
+    while stack:
+        node, ready = stack.pop()
+        offset = len(nodes)
+        match node:
+            case ASTVar():
+                nodes.append(Tag.VAR)
+                _write_varint(nodes, intern(node.name))
+            case ASTNumber():
+                nodes.append(Tag.NUMBER)
+                _write_varint(nodes, intern(str(node.number)))
+            case ASTArg():
+                nodes.append(Tag.ARG)
+                _write_varint(nodes, intern(node.value))
+            case ASTBinaryOp():
+                if not ready:
+                    stack.extend([ (node, True), (node.right_arg, False), (node.left_arg, False) ])
+                    continue
+                nodes.append(Tag.BINARY)
+                nodes.append(node.type.value)
+                _write_varint(nodes, offset - offsets[id(node.left_arg)])
+                _write_varint(nodes, offset - offsets[id(node.right_arg)])
+            case ASTUnaryCommand():
+                if not ready:
+                    stack.extend([ (node, True), (node.arg, False) ])
+                    continue
+                nodes.append(Tag.UNARY)
+                nodes.append(node.type.value)
+                _write_varint(nodes, offset - offsets[id(node.arg)])
+            case ASTExpression():
+                if not ready:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(node.children))
+                    continue
+                nodes.append(Tag.EXPRESSION)
+                _write_varint(nodes, len(node.children))
+                for child in node.children:
+                    _write_varint(nodes, offset - offsets[id(child)])
+            case _:
+                raise TypeError(f'Cannot encode {type(node).__name__}')
+
+        offsets[id(node)] = offset
+
+    data = [ text.encode('utf-8') for text in strings ]
+    table = bytearray()
+    position = 0
+    for text in data:
+        table += _OFFSET.pack(position)
+        position += len(text)
+    table += _OFFSET.pack(position)
+
+    node_start = _HEADER.size + len(table) + position
+    header = _HEADER.pack(MAGIC, VERSION, len(strings), node_start, node_start + offsets[id(root)])
+    return b''.join([ header, table, *data, nodes ])
+
+class Document:
+    ''' An encoded tree read in place from `buffer`.
+
+    Nothing is decoded up front; strings are decoded (once) and nodes read
+    only when accessed. With an `mmap`, call `release` (or use the document
+    as a context manager) before closing the map.
+    '''
+
+    def __init__(self, buffer: Buffer):
+        self._view = memoryview(buffer).cast('B')
+        if len(self._view) < _HEADER.size:
+            raise DecodeError('Buffer too short for a header')
+
+        magic, version, count, node_start, root = _HEADER.unpack_from(self._view)
+        if magic != MAGIC:
+            raise DecodeError(f'Bad magic: {bytes(magic)!r}')
+        if version != VERSION:
+            raise DecodeError(f'Unsupported version: {version}')
+        string_data = _HEADER.size + _OFFSET.size * (count + 1)
+        if not string_data <= node_start <= len(self._view):
+            raise DecodeError('Node section offset out of range')
+        if not node_start <= root < len(self._view):
+            raise DecodeError('Root offset out of range')
+
+        self._string_count = count
+        self._string_data = string_data
+        self._node_start = node_start
+        self._root = root
+        self._strings: Dict[int, str] = {}
+
+    def __enter__(self) -> 'Document':
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def release(self):
+        self._view.release()
+
+    @property
+    def root(self) -> 'LazyNode':
+        return LazyNode(self, self._root)
+
+    def string(self, index: int) -> str:
+        text = self._strings.get(index)
+        if text is None:
+            if index >= self._string_count:
+                raise DecodeError(f'String index out of range: {index}')
+            start, = _OFFSET.unpack_from(self._view, _HEADER.size + _OFFSET.size * index)
+            end, = _OFFSET.unpack_from(self._view, _HEADER.size + _OFFSET.size * (index + 1))
+            if not start <= end <= self._node_start - self._string_data:
+                raise DecodeError(f'String {index} out of range')
+            text = self._strings[index] = str(self._view[self._string_data + start:self._string_data + end], 'utf-8')
+        return text
+
+    def materialize(self, offset: Optional[int] = None) -> ASTNode:
+        ''' The dataclass tree rooted at `offset` (default: the root).
+
+        Records are read forward from the first one the subtree can contain;
+        children always precede their parent, so each node's children are
+        already built when it is reached.
+        '''
+        end = self._root if offset is None else offset
+        built: Dict[int, ASTNode] = {}
+
+        pos = self._node_start if offset is None else self._subtree_start(offset)
+        try:
+            self._read_records(built, pos, end)
+            return built[end]
+        except (IndexError, KeyError):
+            # A record running past the end of the buffer, or one that names
+            # an op or a child that is not there
+            raise DecodeError(f'Truncated or corrupt node section before offset {end}') from None
+
+    def _read_records(self, built: Dict[int, ASTNode], pos: int, end: int):
+        view = self._view
+        while pos <= end:
+            offset = pos
+            tag = view[pos]
+            pos += 1
+            match tag:
+                case Tag.VAR:
+                    index, pos = _read_varint(view, pos)
+                    node = ASTVar(children=[], name=self.string(index))
+                case Tag.NUMBER:
+                    index, pos = _read_varint(view, pos)
+                    node = ASTNumber(children=[], number=serialization.parse_number(self.string(index)))
+                case Tag.ARG:
+                    index, pos = _read_varint(view, pos)
+                    node = ASTArg(children=[], value=self.string(index))
+                case Tag.BINARY:
+                    op = _BINARY_OPS[view[pos]]
+                    left, pos = _read_varint(view, pos + 1)
+                    right, pos = _read_varint(view, pos)
+                    node = ASTBinaryOp(children=[], type=op, left_arg=built[offset - left], right_arg=built[offset - right])
+                case Tag.UNARY:
+                    op = _UNARY_OPS[view[pos]]
+                    arg, pos = _read_varint(view, pos + 1)
+                    node = ASTUnaryCommand(children=[], type=op, arg=built[offset - arg])
+                case Tag.EXPRESSION:
+                    count, pos = _read_varint(view, pos)
+                    children = []
+                    for _ in range(count):
+                        distance, pos = _read_varint(view, pos)
+                        children.append(built[offset - distance])
+                    node = ASTExpression(children=children)
+                case _:
+                    raise DecodeError(f'Unknown tag {tag} at offset {offset}')
+
+            built[offset] = node
+
+    def _subtree_start(self, offset: int) -> int:
+        # The deepest-first child of a post-order subtree is written first
+        while True:
+            children = self._children(offset)
+            if not children:
+                return offset
+            offset = children[0]
+
+    def _record(self, offset: int) -> Tuple[int, int]:
+        ''' Tag of the record at `offset`, and the position after the tag. '''
+        if not self._node_start <= offset < len(self._view):
+            raise DecodeError(f'Node offset out of range: {offset}')
+        return self._view[offset], offset + 1
+
+    def _children(self, offset: int) -> List[int]:
+        tag, pos = self._record(offset)
+        match tag:
+            case Tag.BINARY:
+                left, pos = _read_varint(self._view, pos + 1)
+                right, _ = _read_varint(self._view, pos)
+                return [ offset - left, offset - right ]
+            case Tag.UNARY:
+                arg, _ = _read_varint(self._view, pos + 1)
+                return [ offset - arg ]
+            case Tag.EXPRESSION:
+                count, pos = _read_varint(self._view, pos)
+                children = []
+                for _ in range(count):
+                    distance, pos = _read_varint(self._view, pos)
+                    children.append(offset - distance)
+                return children
+        return []
+
+class LazyNode:
+    ''' A node of a `Document`, read from the buffer on access. '''
+
+    _TYPES = {
+        Tag.VAR: 'ASTVar',
+        Tag.NUMBER: 'ASTNumber',
+        Tag.ARG: 'ASTArg',
+        Tag.BINARY: 'ASTBinaryOp',
+        Tag.UNARY: 'ASTUnaryCommand',
+        Tag.EXPRESSION: 'ASTExpression',
+    }
+
+    def __init__(self, document: Document, offset: int):
+        self.document = document
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return f'LazyNode({self.type}, offset={self.offset})'
+
+    @property
+    def tag(self) -> int:
+        return self.document._record(self.offset)[0]
+
+    @property
+    def type(self) -> str:
+        ''' Name of the node's class, as in its `.dict`. '''
+        return self._TYPES[self.tag]
+
+    def _string(self, tag: int) -> str:
+        found, pos = self.document._record(self.offset)
+        if found != tag:
+            raise AttributeError(f'{self._TYPES[found]} has no {self._TYPES[tag]} text')
+        return self.document.string(_read_varint(self.document._view, pos)[0])
+
+    @property
+    def name(self) -> str:
+        return self._string(Tag.VAR)
+
+    @property
+    def number(self) -> Union[int, float, str]:
+        return serialization.parse_number(self._string(Tag.NUMBER))
+
+    @property
+    def value(self) -> str:
+        return self._string(Tag.ARG)
+
+    @property
+    def op(self) -> Union[ASTBinaryOp.Type, ASTUnaryCommand.Type]:
+        tag, pos = self.document._record(self.offset)
+        try:
+            match tag:
+                case Tag.BINARY:
+                    return _BINARY_OPS[self.document._view[pos]]
+                case Tag.UNARY:
+                    return _UNARY_OPS[self.document._view[pos]]
+        except (IndexError, KeyError):
+            raise DecodeError(f'Truncated or corrupt op at offset {pos}') from None
+        raise AttributeError(f'{self._TYPES[tag]} has no op')
+
+    @property
+    def children(self) -> List['LazyNode']:
+        ''' Operands in order: left and right, the argument, or the children. '''
+        return [ LazyNode(self.document, offset) for offset in self.document._children(self.offset) ]
+
+    @property
+    def left_arg(self) -> 'LazyNode':
+        return self._operand(Tag.BINARY, 0)
+
+    @property
+    def right_arg(self) -> 'LazyNode':
+        return self._operand(Tag.BINARY, 1)
+
+    @property
+    def arg(self) -> 'LazyNode':
+        return self._operand(Tag.UNARY, 0)
+
+    def _operand(self, tag: int, i: int) -> 'LazyNode':
+        if self.tag != tag:
+            raise AttributeError(f'{self.type} is not an {self._TYPES[tag]}')
+        return self.children[i]
+
+    def materialize(self) -> ASTNode:
+        return self.document.materialize(self.offset)
+
+def decode(buffer: Buffer) -> ASTNode:
+    document = Document(buffer)
+    try:
+        return document.materialize()
+    finally:
+        document.release()
+
+def from_json(text: str) -> bytes:
+    ''' Encode the JSON output of `serialization.dumps`. '''
+    return encode(serialization.loads(text))
+
+def to_json(buffer: Buffer, indent: Optional[int] = None) -> str:
+    return serialization.dumps(decode(buffer), indent=indent)
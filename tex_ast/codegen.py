@@ -0,0 +1,299 @@
+''' Compile ASTs to Python functions.
+
+The generated function takes the tree's free variables as positional
+arguments, in order of first appearance (left to right). Compiled functions
+are memoized on their generated source, which doubles as a structural hash:
+structurally equal trees share one code object. `compile_ast` also keeps
+the functions of interned nodes (`tex_ast.interned`) on the node, so asking
+again costs a dict lookup; mutable trees may be edited in between, so they
+are looked up by their source each time.
+
+With `common=True`, a subtree that occurs more than once is computed once
+into a temporary with an assignment expression where it is first evaluated,
+and read back everywhere else:
+
+    lambda x: ((_cse0 := (x/2))+(_cse0*_cse0))
+
+Operators nested more than `MAX_DEPTH` deep are computed into temporaries
+first, in a tuple whose last item is the value, so a sum of any length
+compiles:
+
+    lambda a,b,...: ((_t0 := (y+(z+...))), (_t1 := (w+(x+_t0))), ..., (a+(b+_t9)))[-1]
+
+`compile_ast(node, passes)` also runs the tree rewrites in `tex_ast.optimize`
+first. `compile_many(nodes, passes)` compiles several trees into one function
+returning a tuple, with temporaries shared between them.
+'''
+import functools
+import math
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from parse import instrument
+from tex_ast import optimize, visitor
+from tex_ast.ast import *
+
+# Names available to generated code
+_GLOBALS = { 'math': math }
+
+def free_vars(node: ASTNode) -> List[str]:
+    ''' Variable names under `node`, deduplicated, in order of first appearance.
+    See `tex_ast.ast.free_variables`, which this caches through.
+    '''
+    return list(free_variables(node))
+
+def _structure(root: ASTNode) -> Dict[int, int]:
+    ''' Number each node so that structurally equal subtrees share a number. '''
+    numbers = {}
+    ids: Dict[Hashable, int] = {}
+    stack = [ (root, False) ]
+    while stack:
+        node, ready = stack.pop()
+        if id(node) in numbers:
+            continue
+
+        match node:
+            case ASTVar():
+                key = (ASTVar, node.name)
+            case ASTNumber():
+                key = (ASTNumber, type(node.number), str(node.number))
+            case ASTArg():
+                key = (ASTArg, node.value)
+            case ASTBinaryOp():
+                if not ready:
+                    stack.extend([ (node, True), (node.right_arg, False), (node.left_arg, False) ])
+                    continue
+                key = (ASTBinaryOp, node.type, numbers[id(node.left_arg)], numbers[id(node.right_arg)])
+            case ASTUnaryCommand():
+                if not ready:
+                    stack.extend([ (node, True), (node.arg, False) ])
+                    continue
+                key = (ASTUnaryCommand, node.type, numbers[id(node.arg)])
+            case _:
+                if not ready:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(node.children))
+                    continue
+                key = (type(node), *(numbers[id(child)] for child in node.children))
+
+        numbers[id(node)] = ids.setdefault(key, len(ids))
+
+    return numbers
+
+def common_subexpressions(root: ASTNode) -> Set[int]:
+    ''' Structure numbers (see `_structure`) of operator subtrees that are
+    evaluated more than once.
+    '''
+    numbers = _structure(root)
+    seen = set()
+    repeated = set()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ASTVar, ASTNumber, ASTArg)):
+            continue
+
+        number = numbers[id(node)]
+        if number in seen:
+            # Its operands are counted once, under the first occurrence
+            repeated.add(number)
+            continue
+        seen.add(number)
+
+        match node:
+            case ASTBinaryOp():
+                stack.append(node.right_arg)
+                stack.append(node.left_arg)
+            case ASTUnaryCommand():
+                stack.append(node.arg)
+            case _:
+                stack.extend(reversed(node.children))
+
+    return repeated
+
+# CPython rejects source nested more than 200 brackets deep, and its parser
+# and compiler recurse on whatever nesting remains. Operators more than this
+# many deep are computed into temporaries beforehand, so that a long sum
+# compiles like a short one.
+MAX_DEPTH = 32
+
+def _python_pieces(node: ASTNode) -> visitor.Pieces:
+    return node._python_pieces()
+
+def _deep_subtrees(roots: Sequence[ASTNode], key: Callable[[ASTNode], Hashable]) -> List[ASTNode]:
+    ''' Operator subtrees to compute first, operands before the nodes above
+    them, so that what remains of each tree and of each of them is at most
+    `MAX_DEPTH` operators deep.
+    '''
+    # Height above the leaves, with the subtrees already chosen as leaves
+    heights: Dict[Hashable, int] = {}
+    deep = []
+    stack = [ (root, False) for root in reversed(roots) ]
+    while stack:
+        node, ready = stack.pop()
+        if not ready:
+            if key(node) in heights:
+                continue
+            operands = node._operands()
+            if operands:
+                stack.append((node, True))
+                stack.extend((operand, False) for operand in reversed(operands))
+            else:
+                heights[key(node)] = 0
+            continue
+
+        height = 1 + max(heights[key(operand)] for operand in node._operands())
+        if height >= MAX_DEPTH:
+            deep.append(node)
+            height = 0
+        heights[key(node)] = height
+
+    return deep
+
+def _write(items: visitor.Pieces, pieces: Callable[[ASTNode], visitor.Pieces], key: Callable[[ASTNode], Hashable], names: Dict[Hashable, str], repeated: Set[int]) -> str:
+    ''' `items` rendered as `visitor.render` does, reading subtrees in
+    `names` from their temporaries, and assigning those in `repeated` at
+    their first occurrence.
+    '''
+    out = []
+    stack = list(reversed(_as_tuple(items)))
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            out.append(item)
+            continue
+
+        number = key(item)
+        if number in names:
+            out.append(names[number])
+            continue
+        if number in repeated:
+            name = names[number] = f'_cse{len(names)}'
+            out.append(f'({name} := ')
+            stack.append(')')
+        stack.extend(reversed(_as_tuple(pieces(item))))
+
+    return ''.join(out)
+
+def _as_tuple(pieces: visitor.Pieces) -> tuple:
+    return (pieces,) if type(pieces) is str else pieces
+
+def _steps(roots: Sequence[ASTNode], pieces: Optional[Callable[[ASTNode], visitor.Pieces]], common: bool) -> Tuple[List[str], List[str]]:
+    ''' Source for the value of each root, written with `pieces` (`.python`
+    by default), and the assignment expressions to evaluate before them, in
+    order, for the temporaries they read.
+    '''
+    if common:
+        # Numbered as one tree, so that subtrees repeated across roots count too
+        container = ASTExpression(children=list(roots))
+        numbers = _structure(container)
+        key = lambda node: numbers[id(node)]
+        repeated = common_subexpressions(container)
+    else:
+        key = id
+        repeated = set()
+
+    deep = _deep_subtrees(roots, key)
+    if not deep and not repeated:
+        if pieces is None:
+            return [], [ root.python for root in roots ]
+        return [], [ visitor.render(root, pieces) for root in roots ]
+
+    # Evaluation order is the order written, deep subtrees first and then
+    # left to right, so the first occurrence written is the first evaluated
+    # and can assign the temporary
+    pieces = pieces or _python_pieces
+    names: Dict[Hashable, str] = {}
+    steps = []
+    for i, node in enumerate(deep):
+        source = _write(pieces(node), pieces, key, names, repeated)
+        names[key(node)] = name = f'_t{i}'
+        steps.append(f'({name} := {source})')
+
+    return steps, [ _write((root,), pieces, key, names, repeated) for root in roots ]
+
+def join_steps(steps: Sequence[str]) -> str:
+    ''' One expression evaluating each of `steps` in turn, with the value of the last. '''
+    if len(steps) == 1:
+        return steps[0]
+    return f'({", ".join(steps)})[-1]'
+
+def steps(node: ASTNode, common: bool = False, pieces: Optional[Callable[[ASTNode], visitor.Pieces]] = None) -> List[str]:
+    ''' Expressions to evaluate in turn for the value of `node`, the last
+    giving it, and the others computing temporaries that it reads: subtrees
+    nested too deep to write in place, as `MAX_DEPTH` describes. Written with
+    `pieces` (see `visitor.render`), `.python` by default.
+    '''
+    before, (value,) = _steps([ node ], pieces, common)
+    return [ *before, value ]
+
+def lambda_source(node: ASTNode, common: bool = False) -> str:
+    args = ','.join(free_vars(node))
+    if not args == '':
+        args = ' ' + args
+    return f'lambda{args}: {join_steps(steps(node, common))}'
+
+def tuple_source(nodes: Sequence[ASTNode], common: bool = False) -> str:
+    ''' A `lambda` returning a tuple of the value of each node. It takes the
+    free variables of all of them, in order of first appearance. With
+    `common=True`, temporaries are shared between the nodes.
+    '''
+    args = ','.join(dict.fromkeys(name for node in nodes for name in free_variables(node)))
+    if not args == '':
+        args = ' ' + args
+    before, values = _steps(nodes, None, common)
+    return f'lambda{args}: {join_steps([ *before, "(" + "".join(value + ", " for value in values) + ")" ])}'
+
+@functools.lru_cache(maxsize=4096)
+def compile_source(source: str) -> Callable:
+    code = compile(source, '<tex>', 'eval')
+    return eval(code, _GLOBALS)
+
+def compile_ast(node: ASTNode, passes: Optional[optimize.Passes] = None) -> Callable:
+    ''' `node` as a function; `passes` selects optimizations (default none). '''
+    return _instrumented(_compile_ast, node, passes)
+
+def compile_many(nodes: Sequence[ASTNode], passes: Optional[optimize.Passes] = None) -> Callable:
+    ''' One function returning the value of each of `nodes`, as a tuple; see `tuple_source`. '''
+    return _instrumented(_compile_many, nodes, passes)
+
+def _instrumented(compile_: Callable, nodes, passes: Optional[optimize.Passes]) -> Callable:
+    report = instrument.active
+    if report is not None:
+        misses = compile_source.cache_info().misses
+        with report.stage('compile'):
+            f = compile_(nodes, passes)
+        report.count('compiles')
+        report.count('compile_misses', compile_source.cache_info().misses - misses)
+        return f
+
+    return compile_(nodes, passes)
+
+def _compile_ast(node: ASTNode, passes: Optional[optimize.Passes]) -> Callable:
+    # Frozen (interned) nodes keep their functions. Mutable ones may have been
+    # edited since, so they go through `compile_source`'s cache of the source.
+    if not node._frozen:
+        return _compile_node(node, passes)
+
+    # Interned nodes are built without `__init__`, so they may lack the slot
+    functions = getattr(node, '_functions', None)
+    if functions is None:
+        functions = {}
+        # Through `object` as interned nodes are frozen
+        object.__setattr__(node, '_functions', functions)
+    elif passes in functions:
+        return functions[passes]
+
+    f = functions[passes] = _compile_node(node, passes)
+    return f
+
+def _compile_node(node: ASTNode, passes: Optional[optimize.Passes]) -> Callable:
+    if passes is None:
+        return compile_source(lambda_source(node))
+    return compile_source(lambda_source(optimize.optimize(node, passes), common=passes.eliminate_common))
+
+def _compile_many(nodes: Sequence[ASTNode], passes: Optional[optimize.Passes]) -> Callable:
+    if passes is None:
+        return compile_source(tuple_source(nodes))
+
+    nodes = [ optimize.optimize(node, passes) for node in nodes ]
+    return compile_source(tuple_source(nodes, common=passes.eliminate_common))
@@ -0,0 +1,145 @@
+''' Symbolic differentiation of trees.
+
+`derivative(root, variable)` is the tree of the derivative of `root` with
+respect to `variable`, simplified with the passes in `tex_ast.optimize`:
+
+    derivative(pratt.parse_program('3x^{2}+\\sqrt{x}'), 'x').python
+    # '((3.0*(2.0*x))+(1.0/(2.0*math.sqrt(x))))'
+
+The derivative shares subtrees with `root` (`\\sqrt{x}` above), so compiling
+the two together with common-subexpression elimination computes those once.
+`compile_gradient` does that: its function returns the value and every
+partial derivative from one call:
+
+    f = compile_gradient(pratt.parse_program('x^{2}y'))
+    f(3.0, 2.0)     # (18.0, 12.0, 9.0)
+
+`newton` finds roots from such a function.
+
+The tree has no logarithm, so a power with the variable in its exponent
+(`2^{x}`, `x^{x}`) cannot be differentiated.
+'''
+import math
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from tex_ast import codegen, optimize, visitor
+from tex_ast.ast import *
+
+# Derivatives are None where they are zero, so that whole terms drop out
+
+def _binary(type: ASTBinaryOp.Type, a: ASTNode, b: ASTNode) -> ASTBinaryOp:
+    return ASTBinaryOp(children=[], type=type, left_arg=a, right_arg=b)
+
+def _add(a: Optional[ASTNode], b: Optional[ASTNode]) -> Optional[ASTNode]:
+    if a is None or b is None:
+        return b if a is None else a
+    return _binary(ASTBinaryOp.Type.ADD, a, b)
+
+def _mul(a: Optional[ASTNode], b: Optional[ASTNode]) -> Optional[ASTNode]:
+    if a is None or b is None:
+        return None
+    return _binary(ASTBinaryOp.Type.MULTIPLY, a, b)
+
+def _neg(a: Optional[ASTNode]) -> Optional[ASTNode]:
+    if a is None:
+        return None
+    return ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.NEGATIVE, arg=a)
+
+def _div(a: Optional[ASTNode], b: ASTNode) -> Optional[ASTNode]:
+    if a is None:
+        return None
+    return _binary(ASTBinaryOp.Type.DIVIDE, a, b)
+
+def _pow(a: ASTNode, n: ASTNode) -> ASTNode:
+    return _binary(ASTBinaryOp.Type.POW, a, n)
+
+class _Derivative(visitor.Visitor):
+    def __init__(self, variable: str):
+        self.variable = variable
+
+    def visit_ASTVar(self, node: ASTVar) -> Optional[ASTNode]:
+        return optimize.make_constant(1.0) if node.name == self.variable else None
+
+    def visit_ASTNumber(self, node: ASTNumber) -> None:
+        return None
+
+    def visit_ASTArg(self, node: ASTArg) -> None:
+        return None
+
+    def visit_ASTExpression(self, node: ASTExpression, *values: Optional[ASTNode]) -> Optional[ASTNode]:
+        return values[0]
+
+    def visit_ASTUnaryCommand(self, node: ASTUnaryCommand, da: Optional[ASTNode]) -> Optional[ASTNode]:
+        if node.type == ASTUnaryCommand.Type.NEGATIVE:
+            return _neg(da)
+        # (√a)' = a' / (2√a)
+        return _div(da, _mul(optimize.make_constant(2.0), node))
+
+    def visit_ASTBinaryOp(self, node: ASTBinaryOp, da: Optional[ASTNode], db: Optional[ASTNode]) -> Optional[ASTNode]:
+        a, b = node.left_arg, node.right_arg
+        match node.type:
+            case ASTBinaryOp.Type.ADD:
+                return _add(da, db)
+            case ASTBinaryOp.Type.MULTIPLY:
+                return _add(_mul(da, b), _mul(a, db))
+            case ASTBinaryOp.Type.DIVIDE:
+                # (a/b)' = (a'b - ab') / b²
+                if db is None:
+                    return _div(da, b)
+                return _div(_add(_mul(da, b), _neg(_mul(a, db))), _pow(b, optimize.make_constant(2.0)))
+            case ASTBinaryOp.Type.POW:
+                if db is not None:
+                    raise ValueError(f'Cannot differentiate a power with {self.variable} in its exponent')
+                if da is None:
+                    return None
+                # (aⁿ)' = n aⁿ⁻¹ a'
+                n = optimize.constant(b)
+                lower = optimize.make_constant(n - 1) if n is not None else _add(b, optimize.make_constant(-1.0))
+                return _mul(_mul(b, _pow(a, lower)), da)
+
+def derivative(root: ASTNode, variable: str, passes: Optional[optimize.Passes] = optimize.ALL) -> ASTNode:
+    ''' The derivative of `root` with respect to `variable`, rewritten with
+    `passes` (None leaves it as built). Raises ValueError for a power with
+    `variable` in its exponent, and TypeError for nodes that have no value.
+    '''
+    result = _Derivative(variable).visit(root)
+    if result is None:
+        return optimize.make_constant(0.0)
+    return result if passes is None else optimize.optimize(result, passes)
+
+def gradient(root: ASTNode, variables: Optional[Sequence[str]] = None, passes: Optional[optimize.Passes] = optimize.ALL) -> List[ASTNode]:
+    ''' The derivative of `root` with respect to each of `variables`, by
+    default its free variables.
+    '''
+    if variables is None:
+        variables = free_variables(root)
+    return [ derivative(root, variable, passes) for variable in variables ]
+
+def compile_gradient(root: ASTNode, variables: Optional[Sequence[str]] = None, passes: Optional[optimize.Passes] = optimize.ALL) -> Callable[..., Tuple[float, ...]]:
+    ''' A function of the free variables of `root`, in `free_variables`
+    order, returning `(value, *gradient)`, with the gradient as `gradient`
+    gives it.
+    '''
+    # Derivatives are made of the root's subtrees and constants, so taking
+    # the root's variables, the function takes no others
+    return codegen.compile_many([ root, *gradient(root, variables, passes) ], passes)
+
+def newton(f: Callable[[float], Tuple[float, float]], x: float, tolerance: float = 1e-12, max_iterations: int = 50) -> Optional[float]:
+    ''' A root of the function whose value and derivative at `x` are
+    `f(x)`, by Newton's method from `x`. None if it does not converge within
+    `max_iterations` steps, or reaches a point where it is undefined or flat.
+    '''
+    for _ in range(max_iterations):
+        try:
+            value, slope = f(x)
+            step = value / slope
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+        if not math.isfinite(step):
+            return None
+
+        x -= step
+        if abs(step) <= tolerance * max(1.0, abs(x)):
+            return x
+
+    return None
@@ -0,0 +1,186 @@
+''' Immutable, hash-consed AST nodes.
+
+An `Interner` builds nodes through a table keyed on their structure, so each
+distinct subtree exists once: every `x`, every constant `2` and every
+repeated `\\sqrt{x}` in the trees it builds is the same object. The nodes
+are frozen subclasses of the classes in `tex_ast.ast`, so `.python`, `.dict`,
+serialization, codegen and `isinstance`/`match` checks all work unchanged.
+They have no `children` list (it is an empty tuple, or the children of an
+`ASTExpression`), and they hash and compare structurally in O(1): nodes from
+the same interner are equal exactly when they are identical.
+
+    interner = Interner()
+    a = interner.intern(parse.parse_program('x+x'))
+    assert a.left_arg is a.right_arg
+
+Shared nodes must not be mutated, which is why they are frozen. Anything
+holding the interner keeps every node it has built alive; use one interner
+per corpus and drop it (or `clear` it) when done.
+'''
+from dataclasses import FrozenInstanceError
+from typing import Dict, Hashable, Sequence, Tuple
+
+from tex_ast import visitor
+from tex_ast.ast import *
+
+class Interned:
+    ''' Mixin for frozen nodes built by an `Interner`. '''
+    __slots__ = ()
+
+    # The `tex_ast.ast` class, and the names of the fields that make up the
+    # node's structure
+    _BASE: type = ASTNode
+    _FIELDS: Tuple[str, ...] = ()
+    _frozen = True
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f'cannot assign to field {name!r}')
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f'cannot delete field {name!r}')
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, self._BASE):
+            return NotImplemented
+        if isinstance(other, Interned) and self._hash != other._hash:
+            return False
+        # `children` is a tuple here and a list on mutable nodes
+        return all(tuple(getattr(self, name)) == tuple(getattr(other, name)) if name == 'children'
+            else getattr(self, name) == getattr(other, name) for name in self._FIELDS)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # Unpickles as a mutable tree; interning is per process
+        return (thaw, (thaw(self),))
+
+class InternedVar(Interned, ASTVar):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTVar
+    _FIELDS = ('name',)
+
+class InternedNumber(Interned, ASTNumber):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTNumber
+    _FIELDS = ('number',)
+
+class InternedArg(Interned, ASTArg):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTArg
+    _FIELDS = ('value',)
+
+class InternedBinaryOp(Interned, ASTBinaryOp):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTBinaryOp
+    _FIELDS = ('type', 'left_arg', 'right_arg')
+
+class InternedUnaryCommand(Interned, ASTUnaryCommand):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTUnaryCommand
+    _FIELDS = ('type', 'arg')
+
+class InternedExpression(Interned, ASTExpression):
+    __slots__ = ('_hash', '_variables', '_functions')
+    _BASE = ASTExpression
+    _FIELDS = ('children',)
+
+_NO_CHILDREN = ()
+
+class Interner:
+    ''' Table of interned nodes. Operands passed to the constructors must
+    themselves come from this interner.
+    '''
+
+    def __init__(self):
+        # Each node is its own key: operands hash in O(1) from their cached
+        # `_hash` and compare by identity when the node is already present
+        self._table: Dict[Interned, Interned] = {}
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def clear(self):
+        self._table.clear()
+
+    def _make(self, cls: type, key: Tuple, **fields) -> Interned:
+        node = object.__new__(cls)
+        object.__setattr__(node, 'children', fields.pop('children', _NO_CHILDREN))
+        for name, value in fields.items():
+            object.__setattr__(node, name, value)
+        object.__setattr__(node, '_hash', hash((cls, *key)))
+        return self._table.setdefault(node, node)
+
+    def var(self, name: str) -> InternedVar:
+        return self._make(InternedVar, (name,), name=name)
+
+    def number(self, number) -> InternedNumber:
+        # Keyed on the text so `2` and `2.0` (which print differently) stay apart
+        return self._make(InternedNumber, (type(number), str(number)), number=number)
+
+    def arg(self, value: str) -> InternedArg:
+        return self._make(InternedArg, (value,), value=value)
+
+    def binary_op(self, type: ASTBinaryOp.Type, left_arg: Interned, right_arg: Interned) -> InternedBinaryOp:
+        return self._make(InternedBinaryOp, (type, left_arg, right_arg),
+            type=type, left_arg=left_arg, right_arg=right_arg)
+
+    def unary_command(self, type: ASTUnaryCommand.Type, arg: Interned) -> InternedUnaryCommand:
+        return self._make(InternedUnaryCommand, (type, arg), type=type, arg=arg)
+
+    def expression(self, children: Sequence[Interned]) -> InternedExpression:
+        children = tuple(children)
+        return self._make(InternedExpression, children, children=children)
+
+    def intern(self, root: ASTNode) -> Interned:
+        ''' The interned copy of the tree `root`. Iterative, so depth is not
+        limited by the recursion limit.
+        '''
+        built = {}
+        stack = [ (root, False) ]
+        while stack:
+            node, ready = stack.pop()
+            if id(node) in built:
+                continue
+
+            match node:
+                case ASTVar():
+                    result = self.var(node.name)
+                case ASTNumber():
+                    result = self.number(node.number)
+                case ASTArg():
+                    result = self.arg(node.value)
+                case ASTBinaryOp():
+                    if not ready:
+                        stack.extend([ (node, True), (node.right_arg, False), (node.left_arg, False) ])
+                        continue
+                    result = self.binary_op(node.type, built[id(node.left_arg)], built[id(node.right_arg)])
+                case ASTUnaryCommand():
+                    if not ready:
+                        stack.extend([ (node, True), (node.arg, False) ])
+                        continue
+                    result = self.unary_command(node.type, built[id(node.arg)])
+                case ASTExpression():
+                    if not ready:
+                        stack.append((node, True))
+                        stack.extend((child, False) for child in reversed(node.children))
+                        continue
+                    result = self.expression([ built[id(child)] for child in node.children ])
+                case _:
+                    raise TypeError(f'Cannot intern {type(node).__name__}')
+
+            built[id(node)] = result
+
+        return built[id(root)]
+
+def thaw(root: ASTNode) -> ASTNode:
+    ''' A mutable copy of `root`, with shared subtrees copied apart. '''
+    return visitor.copy(root)
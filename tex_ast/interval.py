@@ -0,0 +1,253 @@
+''' Interval arithmetic over trees.
+
+`compile_bounds(tree)` compiles a tree, as `codegen` does, to a function of
+its free variables, in `free_variables` order. The function takes and
+returns pairs `(value, derivative)` of intervals `(lo, hi)`. Given the range
+each variable takes, and the derivative of each with respect to some
+parameter, it bounds the tree's value and its derivative over every
+combination:
+
+    f = compile_bounds(pratt.parse_program('x^{2}-x'))
+    f(((0.0, 1.0), (1.0, 1.0)))    # ((-1.0, 1.0), (-1.0, 1.0))
+
+Seed the variable of interest with derivative `(1.0, 1.0)` and the others
+with `(0.0, 0.0)`. `bounds(tree, variable, **ranges)` does that for one
+call.
+
+The bounds are conservative. Each operator bounds its result from its
+operands' bounds alone, so a variable used twice can widen them (`x-x`
+gives `(-1, 1)` over `x` in `(0, 1)`). Rounding is not directed, so they
+can be off by rounding error, which is far below anything plotted. The
+result is None when the tree is defined nowhere over the ranges (`\\sqrt{x}`
+with `x` in `(-2, -1)`). Bounds are infinite where it has a pole, and
+include every value where it is only partly defined.
+'''
+import functools
+import math
+from typing import Callable, Optional, Tuple, Union
+
+from tex_ast import codegen, visitor
+from tex_ast.ast import *
+
+Interval = Tuple[float, float]
+# Value and derivative
+Dual = Tuple[Interval, Interval]
+
+INF = math.inf
+WHOLE: Interval = (-INF, INF)
+ZERO: Interval = (0.0, 0.0)
+
+def _times(x: float, y: float) -> float:
+    # Zero times an unbounded end is zero, not NaN
+    return 0.0 if x == 0 or y == 0 else x * y
+
+def _power(x: float, n: float) -> float:
+    try:
+        return x ** n
+    except OverflowError:
+        return -INF if x < 0 and n % 2 == 1 else INF
+    except ZeroDivisionError:
+        return INF
+
+def _exp(x: float) -> float:
+    try:
+        return math.exp(x)
+    except OverflowError:
+        return INF
+
+def _log(x: float) -> float:
+    return math.log(x) if x > 0 else -INF
+
+def add(a: Interval, b: Interval) -> Interval:
+    lo = a[0] + b[0]
+    hi = a[1] + b[1]
+    # `inf + -inf`
+    return (lo if lo == lo else -INF, hi if hi == hi else INF)
+
+def neg(a: Interval) -> Interval:
+    return (-a[1], -a[0])
+
+def mul(a: Interval, b: Interval) -> Interval:
+    products = (_times(a[0], b[0]), _times(a[0], b[1]), _times(a[1], b[0]), _times(a[1], b[1]))
+    return (min(products), max(products))
+
+def reciprocal(a: Interval) -> Optional[Interval]:
+    if a[0] > 0 or a[1] < 0:
+        return (1 / a[1], 1 / a[0])
+    if a[0] == a[1] == 0:
+        return None
+    if a[0] == 0:
+        return (1 / a[1], INF)
+    if a[1] == 0:
+        return (-INF, 1 / a[0])
+    return WHOLE
+
+def div(a: Interval, b: Interval) -> Optional[Interval]:
+    inverse = reciprocal(b)
+    return None if inverse is None else mul(a, inverse)
+
+def sqrt(a: Interval) -> Optional[Interval]:
+    if a[1] < 0:
+        return None
+    return (math.sqrt(max(a[0], 0.0)), math.sqrt(a[1]))
+
+def log(a: Interval) -> Optional[Interval]:
+    if a[1] <= 0:
+        return None
+    return (_log(a[0]), _log(a[1]))
+
+def exp(a: Interval) -> Interval:
+    return (_exp(a[0]), _exp(a[1]))
+
+def pow(a: Interval, b: Interval) -> Optional[Interval]:
+    if b[0] == b[1]:
+        n = b[0]
+        if n == 0:
+            return (1.0, 1.0)
+        if float(n).is_integer():
+            if n < 0:
+                positive = pow(a, (-n, -n))
+                return reciprocal(positive)
+
+            lo = _power(a[0], n)
+            hi = _power(a[1], n)
+            if n % 2 == 1 or a[0] >= 0:
+                return (lo, hi)
+            if a[1] <= 0:
+                return (hi, lo)
+            return (0.0, max(lo, hi))
+
+        # Fractional powers of negative numbers are complex
+        if a[1] < 0:
+            return None
+        lo = max(a[0], 0.0)
+        if n > 0:
+            return (_power(lo, n), _power(a[1], n))
+        return (_power(a[1], n), _power(lo, n))
+
+    # `a ** b` is `exp(b log a)` for positive `a`
+    if a[0] > 0:
+        return exp(mul(b, log(a)))
+    return WHOLE
+
+# Pairs of value and derivative bounds; None propagates
+
+def _d_add(a: Optional[Dual], b: Optional[Dual]) -> Optional[Dual]:
+    if a is None or b is None:
+        return None
+    return (add(a[0], b[0]), add(a[1], b[1]))
+
+def _d_neg(a: Optional[Dual]) -> Optional[Dual]:
+    if a is None:
+        return None
+    return (neg(a[0]), neg(a[1]))
+
+def _d_mul(a: Optional[Dual], b: Optional[Dual]) -> Optional[Dual]:
+    if a is None or b is None:
+        return None
+    return (mul(a[0], b[0]), add(mul(a[1], b[0]), mul(a[0], b[1])))
+
+def _d_div(a: Optional[Dual], b: Optional[Dual]) -> Optional[Dual]:
+    if a is None or b is None:
+        return None
+    value = div(a[0], b[0])
+    if value is None:
+        return None
+    # (a/b)' = (a' - (a/b) b') / b
+    derivative = div(add(a[1], neg(mul(value, b[1]))), b[0])
+    return (value, WHOLE if derivative is None else derivative)
+
+def _d_sqrt(a: Optional[Dual]) -> Optional[Dual]:
+    if a is None:
+        return None
+    value = sqrt(a[0])
+    if value is None:
+        return None
+    derivative = div(a[1], mul((2.0, 2.0), value))
+    return (value, WHOLE if derivative is None else derivative)
+
+def _d_pow(a: Optional[Dual], b: Optional[Dual]) -> Optional[Dual]:
+    if a is None or b is None:
+        return None
+    value = pow(a[0], b[0])
+    if value is None:
+        return None
+    if a[1] == ZERO and b[1] == ZERO:
+        return (value, ZERO)
+
+    if b[0][0] == b[0][1] and b[1] == ZERO:
+        # (a^n)' = n a^(n-1) a'
+        n = b[0][0]
+        lower = pow(a[0], (n - 1, n - 1))
+        derivative = None if lower is None else mul(mul((n, n), lower), a[1])
+    elif a[0][0] > 0:
+        # (a^b)' = a^b (b' log a + b a' / a)
+        derivative = mul(value, add(mul(b[1], log(a[0])), mul(b[0], div(a[1], a[0]))))
+    else:
+        derivative = None
+    return (value, WHOLE if derivative is None else derivative)
+
+_GLOBALS = {
+    'inf': INF,
+    '_add': _d_add,
+    '_neg': _d_neg,
+    '_mul': _d_mul,
+    '_div': _d_div,
+    '_sqrt': _d_sqrt,
+    '_pow': _d_pow,
+}
+
+_BINARY = {
+    ASTBinaryOp.Type.ADD: '_add(',
+    ASTBinaryOp.Type.MULTIPLY: '_mul(',
+    ASTBinaryOp.Type.DIVIDE: '_div(',
+    ASTBinaryOp.Type.POW: '_pow(',
+}
+
+_UNARY = {
+    ASTUnaryCommand.Type.SQRT: '_sqrt(',
+    ASTUnaryCommand.Type.NEGATIVE: '_neg(',
+}
+
+def _constant(value: float) -> str:
+    return f'(({value!r}, {value!r}), (0.0, 0.0))'
+
+def _pieces(node: ASTNode) -> visitor.Pieces:
+    match node:
+        case ASTBinaryOp():
+            return (_BINARY[node.type], node.left_arg, ', ', node.right_arg, ')')
+        case ASTUnaryCommand():
+            return (_UNARY[node.type], node.arg, ')')
+        case ASTExpression():
+            return (node.children[0],)
+        case ASTVar():
+            return node.name
+        case ASTNumber():
+            return _constant(float(node.number))
+        case ASTArg():
+            return _constant(float(node.value))
+
+    raise TypeError(f'Cannot bound {type(node).__name__}')
+
+def bounds_source(tree: ASTNode) -> str:
+    args = ', '.join(free_variables(tree))
+    return f'lambda {args}: {codegen.join_steps(codegen.steps(tree, pieces=_pieces))}'
+
+@functools.lru_cache(maxsize=1024)
+def _compile_source(source: str) -> Callable[..., Optional[Dual]]:
+    return eval(compile(source, '<tex bounds>', 'eval'), _GLOBALS)
+
+def compile_bounds(tree: ASTNode) -> Callable[..., Optional[Dual]]:
+    return _compile_source(bounds_source(tree))
+
+def bounds(tree: ASTNode, variable: Optional[str] = None, **ranges: Union[float, Interval]) -> Optional[Dual]:
+    ''' Bounds of the tree's value, and of its derivative with respect to
+    `variable`, with each variable in its range (an interval, or a number).
+    '''
+    args = []
+    for name in free_variables(tree):
+        value = ranges[name]
+        if not isinstance(value, tuple):
+            value = (float(value), float(value))
+        args.append((value, (1.0, 1.0) if name == variable else ZERO))
+    return compile_bounds(tree)(*args)
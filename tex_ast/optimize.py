@@ -0,0 +1,174 @@
+''' Optimization passes run between parsing and code generation.
+
+`optimize` rewrites a tree bottom-up in one iterative pass:
+
+- constant folding evaluates operators whose operands are all constants
+  (`5.0+3.0` becomes `8.0`). Operations that would raise or overflow at run
+  time (`\\frac{1}{0}`, `\\sqrt{-1}`) are left in place, so they still do.
+- identity simplification drops `x+0`, `0+x`, `x\\cdot 1`, `1\\cdot x`,
+  `\\frac{x}{1}`, `x^{1}`, `-(-x)` and single-child `ASTExpression`
+  wrappers (code generation parenthesizes every operator anyway).
+
+Common-subexpression elimination happens in `codegen.lambda_source`, which
+computes each repeated subtree once into a temporary. `Passes` switches each
+of the three on or off; `codegen.compile_ast(node, passes)` runs them all.
+
+The input tree is not modified; unchanged subtrees are shared with it.
+Negative constants are built as `-(c)` so they print parenthesized.
+'''
+import math
+from dataclasses import dataclass
+from numbers import Real
+from typing import Optional
+
+from tex_ast.ast import *
+
+@dataclass(frozen=True)
+class Passes:
+    fold_constants: bool = True
+    simplify: bool = True
+    eliminate_common: bool = True
+
+ALL = Passes()
+NONE = Passes(fold_constants=False, simplify=False, eliminate_common=False)
+
+def constant(node: ASTNode) -> Optional[float]:
+    ''' The value of `node` if it is a number literal, possibly negated. '''
+    negate = False
+    while isinstance(node, ASTUnaryCommand) and node.type == ASTUnaryCommand.Type.NEGATIVE:
+        negate = not negate
+        node = node.arg
+
+    match node:
+        case ASTNumber(number=number) if isinstance(number, Real) and not isinstance(number, bool):
+            value = number
+        case ASTArg():
+            try:
+                value = float(node.value)
+            except ValueError:
+                return None
+        case _:
+            return None
+
+    return -value if negate else value
+
+def make_constant(value: float) -> ASTNode:
+    if math.copysign(1, value) < 0:
+        return ASTUnaryCommand(children=[], type=ASTUnaryCommand.Type.NEGATIVE,
+            arg=ASTNumber(children=[], number=-value))
+    return ASTNumber(children=[], number=value)
+
+def _fold_binary(type: ASTBinaryOp.Type, a: float, b: float) -> Optional[float]:
+    try:
+        match type:
+            case ASTBinaryOp.Type.ADD:
+                value = a + b
+            case ASTBinaryOp.Type.MULTIPLY:
+                value = a * b
+            case ASTBinaryOp.Type.DIVIDE:
+                value = a / b
+            case ASTBinaryOp.Type.POW:
+                # Exact integer powers can be arbitrarily large; leave those to run time
+                if isinstance(a, int) and isinstance(b, int) and abs(b) > 64:
+                    return None
+                value = a ** b
+    except (ZeroDivisionError, OverflowError):
+        return None
+
+    # A negative base to a fractional power is complex
+    if not isinstance(value, Real) or not math.isfinite(value):
+        return None
+    return value
+
+def _fold(node: ASTNode) -> ASTNode:
+    match node:
+        case ASTBinaryOp():
+            a = constant(node.left_arg)
+            b = constant(node.right_arg)
+            if a is not None and b is not None:
+                value = _fold_binary(node.type, a, b)
+                if value is not None:
+                    return make_constant(value)
+        case ASTUnaryCommand(type=ASTUnaryCommand.Type.SQRT):
+            a = constant(node.arg)
+            if a is not None and a >= 0:
+                return make_constant(math.sqrt(a))
+        case ASTExpression(children=[ child ]) if constant(child) is not None:
+            return child
+
+    return node
+
+# Constant right (or either, for commutative ops) operand that leaves the other unchanged
+_IDENTITIES = {
+    ASTBinaryOp.Type.ADD: (0, True),
+    ASTBinaryOp.Type.MULTIPLY: (1, True),
+    ASTBinaryOp.Type.DIVIDE: (1, False),
+    ASTBinaryOp.Type.POW: (1, False),
+}
+
+def _simplify(node: ASTNode) -> ASTNode:
+    match node:
+        case ASTBinaryOp():
+            identity, commutative = _IDENTITIES[node.type]
+            if constant(node.right_arg) == identity:
+                return node.left_arg
+            if commutative and constant(node.left_arg) == identity:
+                return node.right_arg
+        case ASTUnaryCommand(type=ASTUnaryCommand.Type.NEGATIVE, arg=ASTUnaryCommand(type=ASTUnaryCommand.Type.NEGATIVE)):
+            return node.arg.arg
+        case ASTExpression(children=[ child ]):
+            return child
+
+    return node
+
+def optimize(root: ASTNode, passes: Passes = ALL) -> ASTNode:
+    ''' `root` with the enabled tree rewrites applied. '''
+    if not passes.fold_constants and not passes.simplify:
+        return root
+
+    # Post-order with a value stack; each node is rewritten after its operands
+    values = []
+    stack = [ (root, False) ]
+    while stack:
+        node, ready = stack.pop()
+        match node:
+            case ASTBinaryOp():
+                if not ready:
+                    stack.extend([ (node, True), (node.right_arg, False), (node.left_arg, False) ])
+                    continue
+                right = values.pop()
+                left = values.pop()
+                if left is not node.left_arg or right is not node.right_arg:
+                    node = ASTBinaryOp(children=[], type=node.type, left_arg=left, right_arg=right)
+            case ASTUnaryCommand():
+                if not ready:
+                    stack.extend([ (node, True), (node.arg, False) ])
+                    continue
+                arg = values.pop()
+                if arg is not node.arg:
+                    node = ASTUnaryCommand(children=[], type=node.type, arg=arg)
+            case ASTExpression():
+                if not ready:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in reversed(node.children))
+                    continue
+                children = values[len(values) - len(node.children):]
+                del values[len(values) - len(node.children):]
+                if any(new is not old for new, old in zip(children, node.children)):
+                    node = ASTExpression(children=children)
+
+        # Simplifying can expose a constant (`(2\cdot 1)+3`) and folding an
+        # identity (`x\cdot (3-2)`), so apply both until neither changes anything
+        while True:
+            rewritten = node
+            if passes.fold_constants:
+                rewritten = _fold(rewritten)
+            if passes.simplify:
+                rewritten = _simplify(rewritten)
+            if rewritten is node:
+                break
+            node = rewritten
+
+        values.append(node)
+
+    return values[0]
@@ -0,0 +1,223 @@
+''' Adaptive sampling of `y = f(x)` for plotting.
+
+`sample(tree, view)` picks the `x` to evaluate the tree at so that the
+polyline through the samples stays within `tolerance` pixels of the curve
+everywhere in the view:
+
+    view = View(-5.0, 5.0, -5.0, 5.0)
+    samples = sample(pratt.parse_program('\\frac{1}{x}'), view)
+    samples.points     # [(x, y), ...], a NaN `y` breaking the line
+
+It starts from a coarse uniform grid and halves each segment until it can
+accept it, using `tex_ast.interval` to bound the function and its slope over
+the segment. The curve's distance from the chord is bounded by how far the
+slope strays from the chord's, so a segment is accepted as soon as that
+bound is within tolerance. Accepting it needs no further evaluations:
+
+- flat and straight stretches take few samples, and curved ones more;
+- a segment the function leaves the view over is skipped, as is one it is
+  undefined all over;
+- spikes between samples cannot be missed, since they show in the bounds;
+- domain edges (where `\\sqrt{}` stops) and poles (`\\frac{1}{x}` at 0) are
+  narrowed down to `min_width` pixels, and the line is broken across poles.
+
+`sample_uniform` is the usual uniform grid, and `pixel_error` measures a
+sampling against the function, for comparing the two (see `bench.plot`).
+'''
+import math
+from dataclasses import dataclass, field
+from typing import Callable, List, Mapping, Optional, Tuple
+
+from tex_ast import codegen, interval
+from tex_ast.ast import *
+
+NAN = math.nan
+Point = Tuple[float, float]
+
+@dataclass(frozen=True)
+class View:
+    ''' The plotted rectangle and its size on screen, in pixels. '''
+    x_min: float
+    x_max: float
+    y_min: float
+    y_max: float
+    width: int = 800
+    height: int = 600
+
+    @property
+    def pixel_width(self) -> float:
+        return (self.x_max - self.x_min) / self.width
+
+    @property
+    def pixel_height(self) -> float:
+        return (self.y_max - self.y_min) / self.height
+
+@dataclass
+class Samples:
+    # `(x, y)` by increasing `x`; the line is not drawn to a NaN `y`
+    points: List[Point] = field(default_factory=list)
+    # Evaluations of the function, and of its bounds
+    evaluations: int = 0
+    bounds: int = 0
+
+def _arguments(tree: ASTNode, variable: str, args: Optional[Mapping[str, float]]) -> Tuple[List[float], Optional[int]]:
+    ''' Values of the tree's free variables, and the position of `variable` among them. '''
+    args = args or {}
+    names = free_variables(tree)
+    missing = [ name for name in names if name != variable and name not in args ]
+    if missing:
+        raise ValueError(f'No value given for {", ".join(missing)}')
+
+    values = [ float(args.get(name, 0.0)) for name in names ]
+    return values, names.index(variable) if variable in names else None
+
+def point_function(tree: ASTNode, variable: str = 'x', args: Optional[Mapping[str, float]] = None) -> Callable[[float], float]:
+    ''' The tree as a function of `variable`, with the other variables set
+    from `args`. NaN where it is undefined or not real.
+    '''
+    f = codegen.compile_ast(tree)
+    values, position = _arguments(tree, variable, args)
+
+    def evaluate(x: float) -> float:
+        if position is not None:
+            values[position] = x
+        try:
+            y = f(*values)
+        except (ArithmeticError, ValueError):
+            return NAN
+        return y if type(y) is float else float(y) if type(y) is int else NAN
+
+    return evaluate
+
+def bound_function(tree: ASTNode, variable: str = 'x', args: Optional[Mapping[str, float]] = None) -> Callable[[float, float], Optional[interval.Dual]]:
+    ''' Bounds of the tree and of its derivative with respect to `variable`
+    over `lo <= variable <= hi`; see `tex_ast.interval`.
+    '''
+    f = interval.compile_bounds(tree)
+    values, position = _arguments(tree, variable, args)
+    duals = [ ((value, value), interval.ZERO) for value in values ]
+
+    def bound(lo: float, hi: float) -> Optional[interval.Dual]:
+        if position is not None:
+            duals[position] = ((lo, hi), (1.0, 1.0))
+        return f(*duals)
+
+    return bound
+
+def sample(
+    tree: ASTNode,
+    view: View,
+    variable: str = 'x',
+    args: Optional[Mapping[str, float]] = None,
+    tolerance: float = 0.5,
+    initial: int = 16,
+    min_width: float = 1 / 16
+) -> Samples:
+    ''' Sample the tree over the view to within `tolerance` pixels.
+    `initial` is the number of segments to start from, and `min_width` the
+    width, in pixels, below which segments are no longer split.
+    '''
+    f = point_function(tree, variable, args)
+    bound = bound_function(tree, variable, args)
+    error = tolerance * view.pixel_height
+    smallest = min_width * view.pixel_width
+    y_min, y_max = view.y_min, view.y_max
+
+    xs = [ view.x_min + (view.x_max - view.x_min) * i / initial for i in range(initial) ] + [ view.x_max ]
+    ys = [ f(x) for x in xs ]
+    samples = Samples(points=[ (xs[0], ys[0]) ], evaluations=len(xs))
+    points = samples.points
+
+    # Segments still to accept, leftmost on top, so points come out in order
+    stack = [ (xs[i], ys[i], xs[i + 1], ys[i + 1]) for i in reversed(range(initial)) ]
+    while stack:
+        xa, ya, xb, yb = stack.pop()
+        width = xb - xa
+        result = bound(xa, xb)
+        samples.bounds += 1
+
+        if result is not None:
+            (lo, hi), (slope_lo, slope_hi) = result
+            if lo <= y_max and hi >= y_min:
+                if width <= smallest:
+                    if lo == -math.inf or hi == math.inf:
+                        # A pole; don't join its two sides
+                        points.append((xa + width / 2, NAN))
+                elif not (ya == ya and yb == yb and _within(ya, yb, width, slope_lo, slope_hi, error)):
+                    xm = xa + width / 2
+                    ym = f(xm)
+                    samples.evaluations += 1
+                    stack.append((xm, ym, xb, yb))
+                    stack.append((xa, ya, xm, ym))
+                    continue
+
+        points.append((xb, yb))
+
+    return samples
+
+def _within(ya: float, yb: float, width: float, slope_lo: float, slope_hi: float, error: float) -> bool:
+    ''' Whether a function through `(0, ya)` and `(width, yb)`, with slope
+    between `slope_lo` and `slope_hi`, stays within `error` of the chord.
+    '''
+    chord = (yb - ya) / width
+    # How much faster and slower than the chord it can rise
+    faster = max(slope_hi - chord, 0.0)
+    slower = max(chord - slope_lo, 0.0)
+    if faster + slower == math.inf:
+        return False
+    if faster + slower == 0:
+        return True
+    # Rising faster then slower (or the reverse) as long as it can while
+    # still meeting the chord at the end
+    return faster * slower * width / (faster + slower) <= error
+
+def sample_uniform(tree: ASTNode, view: View, count: int, variable: str = 'x', args: Optional[Mapping[str, float]] = None) -> Samples:
+    ''' The tree at `count` evenly spaced `x` across the view. '''
+    f = point_function(tree, variable, args)
+    step = (view.x_max - view.x_min) / (count - 1)
+    xs = [ view.x_min + step * i for i in range(count - 1) ] + [ view.x_max ]
+    points = [ (x, f(x)) for x in xs ]
+    return Samples(points=points, evaluations=count)
+
+def pixel_error(samples: Samples, tree: ASTNode, view: View, variable: str = 'x', args: Optional[Mapping[str, float]] = None, resolution: int = 8) -> float:
+    ''' The furthest, in pixels, the polyline through `samples` is from the
+    curve within the view. Each segment is checked `resolution` times per
+    pixel across, and as often per pixel up where it is on screen, so that a
+    line joining the two sides of a pole is caught. A gap in the line wider
+    than a pixel where the curve is visible counts as the height of the view.
+    '''
+    f = point_function(tree, variable, args)
+    y_min, y_max = view.y_min, view.y_max
+    clip = lambda y: y_min if y < y_min else y_max if y > y_max else y
+
+    worst = 0.0
+    points = samples.points
+    for (xa, ya), (xb, yb) in zip(points, points[1:]):
+        width = xb - xa
+        gap = not (ya == ya and yb == yb)
+        if gap and width <= view.pixel_width:
+            continue
+
+        # Fractions of the way along the segment to check
+        steps = max(2, math.ceil(width / view.pixel_width * resolution))
+        fractions = [ i / steps for i in range(1, steps) ]
+        if not gap and ya != yb:
+            start, end = sorted([ (y_min - ya) / (yb - ya), (y_max - ya) / (yb - ya) ])
+            start, end = max(start, 0.0), min(end, 1.0)
+            if start < end:
+                steps = math.ceil((end - start) * abs(yb - ya) / view.pixel_height * resolution)
+                fractions.extend(start + (end - start) * i / steps for i in range(steps + 1))
+
+        for fraction in fractions:
+            y = f(xa + width * fraction)
+            if y != y:
+                continue
+            if gap:
+                if y_min <= y <= y_max:
+                    return float(view.height)
+                continue
+
+            drawn = ya + (yb - ya) * fraction
+            worst = max(worst, abs(clip(y) - clip(drawn)) / view.pixel_height)
+
+    return worst
@@ -1,24 +1,37 @@
-from typing import Any
-from json import JSONEncoder
+import io
+from json import JSONEncoder, dumps as json_dumps, load as json_load, loads as json_loads
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, List, Optional, TextIO, Tuple, Type, Union
 
 from parse import parse
+from tex_ast.ast import *
 
 class ASTNodeEncoder(JSONEncoder):
+    def encode(self, o: Any) -> str:
+        # Trees go through `dumps`, which gives the same text without building
+        # the intermediate `.dict`s; anything else (or non-default options)
+        # takes the regular JSONEncoder path.
+        if isinstance(o, ASTNode) and self._default_format():
+            return dumps(o, indent=self.indent)
+
+        return super().encode(o)
+
     def default(self, o: Any) -> Any:
-        # TODO -- switch on types; use as top-level encoder
-        if isinstance(o, parse.ASTVar):
-            return ASTVarEncoder().default(o)
-        elif isinstance(o, parse.ASTNumber):
-            return ASTNumberEncoder().default(o)
-        elif isinstance(o, parse.ASTBinaryOp):
-            return ASTBinaryOpEncoder().default(o)
+        if isinstance(o, ASTNode):
+            return o.dict
 
         return super().default(o)
 
+    def _default_format(self) -> bool:
+        separators = (',', ': ') if self.indent is not None else (', ', ': ')
+        return self.ensure_ascii and not self.sort_keys and \
+            (self.item_separator, self.key_separator) == separators and \
+            (self.indent is None or isinstance(self.indent, int))
+
 class ASTExpressionEncoder(JSONEncoder):
     def default(self, o: Any) -> Any:
         return o.dict
-    
+
 class ASTVarEncoder(JSONEncoder):
     def default(self, o: Any) -> Any:
         return o.dict
@@ -29,4 +42,198 @@ class ASTNumberEncoder(JSONEncoder):
 
 class ASTBinaryOpEncoder(JSONEncoder):
     def default(self, o: Any) -> Any:
-        return o.dict
\ No newline at end of file
+        return o.dict
+
+class _Layout:
+    ''' Separators and per-depth indentation for one `indent` setting. '''
+
+    def __init__(self, indent: Optional[int]):
+        self.indent = indent
+        self.separator = ',' if indent is not None else ', '
+        self._newlines = []
+
+    def newline(self, depth: int) -> str:
+        ''' Line break and indentation for an item at `depth`. '''
+        while len(self._newlines) <= depth:
+            self._newlines.append('\n' + ' ' * (self.indent * len(self._newlines)) if self.indent is not None else '')
+        return self._newlines[depth]
+
+# Writers return the text of a node as a tuple of pieces: strings, and
+# (child, depth) pairs still to be written. Leaves return a single string.
+Pieces = Tuple[Any, ...]
+
+def _var_pieces(node: ASTVar, depth: int, layout: _Layout) -> str:
+    inner = layout.newline(depth + 1)
+    return ('{' + inner + '"type": "ASTVar"' + layout.separator +
+        inner + '"name": ' + encode_basestring_ascii(node.name) + layout.newline(depth) + '}')
+
+def _number_pieces(node: ASTNumber, depth: int, layout: _Layout) -> str:
+    inner = layout.newline(depth + 1)
+    return ('{' + inner + '"type": "ASTNumber"' + layout.separator +
+        inner + '"number": ' + encode_basestring_ascii(str(node.number)) + layout.newline(depth) + '}')
+
+def _binary_op_pieces(node: ASTBinaryOp, depth: int, layout: _Layout) -> Pieces:
+    inner = layout.newline(depth + 1)
+    separator = layout.separator
+    return (
+        '{' + inner + '"type": "ASTBinaryOp"' + separator + inner + '"op": ' + encode_basestring_ascii(str(node.type)) +
+            separator + inner + '"left_arg": ',
+        (node.left_arg, depth + 1),
+        separator + inner + '"right_arg": ',
+        (node.right_arg, depth + 1),
+        layout.newline(depth) + '}')
+
+def _unary_command_pieces(node: ASTUnaryCommand, depth: int, layout: _Layout) -> Pieces:
+    inner = layout.newline(depth + 1)
+    separator = layout.separator
+    return (
+        '{' + inner + '"type": "ASTUnaryCommand"' + separator + inner + '"op": ' + encode_basestring_ascii(str(node.type)) +
+            separator + inner + '"arg": ',
+        (node.arg, depth + 1),
+        layout.newline(depth) + '}')
+
+def _arg_pieces(node: ASTArg, depth: int, layout: _Layout) -> str:
+    inner = layout.newline(depth + 1)
+    return ('{' + inner + '"type": "ASTArg"' + layout.separator +
+        inner + '"value": ' + encode_basestring_ascii(node.value) + layout.newline(depth) + '}')
+
+def _expression_pieces(node: ASTExpression, depth: int, layout: _Layout) -> Pieces:
+    inner = layout.newline(depth + 1)
+    head = '{' + inner + '"type": "ASTExpression"' + layout.separator + inner + '"children": '
+    close = layout.newline(depth) + '}'
+    if not node.children:
+        return head + '[]' + close
+
+    pieces = [ head + '[' ]
+    item = layout.newline(depth + 2)
+    for i, child in enumerate(node.children):
+        pieces.append(layout.separator + item if i else item)
+        pieces.append((child, depth + 2))
+    pieces.append(inner + ']' + close)
+    return tuple(pieces)
+
+WRITERS: Dict[Type[ASTNode], Callable[[ASTNode, int, _Layout], Union[str, Pieces]]] = {
+    ASTVar: _var_pieces,
+    ASTNumber: _number_pieces,
+    ASTArg: _arg_pieces,
+    ASTBinaryOp: _binary_op_pieces,
+    ASTUnaryCommand: _unary_command_pieces,
+    ASTExpression: _expression_pieces,
+}
+
+def _fallback_pieces(node: ASTNode, depth: int, layout: _Layout) -> str:
+    # Types without a writer serialize whatever their `.dict` returns
+    text = json_dumps(node.dict, indent=layout.indent)
+    return text.replace('\n', layout.newline(depth)) if layout.indent is not None else text
+
+def _writer(cls: Type[ASTNode]) -> Callable[[ASTNode, int, _Layout], Union[str, Pieces]]:
+    for base in cls.__mro__:
+        if base in WRITERS:
+            return WRITERS[base]
+    return _fallback_pieces
+
+# Flush the output buffer to the file after this many pieces
+_FLUSH_PIECES = 4096
+
+def dump(root: ASTNode, fp: TextIO, indent: Optional[int] = None):
+    ''' Write `root` as JSON to `fp`.
+
+    The text is identical to `json.dumps(root.dict, indent=indent)`, but it is
+    produced in one pass over the tree through the per-type `WRITERS` table,
+    without intermediate dicts, and iteratively, so depth is not limited by
+    the recursion limit. Node types without a writer fall back to `.dict`.
+    '''
+    layout = _Layout(indent)
+    writers = dict(WRITERS)
+
+    out = []
+    # Pending work, popped from the end: strings to write, or (node, depth)
+    stack = [ (root, 0) ]
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            out.append(item)
+        else:
+            node, depth = item
+            writer = writers.get(type(node))
+            if writer is None:
+                writer = writers[type(node)] = _writer(type(node))
+
+            pieces = writer(node, depth, layout)
+            if type(pieces) is str:
+                out.append(pieces)
+            else:
+                stack.extend(reversed(pieces))
+
+        if len(out) >= _FLUSH_PIECES:
+            fp.write(''.join(out))
+            out.clear()
+
+    fp.write(''.join(out))
+
+def dumps(root: ASTNode, indent: Optional[int] = None) -> str:
+    buffer = io.StringIO()
+    dump(root, buffer, indent)
+    return buffer.getvalue()
+
+def parse_number(text: str) -> Union[int, float, str]:
+    ''' The `ASTNumber.number` whose `str` is `text`, so that loading and
+    dumping again gives the same JSON.
+    '''
+    for cls in (int, float):
+        try:
+            number = cls(text)
+        except ValueError:
+            continue
+        if str(number) == text:
+            return number
+
+    # Implicit multiplication keeps the token text as the number
+    return text
+
+_BINARY_OPS = { str(op): op for op in ASTBinaryOp.Type }
+_UNARY_OPS = { str(op): op for op in ASTUnaryCommand.Type }
+
+def from_dict(root: dict) -> ASTNode:
+    ''' Rebuild a tree from its `.dict`. Iterative, like `dump`. '''
+    built = {}
+    # (dict, ready): a dict is built once its children have been
+    stack = [ (root, False) ]
+    while stack:
+        d, ready = stack.pop()
+        match d.get('type'):
+            case 'ASTVar':
+                node = ASTVar(children=[], name=d['name'])
+            case 'ASTNumber':
+                node = ASTNumber(children=[], number=parse_number(d['number']))
+            case 'ASTArg':
+                node = ASTArg(children=[], value=d['value'])
+            case 'ASTBinaryOp':
+                if not ready:
+                    stack.extend([ (d, True), (d['right_arg'], False), (d['left_arg'], False) ])
+                    continue
+                node = ASTBinaryOp(children=[], type=_BINARY_OPS[d['op']],
+                    left_arg=built.pop(id(d['left_arg'])), right_arg=built.pop(id(d['right_arg'])))
+            case 'ASTUnaryCommand':
+                if not ready:
+                    stack.extend([ (d, True), (d['arg'], False) ])
+                    continue
+                node = ASTUnaryCommand(children=[], type=_UNARY_OPS[d['op']], arg=built.pop(id(d['arg'])))
+            case 'ASTExpression':
+                if not ready:
+                    stack.append((d, True))
+                    stack.extend((child, False) for child in reversed(d['children']))
+                    continue
+                node = ASTExpression(children=[ built.pop(id(child)) for child in d['children'] ])
+            case other:
+                raise ValueError(f'Unknown node type: {other!r}')
+
+        built[id(d)] = node
+
+    return built[id(root)]
+
+def load(fp: TextIO) -> ASTNode:
+    return from_dict(json_load(fp))
+
+def loads(text: str) -> ASTNode:
+    return from_dict(json_loads(text))
@@ -0,0 +1,363 @@
+''' Persistent on-disk store of encoded ASTs.
+
+A store is a directory of two files:
+
+    segment.dat   b'TXAS', version u8, then appended records:
+                  key length u32, data length u32, UTF-8 key, and the tree
+                  encoded with `tex_ast.binary`
+    index.dat     open-addressing hash table from key to record offset:
+                  b'TXAI', version u8, slot count, used slots and live keys
+                  (u64 each), then slots of (key hash u64, offset u64)
+
+Both files are memory-mapped, so opening a store reads nothing but the
+headers and a lookup touches one index slot (plus probes) and one record.
+Records are never rewritten in place: putting an existing key appends a new
+record and repoints the index, deleting clears the slot, and `compact`
+rewrites both files with only the live records.
+
+Keys are expression IDs; `source_key` gives the key for a LaTeX source so
+expressions can be stored by content instead.
+'''
+import hashlib
+import mmap
+import os
+import struct
+from typing import Iterable, Iterator, Optional, Tuple
+
+from parse import parse
+from tex_ast import binary
+from tex_ast.ast import *
+
+SEGMENT_MAGIC = b'TXAS'
+INDEX_MAGIC = b'TXAI'
+VERSION = 1
+
+_SEGMENT_HEADER = struct.Struct('<4sB')
+_RECORD_HEADER = struct.Struct('<II')
+_INDEX_HEADER = struct.Struct('<4sBxxxQQQ')
+_SLOT = struct.Struct('<QQ')
+
+_EMPTY = 0
+_DELETED = 2**64 - 1
+
+# Grow the index past this fraction of used (live or deleted) slots
+_MAX_LOAD = 0.5
+_MIN_SLOTS = 64
+
+class StoreError(Exception):
+    pass
+
+def source_key(tex: str) -> str:
+    ''' Key for storing the tree of `tex` by content. '''
+    return 'sha256:' + hashlib.sha256(tex.encode('utf-8')).hexdigest()
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+def _map(f, access: int) -> mmap.mmap:
+    return mmap.mmap(f.fileno(), 0, access=access)
+
+def _unmap(m: Optional[mmap.mmap]):
+    if m is None:
+        return
+    try:
+        m.close()
+    except BufferError:
+        # Documents still hold views into the map; it closes once they are gone
+        pass
+
+class ASTStore:
+    ''' Store of trees keyed by string, in the directory `path`.
+
+        with ASTStore('corpus.store') as store:
+            store['eq1'] = parse.parse_program('x+1')
+            key = store.add('y+2')
+            store['eq1']                # ASTNode
+            store.document(key).root    # binary.LazyNode, read from the map
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        segment_path = os.path.join(path, 'segment.dat')
+        if not os.path.exists(segment_path):
+            with open(segment_path, 'wb') as f:
+                f.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, VERSION))
+
+        self._segment_file = open(segment_path, 'r+b')
+        self._segment_size = os.fstat(self._segment_file.fileno()).st_size
+        self._segment: Optional[mmap.mmap] = None
+        magic, version = _SEGMENT_HEADER.unpack(self._read(0, _SEGMENT_HEADER.size))
+        if magic != SEGMENT_MAGIC or version != VERSION:
+            self._segment_file.close()
+            raise StoreError(f'Not a version {VERSION} segment file: {segment_path}')
+
+        self._index_file = None
+        self._index: Optional[mmap.mmap] = None
+        if os.path.exists(self._index_path):
+            self._open_index()
+        else:
+            self.rebuild_index()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.path, 'index.dat')
+
+    def __enter__(self) -> 'ASTStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._segment_file.closed:
+            return
+        self.flush()
+        _unmap(self._segment)
+        _unmap(self._index)
+        self._segment = self._index = None
+        self._segment_file.close()
+        self._index_file.close()
+
+    def flush(self):
+        self._segment_file.flush()
+        self._index.flush()
+
+    # Segment
+
+    def _read(self, offset: int, size: int) -> memoryview:
+        if self._segment is None or offset + size > len(self._segment):
+            # The file has grown since it was mapped
+            self._segment_file.flush()
+            _unmap(self._segment)
+            self._segment = _map(self._segment_file, mmap.ACCESS_READ)
+        return memoryview(self._segment)[offset:offset + size]
+
+    def _record(self, offset: int) -> Tuple[bytes, memoryview]:
+        ''' Key and encoded tree of the record at `offset`. '''
+        key_size, data_size = _RECORD_HEADER.unpack(self._read(offset, _RECORD_HEADER.size))
+        start = offset + _RECORD_HEADER.size
+        return bytes(self._read(start, key_size)), self._read(start + key_size, data_size)
+
+    def _records(self) -> Iterator[Tuple[int, bytes]]:
+        ''' (offset, key) of every record in the segment, live or not. '''
+        offset = _SEGMENT_HEADER.size
+        while offset < self._segment_size:
+            key_size, data_size = _RECORD_HEADER.unpack(self._read(offset, _RECORD_HEADER.size))
+            start = offset + _RECORD_HEADER.size
+            yield offset, bytes(self._read(start, key_size))
+            offset = start + key_size + data_size
+
+    def _append(self, records: Iterable[Tuple[bytes, bytes]]) -> list:
+        ''' Write (key, data) records in one write; their offsets. '''
+        chunks = []
+        offsets = []
+        offset = self._segment_size
+        for key, data in records:
+            chunks.append(_RECORD_HEADER.pack(len(key), len(data)))
+            chunks.append(key)
+            chunks.append(data)
+            offsets.append(offset)
+            offset += _RECORD_HEADER.size + len(key) + len(data)
+
+        self._segment_file.seek(self._segment_size)
+        self._segment_file.write(b''.join(chunks))
+        self._segment_size = offset
+        return offsets
+
+    # Index
+
+    def _open_index(self):
+        self._index_file = open(self._index_path, 'r+b')
+        self._index = _map(self._index_file, mmap.ACCESS_WRITE)
+        magic, version, slots, _, _ = _INDEX_HEADER.unpack_from(self._index)
+        if magic != INDEX_MAGIC or version != VERSION:
+            raise StoreError(f'Not a version {VERSION} index file: {self._index_path}')
+        self._slots = slots
+
+    def _header(self) -> Tuple[int, int]:
+        ''' Used slots and live keys. '''
+        return _INDEX_HEADER.unpack_from(self._index)[3:]
+
+    def _set_header(self, used: int, live: int):
+        _INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, VERSION, self._slots, used, live)
+
+    def _slot(self, i: int) -> Tuple[int, int]:
+        return _SLOT.unpack_from(self._index, _INDEX_HEADER.size + _SLOT.size * i)
+
+    def _set_slot(self, i: int, hash: int, offset: int):
+        _SLOT.pack_into(self._index, _INDEX_HEADER.size + _SLOT.size * i, hash, offset)
+
+    def _find(self, key: bytes, hash: int) -> Tuple[int, int]:
+        ''' Slot and record offset of `key`, or the slot to insert it at and
+        `_EMPTY`.
+        '''
+        mask = self._slots - 1
+        i = hash & mask
+        free = None
+        while True:
+            slot_hash, offset = self._slot(i)
+            if offset == _EMPTY:
+                return (i if free is None else free), _EMPTY
+            if offset == _DELETED:
+                if free is None:
+                    free = i
+            elif slot_hash == hash and self._record(offset)[0] == key:
+                return i, offset
+            i = (i + 1) & mask
+
+    def _write_index(self, slots: int, entries: Iterable[Tuple[int, int]]):
+        ''' Replace the index with a table of `slots` holding (hash, offset). '''
+        path = self._index_path + '.tmp'
+        with open(path, 'w+b') as f:
+            f.truncate(_INDEX_HEADER.size + _SLOT.size * slots)
+            with _map(f, mmap.ACCESS_WRITE) as table:
+                mask = slots - 1
+                live = 0
+                for hash, offset in entries:
+                    i = hash & mask
+                    while _SLOT.unpack_from(table, _INDEX_HEADER.size + _SLOT.size * i)[1] != _EMPTY:
+                        i = (i + 1) & mask
+                    _SLOT.pack_into(table, _INDEX_HEADER.size + _SLOT.size * i, hash, offset)
+                    live += 1
+                _INDEX_HEADER.pack_into(table, 0, INDEX_MAGIC, VERSION, slots, live, live)
+
+        if self._index is not None:
+            _unmap(self._index)
+            self._index_file.close()
+        os.replace(path, self._index_path)
+        self._open_index()
+
+    def _entries(self) -> Iterator[Tuple[int, int]]:
+        for i in range(self._slots):
+            hash, offset = self._slot(i)
+            if offset not in (_EMPTY, _DELETED):
+                yield hash, offset
+
+    def _reserve(self, n: int):
+        ''' Make room in the index for `n` more keys. '''
+        used, live = self._header()
+        if used + n <= self._slots * _MAX_LOAD:
+            return
+
+        slots = self._slots
+        while live + n > slots * _MAX_LOAD:
+            slots *= 2
+        self._write_index(slots, list(self._entries()))
+
+    def rebuild_index(self):
+        ''' Recreate the index from the segment; the last record of a key wins. '''
+        latest = {}
+        for offset, key in self._records():
+            latest[key] = offset
+
+        slots = _MIN_SLOTS
+        while len(latest) > slots * _MAX_LOAD:
+            slots *= 2
+        self._write_index(slots, [ (_hash(key), offset) for key, offset in latest.items() ])
+
+    # Mapping interface
+
+    def __len__(self) -> int:
+        return self._header()[1]
+
+    def __contains__(self, key: str) -> bool:
+        key = key.encode('utf-8')
+        return self._find(key, _hash(key))[1] != _EMPTY
+
+    def __getitem__(self, key: str) -> ASTNode:
+        return self.document(key).materialize()
+
+    def get(self, key: str, default: Optional[ASTNode] = None) -> Optional[ASTNode]:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def document(self, key: str) -> binary.Document:
+        ''' The tree under `key`, read lazily from the mapped segment. '''
+        encoded = key.encode('utf-8')
+        _, offset = self._find(encoded, _hash(encoded))
+        if offset == _EMPTY:
+            raise KeyError(key)
+        return binary.Document(self._record(offset)[1])
+
+    def __setitem__(self, key: str, root: ASTNode):
+        self.extend([ (key, root) ])
+
+    def extend(self, items: Iterable[Tuple[str, ASTNode]]):
+        ''' Store many trees with a single write to the segment. '''
+        records = [ (key.encode('utf-8'), binary.encode(root)) for key, root in items ]
+        offsets = self._append(records)
+        # Records must be on disk before the index points at them
+        self._segment_file.flush()
+
+        self._reserve(len(records))
+        used, live = self._header()
+        for (key, _), offset in zip(records, offsets):
+            hash = _hash(key)
+            i, existing = self._find(key, hash)
+            if existing == _EMPTY:
+                live += 1
+                if self._slot(i)[1] == _EMPTY:
+                    used += 1
+            self._set_slot(i, hash, offset)
+        self._set_header(used, live)
+
+    def add(self, tex: str, engine: parse.ParseEngine = None) -> str:
+        ''' Parse and store `tex` under `source_key(tex)`, unless already stored. '''
+        key = source_key(tex)
+        if key not in self:
+            self[key] = parse.parse_program(tex, engine=engine)
+        return key
+
+    def __delitem__(self, key: str):
+        encoded = key.encode('utf-8')
+        i, offset = self._find(encoded, _hash(encoded))
+        if offset == _EMPTY:
+            raise KeyError(key)
+        self._set_slot(i, 0, _DELETED)
+        used, live = self._header()
+        self._set_header(used, live - 1)
+
+    def keys(self) -> Iterator[str]:
+        ''' Live keys, in the order they were last stored. '''
+        for offset, key in self._records():
+            if self._find(key, _hash(key))[1] == offset:
+                yield key.decode('utf-8')
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def items(self) -> Iterator[Tuple[str, ASTNode]]:
+        for key in self.keys():
+            yield key, self[key]
+
+    def garbage(self) -> int:
+        ''' Bytes of the segment held by overwritten or deleted records. '''
+        live = 0
+        for _, offset in self._entries():
+            key, data = self._record(offset)
+            live += _RECORD_HEADER.size + len(key) + len(data)
+        return self._segment_size - _SEGMENT_HEADER.size - live
+
+    def compact(self):
+        ''' Rewrite the segment with only live records, and a fresh index. '''
+        path = os.path.join(self.path, 'segment.dat')
+        with open(path + '.tmp', 'wb') as f:
+            f.write(_SEGMENT_HEADER.pack(SEGMENT_MAGIC, VERSION))
+            for offset, key in self._records():
+                if self._find(key, _hash(key))[1] == offset:
+                    _, data = self._record(offset)
+                    f.write(_RECORD_HEADER.pack(len(key), len(data)))
+                    f.write(key)
+                    f.write(data)
+
+        _unmap(self._segment)
+        self._segment = None
+        self._segment_file.close()
+        os.replace(path + '.tmp', path)
+        self._segment_file = open(path, 'r+b')
+        self._segment_size = os.fstat(self._segment_file.fileno()).st_size
+        self.rebuild_index()
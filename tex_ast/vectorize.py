@@ -0,0 +1,189 @@
+''' Evaluate ASTs over arrays of variable values with NumPy.
+
+`vectorize` walks the tree once and flattens it into a list of ufunc calls
+over numbered registers; calling the result runs those calls on whole arrays,
+so the Python overhead is per node rather than per point. Inputs broadcast
+like any NumPy expression and the result is a float ndarray. Division by zero
+and `\\sqrt` of negatives produce `inf`/`nan` rather than raising.
+
+NumPy is optional. Without it the same API evaluates point by point with the
+compiled function from `tex_ast.codegen`, taking scalars or equal-length
+sequences and returning a list.
+'''
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from tex_ast import codegen
+from tex_ast.ast import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_BINARY_UFUNCS = {
+    ASTBinaryOp.Type.ADD: 'add',
+    ASTBinaryOp.Type.MULTIPLY: 'multiply',
+    ASTBinaryOp.Type.DIVIDE: 'divide',
+    ASTBinaryOp.Type.POW: 'power',
+}
+
+_UNARY_UFUNCS = {
+    ASTUnaryCommand.Type.SQRT: 'sqrt',
+    ASTUnaryCommand.Type.NEGATIVE: 'negative',
+}
+
+@dataclass
+class _Program:
+    # Free variables in argument order, and the register each is loaded into
+    args: List[str]
+    var_registers: List[int]
+    constants: List[Tuple[int, float]]
+    # (ufunc name, output register, input registers)
+    instructions: List[Tuple[str, int, Tuple[int, ...]]]
+    registers: int
+    result: int
+
+def _flatten(root: ASTNode) -> _Program:
+    registers = {}
+    var_registers = {}
+    constants = {}
+    instructions = []
+    count = 0
+
+    # Post-order walk: a node is emitted once all of its operands have registers
+    stack = [(root, False)]
+    while stack:
+        node, ready = stack.pop()
+        match node:
+            case ASTNumber() | ASTArg():
+                value = float(node.number if isinstance(node, ASTNumber) else node.value)
+                if value not in constants:
+                    constants[value] = count
+                    count += 1
+                registers[id(node)] = constants[value]
+            case ASTVar():
+                if node.name not in var_registers:
+                    var_registers[node.name] = count
+                    count += 1
+                registers[id(node)] = var_registers[node.name]
+            case ASTExpression():
+                if not ready:
+                    stack.append((node, True))
+                    stack.append((node.children[0], False))
+                else:
+                    registers[id(node)] = registers[id(node.children[0])]
+            case ASTBinaryOp():
+                if not ready:
+                    stack.append((node, True))
+                    stack.append((node.right_arg, False))
+                    stack.append((node.left_arg, False))
+                else:
+                    operands = (registers[id(node.left_arg)], registers[id(node.right_arg)])
+                    instructions.append((_BINARY_UFUNCS[node.type], count, operands))
+                    registers[id(node)] = count
+                    count += 1
+            case ASTUnaryCommand():
+                if not ready:
+                    stack.append((node, True))
+                    stack.append((node.arg, False))
+                else:
+                    instructions.append((_UNARY_UFUNCS[node.type], count, (registers[id(node.arg)],)))
+                    registers[id(node)] = count
+                    count += 1
+            case _:
+                raise TypeError(f'Cannot vectorize {type(node).__name__}')
+
+    args = codegen.free_vars(root)
+    return _Program(
+        args=args,
+        var_registers=[ var_registers[name] for name in args ],
+        constants=[ (register, value) for value, register in constants.items() ],
+        instructions=instructions,
+        registers=count,
+        result=registers[id(root)])
+
+class VectorizedFunction:
+    ''' Callable with the tree's free variables, positionally (in `args` order)
+    or by name.
+    '''
+
+    def __init__(self, root: ASTNode):
+        self._program = _flatten(root)
+        self._scalar_func = root.python_func
+
+    @property
+    def args(self) -> List[str]:
+        return self._program.args
+
+    def __call__(self, *args, **kwargs):
+        values = self._bind(args, kwargs)
+        if np is None:
+            return self._call_scalar(values)
+        return self._call_numpy(values)
+
+    def _bind(self, args: Sequence, kwargs: Mapping[str, Any]) -> List[Any]:
+        if len(args) > len(self.args):
+            raise TypeError(f'Expected at most {len(self.args)} arguments, got {len(args)}')
+
+        bound = dict(zip(self.args, args))
+        for name, value in kwargs.items():
+            if name not in self.args:
+                raise TypeError(f'Unexpected variable: {name}')
+            if name in bound:
+                raise TypeError(f'Variable given twice: {name}')
+            bound[name] = value
+
+        missing = [ name for name in self.args if name not in bound ]
+        if missing:
+            raise TypeError(f'Missing variables: {", ".join(missing)}')
+
+        return [ bound[name] for name in self.args ]
+
+    def _call_numpy(self, values: List[Any]):
+        program = self._program
+        registers = [None] * program.registers
+        for register, value in program.constants:
+            registers[register] = np.float64(value)
+
+        arrays = [ np.asarray(value, dtype=np.float64) for value in values ]
+        for register, array in zip(program.var_registers, arrays):
+            registers[register] = array
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for name, out, operands in program.instructions:
+                registers[out] = getattr(np, name)(*[ registers[i] for i in operands ])
+
+        result = registers[program.result]
+        shape = np.broadcast_shapes(*[ array.shape for array in arrays ])
+        return np.array(np.broadcast_to(result, shape), dtype=np.float64)
+
+    def _call_scalar(self, values: List[Any]) -> Any:
+        sequences = [ value for value in values if isinstance(value, Sequence) ]
+        if not sequences:
+            return _guarded(self._scalar_func, values)
+
+        n = len(sequences[0])
+        if any(len(sequence) != n for sequence in sequences):
+            raise ValueError('Without NumPy, inputs must be scalars or sequences of equal length')
+
+        columns = [ value if isinstance(value, Sequence) else [value] * n for value in values ]
+        return [ _guarded(self._scalar_func, point) for point in zip(*columns) ]
+
+def _guarded(f, args: Sequence) -> float:
+    # Where NumPy would warn and return inf/nan, return nan instead of raising.
+    # (The sign of an infinite quotient is lost; NumPy would keep it.)
+    try:
+        return float(f(*args))
+    except (ZeroDivisionError, ValueError, OverflowError, TypeError):
+        # TypeError: a fractional power of a negative number is complex
+        return math.nan
+
+def vectorize(root: ASTNode) -> VectorizedFunction:
+    return VectorizedFunction(root)
+
+def evaluate(root: ASTNode, variables: Mapping[str, Any] = None, **kwargs):
+    ''' Evaluate `root` once over arrays of variable values. '''
+    variables = dict(variables or {}, **kwargs)
+    return vectorize(root)(**variables)
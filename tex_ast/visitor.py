@@ -0,0 +1,121 @@
+''' Tree walks that keep their own stack.
+
+Long sums and products are as deep as they are long (`a+b+c+...` nests one
+`ASTBinaryOp` per term), so nothing here recurses: depth is limited only by
+memory. Every node lists the nodes directly under it, in order, with
+`_operands()`: `(left_arg, right_arg)`, `(arg,)`, or `children`.
+
+- `walk(root)`: every node, parents before children, left to right.
+- `fold(root, combine)`: `combine(node, *values)` for each node, given the
+  values already computed for its operands; returns the root's value.
+- `Visitor`: `fold` dispatching to `visit_<ClassName>` methods.
+- `Transformer`: a `Visitor` that rebuilds the tree, sharing unchanged
+  subtrees.
+- `render(root, pieces)`: text built from what `pieces(node)` returns. That
+  is a string, or a tuple of strings and nodes still to render.
+- `copy(root)`: a copy of the tree, made with each node's `_with_operands`.
+'''
+from typing import Any, Callable, Dict, Iterator, Tuple, Union
+
+def walk(root) -> Iterator:
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(node._operands()))
+
+def fold(root, combine: Callable[..., Any]) -> Any:
+    values = []
+    # A node, then once its operands are on `values`, (node, operand count)
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if type(item) is tuple:
+            node, count = item
+            args = values[len(values) - count:]
+            del values[len(values) - count:]
+            values.append(combine(node, *args))
+            continue
+
+        operands = item._operands()
+        if operands:
+            stack.append((item, len(operands)))
+            stack.extend(reversed(operands))
+        else:
+            values.append(combine(item))
+
+    return values[0]
+
+Pieces = Union[str, Tuple[Any, ...]]
+
+def render(root, pieces: Callable[[Any], Pieces]) -> str:
+    out = []
+    stack = [root]
+    while stack:
+        item = stack.pop()
+        if type(item) is str:
+            out.append(item)
+            continue
+
+        result = pieces(item)
+        if type(result) is str:
+            out.append(result)
+        else:
+            stack.extend(reversed(result))
+
+    return ''.join(out)
+
+class Visitor:
+    ''' Computes a value for each node from its operands' values, bottom-up.
+
+    Subclasses define `visit_<ClassName>(self, node, *values)` for the node
+    classes they handle. Methods for base classes apply to subclasses
+    without their own method. Anything else goes to `generic_visit`.
+
+        class Count(Visitor):
+            def generic_visit(self, node, *values):
+                return 1 + sum(values)
+
+        Count().visit(tree)
+    '''
+
+    def visit(self, root) -> Any:
+        methods: Dict[type, Callable[..., Any]] = {}
+
+        def combine(node, *values):
+            method = methods.get(type(node))
+            if method is None:
+                method = methods[type(node)] = self._method(type(node))
+            return method(node, *values)
+
+        return fold(root, combine)
+
+    def _method(self, cls: type) -> Callable[..., Any]:
+        for base in cls.__mro__:
+            method = getattr(self, 'visit_' + base.__name__, None)
+            if method is not None:
+                return method
+        return self.generic_visit
+
+    def generic_visit(self, node, *values) -> Any:
+        raise TypeError(f'{type(self).__name__} cannot visit {type(node).__name__}')
+
+class Transformer(Visitor):
+    ''' A `Visitor` whose values are nodes. By default it rebuilds each node
+    whose operands changed, with `node._with_operands`, and keeps the others,
+    so an unchanged subtree comes back as the same object. Then it passes
+    the result through `transform`. Override `transform` to rewrite nodes
+    bottom-up, or `visit_<ClassName>` for more control.
+    '''
+
+    def generic_visit(self, node, *operands):
+        if any(new is not old for new, old in zip(operands, node._operands())):
+            node = node._with_operands(operands)
+        return self.transform(node)
+
+    def transform(self, node):
+        return node
+
+def copy(root):
+    ''' A copy of the tree `root` made of new, plain (mutable) nodes. '''
+    return fold(root, lambda node, *operands: node._with_operands(operands))
@@ -0,0 +1,124 @@
+''' Batch parsing over a process pool.
+
+Input is one record per line: either raw LaTeX, or with `jsonl` a JSON
+string or an object `{"tex": ..., "id": ...}`. Records are grouped into
+chunks that workers lex, parse and serialize independently; output is one
+JSON object per input record, in input order:
+
+    {"index": 0, "ast": {...}}
+    {"index": 1, "id": "a", "error": "ParseException: Failed to parse tokens."}
+'''
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from parse import parse
+from tex_ast import serialization
+
+# (index, id, tex); id is None for plain text input. A line that is not valid
+# JSON carries the decode error in place of the tex, to be reported in order.
+Record = Tuple[int, Optional[str], Any]
+
+def read_records(lines: Iterable[str], jsonl: bool = False) -> Iterator[Record]:
+    index = 0
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+
+        id = None
+        tex = line
+        if jsonl:
+            try:
+                tex = json.loads(line)
+            except json.JSONDecodeError as e:
+                tex = e
+
+            if isinstance(tex, dict):
+                id = tex.get('id')
+                tex = tex.get('tex')
+
+        yield (index, id, tex)
+        index += 1
+
+def process_record(index: int, id: Optional[str], tex: Any, engine: parse.ParseEngine) -> str:
+    result = { 'index': index }
+    if id is not None:
+        result['id'] = id
+
+    try:
+        if isinstance(tex, Exception):
+            raise tex
+        if not isinstance(tex, str):
+            raise ValueError(f'Expected a LaTeX string, got {type(tex).__name__}')
+        ast = parse.parse_program(tex, engine=engine)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+        return json.dumps(result)
+
+    # Splice the tree in rather than building its `.dict`
+    return json.dumps(result)[:-1] + ', "ast": ' + serialization.dumps(ast) + '}'
+
+def process_chunk(chunk: List[Record], engine: parse.ParseEngine = None) -> List[str]:
+    return [ process_record(index, id, tex, engine) for index, id, tex in chunk ]
+
+def _chunks(records: Iterable[Record], chunk_size: int) -> Iterator[List[Record]]:
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        yield chunk
+
+def run(
+    records: Iterable[Record],
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+    engine: parse.ParseEngine = None,
+    executor: Optional[Executor] = None
+) -> Iterator[str]:
+    ''' Yield one output line per record, in input order.
+
+    `workers=1` processes in this process; otherwise chunks go to a process
+    pool of `workers` processes (default: one per CPU). At most two chunks
+    per worker are in flight, so input is read lazily and memory stays
+    bounded regardless of corpus size.
+    '''
+    chunks = _chunks(records, chunk_size)
+
+    if workers == 1 and executor is None:
+        for chunk in chunks:
+            yield from process_chunk(chunk, engine)
+        return
+
+    owned = executor is None
+    if owned:
+        # Imported here as it pulls in `multiprocessing`, which `workers=1` never needs
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        max_in_flight = 2 * (workers or os.cpu_count() or 1)
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(process_chunk, chunk, engine))
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.popleft().result()
+
+        while in_flight:
+            yield from in_flight.popleft().result()
+    finally:
+        if owned:
+            executor.shutdown(cancel_futures=True)
+
+def run_stream(
+    input: TextIO,
+    output: TextIO,
+    jsonl: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = 256,
+    engine: parse.ParseEngine = None
+):
+    for line in run(read_records(input, jsonl), workers, chunk_size, engine):
+        output.write(line)
+        output.write('\n')
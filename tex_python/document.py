@@ -0,0 +1,333 @@
+''' Documents: lists of related expressions, as in a Desmos graph.
+
+An expression either defines a variable (`a=3`, `x_{1}=a+1`) or is plotted
+(`y=ax^{2}`, or just `ax^{2}`; `x` and `y` are never defined). Variables
+that another expression defines are its dependencies. Each
+`Expression.function` computes the definitions it uses, directly or not,
+once each and in dependency order, before its own value, so it takes only
+the variables left over (`parameters`, in order of first appearance as if
+the definitions were written in place):
+
+    document = Document({ 'slider': 'a=3', 'curve': 'y=ax^{2}' })
+    document['curve'].function(2.0)     # 12.0
+    document.update({ 'slider': 'a=4' }) # ['slider', 'curve']
+    document['curve'].source
+    # 'lambda x: ((a := 4.0), (a*(x**2.0)))[-1]'
+
+`update` re-parses only the expressions whose text changed, and recompiles
+only those and the expressions downstream of them, plus any whose
+dependencies changed because a definition they use appeared or went away.
+It returns what it recompiled, in dependency order.
+
+Work runs on `workers` processes, or on `executor` if given. `workers=1`,
+the default, keeps it in this process. Changed expressions are parsed, and
+the source computing each one's value generated, in parallel. Functions are
+then put together from those in dependency order and compiled in this
+process, as functions cannot be sent between processes.
+
+Errors are per expression, in `Expression.error`: a parse error, a name
+defined more than once, a circular definition, or a dependency with an
+error. The rest of the document is unaffected.
+'''
+import os
+from collections import defaultdict, deque
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from parse import parse
+from tex_ast import codegen, optimize
+from tex_ast.ast import *
+
+# Plotted against, never defined
+PLOT_VARIABLES = frozenset([ 'x', 'y' ])
+
+@dataclass
+class Expression:
+    tex: str
+    # The variable this expression defines, if any
+    name: Optional[str] = None
+    # The parsed right-hand side, and the variables in it
+    tree: Optional[ASTNode] = None
+    variables: Tuple[str, ...] = ()
+    # Ids of the expressions defining those variables
+    dependencies: Tuple[Hashable, ...] = ()
+    # `tree`'s value, as `codegen.steps` writes it
+    steps: Tuple[str, ...] = ()
+    # Ids of every definition `function` computes, dependencies first
+    definitions: Tuple[Hashable, ...] = ()
+    parameters: Tuple[str, ...] = ()
+    # `function`'s source
+    source: Optional[str] = None
+    function: Optional[Callable] = None
+    error: Optional[str] = None
+
+def split_definition(tex: str, engine: parse.ParseEngine = parse.ParseEngine.PRATT) -> Tuple[Optional[str], str]:
+    ''' The variable `tex` defines (None if it is plotted) and the text of its right-hand side. '''
+    target, equals, body = tex.partition('=')
+    if not equals:
+        return None, tex
+    if '=' in body:
+        raise parse.ParseException('More than one `=`')
+
+    target = parse.parse_program(target, engine)
+    if not isinstance(target, ASTVar):
+        raise parse.ParseException('Only a variable can be defined')
+
+    return (None if target.name in PLOT_VARIABLES else target.name), body
+
+def parse_expression(tex: str, engine: parse.ParseEngine = parse.ParseEngine.PRATT) -> Tuple[Optional[str], ASTNode]:
+    ''' The variable `tex` defines (None if it is plotted) and its parsed right-hand side. '''
+    name, body = split_definition(tex, engine)
+    return name, parse.parse_program(body, engine)
+
+def _describe(e: Exception) -> str:
+    return f'{type(e).__name__}: {e}' if str(e) else type(e).__name__
+
+def _parse_job(tex: str, engine: parse.ParseEngine, passes: Optional[optimize.Passes]) -> Tuple[Optional[str], Optional[ASTNode], Tuple[str, ...], Optional[str]]:
+    ''' `(name, tree, steps, error)`, with either the tree and its steps,
+    or the error. A definition whose right-hand side fails to parse keeps
+    its name, so that what uses it reports the error. Runs in a worker.
+    '''
+    try:
+        name, body = split_definition(tex, engine)
+    except Exception as e:
+        return None, None, (), _describe(e)
+
+    try:
+        tree = parse.parse_program(body, engine)
+    except Exception as e:
+        return name, None, (), _describe(e)
+
+    # As `codegen.compile_ast` compiles it
+    common = False
+    optimized = tree
+    if passes is not None:
+        optimized = optimize.optimize(tree, passes)
+        common = passes.eliminate_common
+    return name, tree, tuple(codegen.steps(optimized, common)), None
+
+class Document:
+    ''' Expressions by id, compiled with their dependencies resolved.
+
+    `expressions` maps ids to LaTeX, or is a sequence of LaTeX (ids are
+    then indices). Use it as a context manager, or call `close`, to shut
+    down the process pool it starts for `workers` other than 1.
+    '''
+
+    def __init__(
+        self,
+        expressions: Union[Mapping[Hashable, str], Sequence[str]] = (),
+        engine: parse.ParseEngine = parse.ParseEngine.PRATT,
+        passes: Optional[optimize.Passes] = optimize.ALL,
+        workers: Optional[int] = 1,
+        executor: Optional[Executor] = None
+    ):
+        self.engine = engine
+        self.passes = passes
+        self.workers = workers
+        self.executor = executor
+        self._owned = False
+        self.expressions: Dict[Hashable, Expression] = {}
+        # Ids of the expressions defining each name
+        self._definitions: Dict[str, List[Hashable]] = {}
+        # Expression ids, dependencies first; those in or downstream of a cycle come last
+        self.order: List[Hashable] = []
+
+        if not isinstance(expressions, Mapping):
+            expressions = dict(enumerate(expressions))
+        self.update(expressions)
+
+    def __getitem__(self, id: Hashable) -> Expression:
+        return self.expressions[id]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.expressions)
+
+    def __len__(self) -> int:
+        return len(self.expressions)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._owned:
+            self.executor.shutdown()
+            self.executor = None
+            self._owned = False
+
+    def _map(self, f: Callable, *args: Sequence) -> List:
+        # One job is not worth a round trip to a worker
+        if len(args[0]) < 2 or (self.executor is None and self.workers == 1):
+            return list(map(f, *args))
+
+        if self.executor is None:
+            # Imported here as it pulls in `multiprocessing`, which `workers=1` never needs
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self._owned = True
+
+        workers = self.workers or os.cpu_count() or 1
+        return list(self.executor.map(f, *args, chunksize=max(1, len(args[0]) // (4 * workers))))
+
+    def dependents(self, id: Hashable) -> List[Hashable]:
+        ''' Ids of the expressions that use the definition `id`, directly or not. '''
+        return [ other for other in self._downstream([ id ]) if other != id ]
+
+    def _downstream(self, ids: Sequence[Hashable]) -> List[Hashable]:
+        users = defaultdict(list)
+        for other, expression in self.expressions.items():
+            for dependency in expression.dependencies:
+                users[dependency].append(other)
+
+        seen = dict.fromkeys(ids)
+        queue = deque(seen)
+        while queue:
+            for user in users[queue.popleft()]:
+                if user not in seen:
+                    seen[user] = None
+                    queue.append(user)
+        return list(seen)
+
+    def update(self, changes: Mapping[Hashable, Optional[str]]) -> List[Hashable]:
+        ''' Set the text of each expression in `changes` (None removes it)
+        and recompile what that affects. Returns the ids recompiled, in
+        dependency order.
+        '''
+        expressions = self.expressions
+        for id, tex in changes.items():
+            if tex is None:
+                expressions.pop(id, None)
+
+        changed = [ id for id, tex in changes.items()
+            if tex is not None and (id not in expressions or expressions[id].tex != tex) ]
+        texts = [ changes[id] for id in changed ]
+        jobs = self._map(_parse_job, texts, [ self.engine ] * len(texts), [ self.passes ] * len(texts))
+        for id, tex, (name, tree, steps, error) in zip(changed, texts, jobs):
+            variables = tuple(codegen.free_vars(tree)) if tree is not None else ()
+            expressions[id] = Expression(tex=tex, name=name, tree=tree, variables=variables, steps=steps, error=error)
+
+        # Dependencies follow names, so they change when definitions appear or go away
+        definitions = defaultdict(list)
+        for id, expression in expressions.items():
+            if expression.name is not None:
+                definitions[expression.name].append(id)
+
+        dirty = set(changed)
+        # A name defined a second time (or again only once) changes the first definition's error
+        for name in definitions.keys() | self._definitions.keys():
+            if definitions.get(name) != self._definitions.get(name):
+                dirty.update(id for id in definitions.get(name, ()))
+        self._definitions = definitions
+
+        for id, expression in expressions.items():
+            dependencies = tuple(dependency for name in expression.variables for dependency in definitions.get(name, ()))
+            if dependencies != expression.dependencies:
+                expression.dependencies = dependencies
+                dirty.add(id)
+
+        dirty = set(self._downstream([ id for id in expressions if id in dirty ]))
+        self.order, cycles = self._schedule()
+
+        recompiled = []
+        for id in self.order:
+            if id not in dirty:
+                continue
+            expression = expressions[id]
+            expression.function = expression.source = None
+            expression.definitions = expression.parameters = ()
+            if id in cycles:
+                if expression.tree is not None:
+                    expression.error = cycles[id]
+                continue
+
+            recompiled.append(id)
+            if expression.tree is not None:
+                expression.error = self._resolve(id)
+                if expression.error is None:
+                    expression.function = codegen.compile_source(expression.source)
+
+        return recompiled + [ id for id in self.order if id in cycles and id in dirty ]
+
+    def _resolve(self, id: Hashable) -> Optional[str]:
+        ''' Set `definitions`, `parameters` and `source` from those of the
+        (already resolved) dependencies; the error, if any.
+        '''
+        expression = self.expressions[id]
+        if expression.name is not None and len(self._definitions[expression.name]) > 1:
+            return f'{expression.name} is defined more than once'
+
+        definitions = {}
+        defined = {}
+        for dependency in expression.dependencies:
+            definition = self.expressions[dependency]
+            if definition.function is None:
+                return f'{definition.name} has an error'
+            # Theirs come first, already in order
+            definitions.update(dict.fromkeys(definition.definitions))
+            definitions[dependency] = None
+            defined[definition.name] = definition.parameters
+
+        parameters = {}
+        for name in expression.variables:
+            parameters.update(dict.fromkeys(defined.get(name, (name,))))
+        expression.definitions = tuple(definitions)
+        expression.parameters = tuple(parameters)
+
+        # Each definition is computed once into a variable of its own name,
+        # which is what the steps after it read
+        steps = []
+        for dependency in expression.definitions:
+            definition = self.expressions[dependency]
+            steps.extend(definition.steps[:-1])
+            steps.append(f'({definition.name} := {definition.steps[-1]})')
+        steps.extend(expression.steps)
+
+        args = ','.join(expression.parameters)
+        expression.source = f'lambda{" " + args if args else ""}: {codegen.join_steps(steps)}'
+        return None
+
+    def _schedule(self) -> Tuple[List[Hashable], Dict[Hashable, str]]:
+        ''' All ids in dependency order, and the error of each id left over
+        because it is in or downstream of a cycle.
+        '''
+        remaining = {}
+        users = defaultdict(list)
+        for id, expression in self.expressions.items():
+            remaining[id] = len(expression.dependencies)
+            for dependency in expression.dependencies:
+                users[dependency].append(id)
+
+        order = []
+        wave = [ id for id, count in remaining.items() if count == 0 ]
+        while wave:
+            order.extend(wave)
+            next_wave = []
+            for id in wave:
+                for user in users[id]:
+                    remaining[user] -= 1
+                    if remaining[user] == 0:
+                        next_wave.append(user)
+            wave = next_wave
+
+        # Of those left over, the ones in a cycle are left again after
+        # repeatedly dropping those nothing left over uses
+        left = { id for id in self.expressions if remaining[id] }
+        order.extend(id for id in self.expressions if id in left)
+        uses = { id: sum(user in left for user in users[id]) for id in left }
+        unused = [ id for id, count in uses.items() if count == 0 ]
+        downstream = set()
+        while unused:
+            id = unused.pop()
+            downstream.add(id)
+            for dependency in self.expressions[id].dependencies:
+                if dependency in left and dependency not in downstream:
+                    uses[dependency] -= 1
+                    if uses[dependency] == 0:
+                        unused.append(dependency)
+
+        cycles = { id: 'Depends on a circular definition' if id in downstream else 'Circular definition' for id in left }
+        return order, cycles
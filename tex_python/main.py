@@ -1,22 +1,57 @@
-import json
+import io
 import sys
-
-from parse import parse
-from tex_ast import serialization
 import argparse
 
-def dump_ast(tex: str):
-    ast = parse.parse_program(tex)
+# The CLI is started once per call from shell pipelines, so each mode imports
+# only what it uses (`bench/startup.py` measures this). These are the names of
+# `parse.ParseEngine`, so that parsing arguments does not import the parser.
+ENGINES = ('backtracking', 'pratt')
+
+def dump_ast(tex: str | io.TextIOBase, engine: str | None = None):
+    ''' Parse `tex` as one expression and write its tree as JSON. A stream
+    is lexed as it is read (`lex.iter_tokens`), rather than read whole first.
+    '''
+    from parse import parse
+    from tex_ast import serialization
+
+    ast = parse.parse_program(tex, engine=parse.ParseEngine[engine.upper()] if engine else None)
 
-    print(json.dumps(ast, indent=4, cls=serialization.ASTNodeEncoder))
+    serialization.dump(ast, sys.stdout, indent=4)
+    print()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('--ast', action='store_true')
+    parser.add_argument('--ast', action='store_true',
+        help='Parse stdin as one expression, writing its tree as JSON')
+    parser.add_argument('--batch', action='store_true',
+        help='Parse one expression per input line, writing one JSON result per line')
+    parser.add_argument('--jsonl', action='store_true',
+        help='With --batch, input lines are JSON strings or {"tex": ..., "id": ...} objects')
+    parser.add_argument('--workers', type=int, default=None,
+        help='With --batch or --serve, number of worker processes (default: CPU count; 1 disables the pool)')
+    parser.add_argument('--chunk-size', type=int, default=256,
+        help='With --batch, records per work unit')
+    parser.add_argument('--serve', action='store_true',
+        help='Run a JSON-RPC server on --host/--port; see tex_python/server.py')
+    parser.add_argument('--stdio', action='store_true',
+        help='With --serve, read requests from stdin and write responses to stdout instead')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--engine', choices=ENGINES, default=None)
     args = parser.parse_args()
 
     # TODO: No args, read stdin instead
-    if args.ast:
-        #with open(sys.stdin, 'r') as f:
-        #    dump_ast(f.read())
-        dump_ast(sys.stdin.read())
\ No newline at end of file
+    if args.serve:
+        import asyncio
+        from tex_python import server
+        if args.stdio:
+            asyncio.run(server.serve_stdio(workers=args.workers))
+        else:
+            asyncio.run(server.serve(args.host, args.port, workers=args.workers))
+    elif args.batch:
+        from parse import parse
+        from tex_python import batch
+        engine = parse.ParseEngine[args.engine.upper()] if args.engine else None
+        batch.run_stream(sys.stdin, sys.stdout, args.jsonl, args.workers, args.chunk_size, engine)
+    elif args.ast:
+        dump_ast(sys.stdin, args.engine)
@@ -0,0 +1,376 @@
+''' Long-running JSON-RPC server.
+
+Saves the interpreter start-up that running `main.py` once per expression
+costs. Speaks JSON-RPC 2.0, one message per line, over TCP or over
+stdin/stdout:
+
+    --> {"jsonrpc": "2.0", "id": 1, "method": "parse", "params": {"tex": "x+1"}}
+    <-- {"jsonrpc": "2.0", "id": 1, "result": {"type": "ASTBinaryOp", ...}}
+
+Methods, all taking `tex` and optionally `engine` ("backtracking" or
+"pratt"):
+
+- `parse`: the tree, as `serialization.dumps` writes it.
+- `python`: the generated `lambda` source; `"optimize": true` runs the
+  passes in `tex_ast.optimize` first.
+- `evaluate`: the value at `"args": {"x": 1.5, ...}`, keyed by the names of
+  `codegen.free_vars`. The args and the value must be finite, as JSON has
+  no infinity or NaN (Python's `json` reads and writes them regardless).
+
+Responses to one connection come back as they complete, not necessarily in
+request order; match them up by `id`. A JSON array of requests is answered
+with an array.
+
+Requests from every connection go into one queue and are handed to worker
+processes in batches: the batcher takes what is waiting, or waits up to
+`max_delay` for more, up to `max_batch` requests. Parsing and compiling then
+happen off the event loop. Load is bounded at every step. Each connection
+has at most `max_in_flight` requests outstanding, and the queue holds at
+most `max_pending`. At most one batch per worker is running. When a limit
+is hit, the server stops reading from the connections that are sending,
+which pushes back on their clients through the socket or pipe.
+'''
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, List, Optional, Set, Tuple
+
+from parse import parse
+from tex_ast import codegen, optimize, serialization
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+# The request was well formed but its LaTeX failed to parse or evaluate
+FAILED = -32000
+
+METHODS = ('parse', 'python', 'evaluate')
+
+# (method, tex, engine name, options): `optimize` for python, `args` for evaluate
+Job = Tuple[str, str, Optional[str], Any]
+
+class RequestError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+def run_job(method: str, tex: str, engine: Optional[str], options: Any) -> str:
+    ''' The JSON text of the result of one request. '''
+    tree = parse.parse_program(tex, engine=parse.ParseEngine[engine.upper()] if engine else None)
+    match method:
+        case 'parse':
+            return serialization.dumps(tree)
+        case 'python':
+            if options:
+                return json.dumps(codegen.lambda_source(optimize.optimize(tree), common=True))
+            return json.dumps(codegen.lambda_source(tree))
+        case 'evaluate':
+            names = codegen.free_vars(tree)
+            missing = [ name for name in names if name not in options ]
+            if missing:
+                raise ValueError(f'No value for {", ".join(missing)}')
+            value = codegen.compile_ast(tree)(*(options[name] for name in names))
+            if not isinstance(value, (int, float)):
+                raise ValueError(f'Result is not a real number: {value}')
+            if not _is_finite(value):
+                raise ValueError(f'Result is not finite: {value}')
+            return json.dumps(value, allow_nan=False)
+
+def run_jobs(jobs: List[Job]) -> List[Tuple[bool, str]]:
+    ''' `(True, result)` or `(False, error message)` for each job. Runs in a worker. '''
+    results = []
+    for job in jobs:
+        try:
+            results.append((True, run_job(*job)))
+        except Exception as e:
+            results.append((False, f'{type(e).__name__}: {e}' if str(e) else type(e).__name__))
+    return results
+
+def _is_finite(value: Any) -> bool:
+    # `isfinite` raises for ints too large for a float, which are finite
+    return isinstance(value, int) or math.isfinite(value)
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and _is_finite(value)
+
+def make_job(message: Any) -> Job:
+    ''' Validate a request object; raises `RequestError`. '''
+    if not isinstance(message, dict) or message.get('jsonrpc') != '2.0' or not isinstance(message.get('method'), str):
+        raise RequestError(INVALID_REQUEST, 'Invalid request')
+
+    method = message['method']
+    if method not in METHODS:
+        raise RequestError(METHOD_NOT_FOUND, f'Unknown method {method!r}')
+
+    params = message.get('params', {})
+    if not isinstance(params, dict):
+        raise RequestError(INVALID_PARAMS, 'params must be an object')
+
+    tex = params.get('tex')
+    if not isinstance(tex, str):
+        raise RequestError(INVALID_PARAMS, 'tex must be a string')
+
+    engine = params.get('engine')
+    if engine is not None and engine not in [ engine.name.lower() for engine in parse.ParseEngine ]:
+        raise RequestError(INVALID_PARAMS, f'Unknown engine {engine!r}')
+
+    options = None
+    if method == 'python':
+        options = params.get('optimize', False)
+        if not isinstance(options, bool):
+            raise RequestError(INVALID_PARAMS, 'optimize must be a boolean')
+    elif method == 'evaluate':
+        options = params.get('args', {})
+        if not isinstance(options, dict) or not all(_is_number(value) for value in options.values()):
+            raise RequestError(INVALID_PARAMS, 'args must map names to finite numbers')
+
+    return (method, tex, engine, options)
+
+def _result(id: Any, result: str) -> str:
+    # Splice the result in rather than decoding and re-encoding it
+    return '{"jsonrpc": "2.0", "id": ' + json.dumps(id) + ', "result": ' + result + '}'
+
+def _error(id: Any, code: int, message: str) -> str:
+    return json.dumps({ 'jsonrpc': '2.0', 'id': id, 'error': { 'code': code, 'message': message } })
+
+class _FileWriter:
+    ''' The parts of `asyncio.StreamWriter` that `Server.handle` uses, over a file. '''
+
+    def __init__(self, file):
+        self.file = file
+        self.closed = False
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.file.flush()
+
+    async def drain(self):
+        pass
+
+    def is_closing(self) -> bool:
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    async def wait_closed(self):
+        pass
+
+class Server:
+    ''' The request queue, batcher and worker pool shared by all connections.
+
+        async with Server() as server:
+            listener = await server.listen('127.0.0.1', 8765)
+            await listener.serve_forever()
+
+    `workers=1` runs batches on one thread of this process; otherwise they
+    go to a process pool of `workers` processes (default: one per CPU), or
+    to `executor` if given.
+    '''
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        max_batch: int = 64,
+        max_delay: float = 0.002,
+        max_pending: int = 1024,
+        max_in_flight: int = 64,
+        max_request_bytes: int = 1 << 20
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+        self.max_request_bytes = max_request_bytes
+
+        self._owned = executor is None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if self._owned:
+            if self.workers == 1:
+                self.executor = ThreadPoolExecutor(1)
+            else:
+                # Forked workers would inherit, and hold open, client sockets
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+        self._queue = asyncio.Queue(self.max_pending)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def close(self):
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, *self._running, return_exceptions=True)
+            self._batcher = None
+        if self._owned and self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self) -> 'Server':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def submit(self, job: Job) -> Tuple[bool, str]:
+        ''' Queue one job and wait for its result; waits for room when the queue is full. '''
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [ await queue.get() ]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except TimeoutError:
+                    break
+
+            # One batch per worker; the queue fills up behind the rest
+            await self._slots.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Job, asyncio.Future]]):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, run_jobs, [ job for job, _ in batch ])
+        except Exception as e:
+            results = [ (False, f'{type(e).__name__}: {e}') ] * len(batch)
+        finally:
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def respond(self, message: Any) -> Optional[str]:
+        ''' The response line to one decoded request, or None for a notification. '''
+        if isinstance(message, list):
+            if not message:
+                return _error(None, INVALID_REQUEST, 'Empty batch')
+            responses = await asyncio.gather(*(self.respond(item) for item in message))
+            responses = [ response for response in responses if response is not None ]
+            return '[' + ', '.join(responses) + ']' if responses else None
+
+        id = message.get('id') if isinstance(message, dict) else None
+        notification = isinstance(message, dict) and 'id' not in message
+        try:
+            ok, result = await self.submit(make_job(message))
+            if not ok:
+                raise RequestError(FAILED, result)
+        except RequestError as e:
+            return None if notification else _error(id, e.code, e.message)
+
+        return None if notification else _result(id, result)
+
+    async def _respond_line(self, line: bytes, writer: asyncio.StreamWriter, limit: asyncio.Semaphore):
+        try:
+            try:
+                message = json.loads(line)
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                response = _error(None, PARSE_ERROR, f'Parse error: {e}')
+            else:
+                response = await self.respond(message)
+
+            if response is not None and not writer.is_closing():
+                writer.write(response.encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            limit.release()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        ''' Serve one connection until its input ends. '''
+        limit = asyncio.Semaphore(self.max_in_flight)
+        pending = set()
+        try:
+            while True:
+                # Stop reading while this connection has too much outstanding
+                await limit.acquire()
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Longer than the reader's limit; the stream cannot resync
+                    writer.write(_error(None, INVALID_REQUEST, 'Request too large').encode() + b'\n')
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    limit.release()
+                    continue
+
+                task = asyncio.create_task(self._respond_line(line, writer, limit))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            await asyncio.gather(*pending)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def listen(self, host: str = '127.0.0.1', port: int = 0) -> asyncio.base_events.Server:
+        ''' Accept connections on `host`:`port` (0 picks a free port). '''
+        return await asyncio.start_server(self.handle, host, port, limit=self.max_request_bytes)
+
+    async def handle_stdio(self):
+        ''' Serve requests read from stdin, writing responses to stdout. '''
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=self.max_request_bytes)
+        # Pipe transports only take pipes, sockets and terminals; regular
+        # files never block, so those are read and written directly
+        try:
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        except ValueError:
+            reader.feed_data(sys.stdin.buffer.read())
+            reader.feed_eof()
+        try:
+            # A reader protocol for the flow control and close waiter `StreamWriter` needs
+            transport, protocol = await loop.connect_write_pipe(
+                lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader()), sys.stdout)
+            writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        except ValueError:
+            writer = _FileWriter(sys.stdout.buffer)
+        await self.handle(reader, writer)
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, **options):
+    async with Server(**options) as server:
+        listener = await server.listen(host, port)
+        async with listener:
+            await listener.serve_forever()
+
+async def serve_stdio(**options):
+    async with Server(**options) as server:
+        await server.handle_stdio()